@@ -1,8 +1,32 @@
+import gc
 import time
+import ujson
 import uasyncio
+import ubinascii
 
 from .config import config
-from .services import logger, network, nfc
+from .services import logger, metrics, network, nfc
+from .services.nfc import actions, presence
+from .services.network import cache, files, http, prometheus, sse
+
+
+# Audio clips uploaded over the HTTP server are stored here
+_CLIPS_DIRECTORY = "/clips"
+# The management UI served by the HTTP server
+_UI_DIRECTORY = "/www"
+
+# What every provisioned card does when tapped, see actions.ActionIndex
+_CARD_ACTIONS_PATH = "/cards"
+
+_ROUTE_CARD = b"/nfc/card"
+_ROUTE_CARD_ACTION = b"/cards/<uid>"
+_PARAM_UID = b"uid"
+# Card action bodies this long or longer are rejected
+_MAX_CARD_ACTION_BODY_LEN = 128
+_ROUTE_CONFIG = b"/config"
+
+# Config keys never exposed over the HTTP server
+_PRIVATE_CONFIG_KEYS = ("wifi_password",)
 
 
 class BopBox:
@@ -11,6 +35,12 @@ class BopBox:
         "_logger",
         "_network",
         "_nfc",
+        "_clip_uploads",
+        "_clip_files",
+        "_ui_files",
+        "_events",
+        "_response_cache",
+        "_card_actions",
     )
 
     _tasks: list[uasyncio.Task]
@@ -19,11 +49,158 @@ class BopBox:
     _network: network.Network
     _nfc: nfc.NFC
 
+    _clip_uploads: files.FileUploadHandler
+    _clip_files: files.StaticFileHandler
+    _ui_files: files.StaticFileHandler
+    _events: sse.EventStream
+    _response_cache: cache.ResponseCache
+    _card_actions: actions.ActionIndex
+
     def __init__(self) -> None:
         self._tasks = []
         self._logger = logger.get_logger("bopbox")
         self._network = network.Network()
-        self._nfc = nfc.NFC()
+        self._nfc = nfc.NFC(
+            on_card_event=self._handle_card_event,
+        )
+
+        self._card_actions = actions.ActionIndex(_CARD_ACTIONS_PATH)
+        self._network.add_http_server_route(b"GET", _ROUTE_CARD_ACTION, self._get_card_action)
+        self._network.add_http_server_route(b"PUT", _ROUTE_CARD_ACTION, self._put_card_action)
+        self._network.add_http_server_route(b"DELETE", _ROUTE_CARD_ACTION, self._delete_card_action)
+
+        # Status endpoints are served from the cache until the NFC service
+        # invalidates them, the config only ever changing with a reboot
+        self._response_cache = cache.ResponseCache()
+        self._network.add_http_server_route(
+            b"GET",
+            _ROUTE_CARD,
+            self._response_cache.cached(_ROUTE_CARD, self._get_card),
+        )
+        self._network.add_http_server_route(
+            b"GET",
+            _ROUTE_CONFIG,
+            self._response_cache.cached(_ROUTE_CONFIG, self._get_config),
+        )
+
+        metrics.gauge(b"bopbox_mem_free_bytes", b"Free heap memory.", read=gc.mem_free)
+        metrics.gauge(b"bopbox_mem_alloc_bytes", b"Allocated heap memory.", read=gc.mem_alloc)
+        self._network.add_http_server_route(
+            b"GET",
+            b"/metrics",
+            prometheus.handle,
+        )
+
+        self._events = sse.EventStream()
+        self._network.add_http_server_route(
+            b"GET",
+            b"/events",
+            self._events.handle,
+        )
+
+        self._clip_uploads = files.FileUploadHandler(_CLIPS_DIRECTORY)
+        self._network.add_http_server_route(
+            b"PUT",
+            b"/clips/<name>",
+            self._clip_uploads.handle,
+        )
+
+        self._clip_files = files.StaticFileHandler(_CLIPS_DIRECTORY)
+        self._network.add_http_server_route(
+            b"GET",
+            b"/clips/<name>",
+            self._clip_files.handle,
+        )
+
+        # everything not matched by a more specific route
+        self._ui_files = files.StaticFileHandler(_UI_DIRECTORY)
+        self._network.add_http_server_route(
+            b"GET",
+            b"/*",
+            self._ui_files.handle,
+        )
+
+    def _handle_card_event(self, event: presence.CardEvent) -> None:
+        # a re-seen card never left as far as anyone is concerned
+        if event.type == presence.EVENT_ARRIVED:
+            self._response_cache.invalidate(_ROUTE_CARD)
+            self._events.publish(
+                b"card-detected",
+                _card_event_data(event.uid, self._card_actions.lookup(event.uid), event.reader),
+            )
+        elif event.type == presence.EVENT_REMOVED:
+            self._response_cache.invalidate(_ROUTE_CARD)
+            self._events.publish(b"card-removed", _card_event_data(event.uid, reader=event.reader))
+
+    async def _get_card(self, context: http.HTTPContext) -> None:
+        uid = self._nfc.current_card_uid
+        context.response.set_body(
+            _card_event_data(uid, self._card_actions.lookup(uid)) if uid else b'{"uid":null}',
+            http.CONTENT_TYPE_JSON,
+        )
+
+    async def _get_card_action(self, context: http.HTTPContext) -> None:
+        uid = _parse_uid(context.params)
+        action = self._card_actions.lookup(uid) if uid else None
+        if action is None:
+            context.response.reset(404)
+            return
+
+        context.response.set_body(_card_event_data(uid, action), http.CONTENT_TYPE_JSON)
+
+    async def _put_card_action(self, context: http.HTTPContext) -> None:
+        """Provision a card, with a {"action": "clip", "argument": "intro.mp3"} body."""
+        uid = _parse_uid(context.params)
+        if uid is None:
+            context.response.reset(400)
+            return
+
+        # the body may still be on its way, so it is read rather than taken
+        # from the request
+        body = bytearray(_MAX_CARD_ACTION_BODY_LEN)
+        length = 0
+        while length < len(body):
+            count = await context.body.readinto(memoryview(body)[length:])
+            if not count:
+                break
+            length += count
+
+        if length == len(body):
+            context.response.reset(413)
+            return
+
+        try:
+            data = ujson.loads(bytes(body[:length])) if length else None
+            action = _ACTION_CODES.get(data.get("action")) if isinstance(data, dict) else None
+            if action is None:
+                raise ValueError("Unknown action")
+
+            self._card_actions.put(uid, action, str(data.get("argument") or "").encode())
+        except ValueError as e:
+            self._logger.warn(f"Invalid card action error={e}")
+            context.response.reset(400)
+            return
+
+        self._response_cache.invalidate(_ROUTE_CARD)
+        context.response.reset(204)
+
+    async def _delete_card_action(self, context: http.HTTPContext) -> None:
+        uid = _parse_uid(context.params)
+        if uid is None:
+            context.response.reset(400)
+            return
+
+        self._card_actions.remove(uid)
+        self._response_cache.invalidate(_ROUTE_CARD)
+        context.response.reset(204)
+
+    async def _get_config(self, context: http.HTTPContext) -> None:
+        values = {}
+        for key in config.__slots__:
+            if key not in _PRIVATE_CONFIG_KEYS:
+                values[key] = getattr(config, key)
+
+        context.response.set_body(ujson.dumps(values).encode(), http.CONTENT_TYPE_JSON)
 
     async def run(self) -> None:
         # Start async tasks
@@ -64,3 +241,31 @@ class BopBox:
 
         self._logger.info("Shutdown complete")
         return None
+
+
+_ACTION_CODES = {name.decode(): code for code, name in actions.ACTION_NAMES.items()}
+
+
+def _card_event_data(
+    uid: bytes,
+    action: actions.CardAction | None = None,
+    reader: int | None = None,
+) -> bytes:
+    data = b'{"uid":"' + ubinascii.hexlify(uid) + b'"'
+    if reader is not None:
+        data += b',"reader":' + str(reader).encode()
+    if action is not None:
+        data += b',"action":"' + action.name + b'","argument":' + ujson.dumps(action.argument.decode()).encode()
+
+    return data + b"}"
+
+
+def _parse_uid(params: dict[bytes, bytes] | None) -> bytes | None:
+    """The UID of a /cards/<uid> route, given in hex."""
+    try:
+        uid = ubinascii.unhexlify(params[_PARAM_UID]) if params else None
+    except (KeyError, ValueError):
+        return None
+
+    # the card actions only have room for UIDs this long
+    return uid if uid and len(uid) <= actions.MAX_UID_LEN else None
@@ -6,31 +6,64 @@ class Config:
         "debug_mode",
         "wifi_ssid",
         "wifi_password",
+        "wifi_uart_baud_rate",
         "http_server_enabled",
         "http_server_port",
+        "http_server_idle_timeout",
+        "http_server_max_handlers",
+        "http_server_request_timeout",
+        "http_server_header_timeout",
         "nfc_enabled",
+        "nfc_uart_baud_rate",
+        "nfc_removal_misses",
+        "nfc_arrival_dwell_ms",
+        "nfc_idle_timeout_ms",
+        "nfc_baud_rates",
+        "nfc_readers",
     )
 
     debug_mode: bool
 
     wifi_ssid: str | None
     wifi_password: str | None
+    wifi_uart_baud_rate: int | None
 
     http_server_enabled: bool | None
     http_server_port: int | None
+    http_server_idle_timeout: int | None
+    http_server_max_handlers: int | None
+    http_server_request_timeout: int | None
+    http_server_header_timeout: int | None
 
     nfc_enabled: bool | None
+    nfc_uart_baud_rate: int | None
+    nfc_removal_misses: int | None
+    nfc_arrival_dwell_ms: int | None
+    nfc_idle_timeout_ms: int | None
+    nfc_baud_rates: list[str] | None
+    nfc_readers: list[dict] | None
 
     def __init__(self) -> None:
         self.debug_mode = False
 
         self.wifi_ssid = None
         self.wifi_password = None
+        self.wifi_uart_baud_rate = None
 
         self.http_server_enabled = False
         self.http_server_port = None
+        self.http_server_idle_timeout = None
+        self.http_server_max_handlers = None
+        self.http_server_request_timeout = None
+        self.http_server_header_timeout = None
 
         self.nfc_enabled = False
+        self.nfc_uart_baud_rate = None
+        self.nfc_removal_misses = None
+        self.nfc_arrival_dwell_ms = None
+        self.nfc_idle_timeout_ms = None
+        self.nfc_baud_rates = None
+        self.nfc_readers = None
 
         self.load()
 
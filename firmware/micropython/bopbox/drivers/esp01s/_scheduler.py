@@ -0,0 +1,151 @@
+import utime
+import uasyncio
+
+from micropython import const
+
+
+PRIORITY_SEND = const(0)
+PRIORITY_QUERY = const(1)
+PRIORITY_CONFIG = const(2)
+
+_PRIORITY_COUNT = const(3)
+
+
+class ATCommandScheduler:
+    """
+    Grants exclusive use of the AT command channel, one command at a time.
+
+    Unlike a plain lock, waiting commands are dispatched by priority
+    (data sends, then status queries, then configuration) and FIFO within
+    the same priority, so a backlog of slow configuration commands never
+    delays data going out to connected clients.
+
+    Every command carries a deadline covering both its time in the queue
+    and its round trip. A command whose deadline passes while it is still
+    queued, or whose task is cancelled, is removed from the queue without
+    ever being written to the ESP.
+
+    Example:
+        await scheduler.acquire(PRIORITY_QUERY, deadline)
+        try:
+            ...  # write the command and wait for its response
+        finally:
+            scheduler.release()
+    """
+
+    __slots__ = (
+        "_busy",
+        "_queues",
+        "_dispatched",
+        "_timed_out",
+        "_wait_ms_total",
+        "_wait_ms_max",
+    )
+
+    _busy: bool
+    _queues: list[list[uasyncio.Event]]
+
+    _dispatched: list[int]
+    _timed_out: list[int]
+    _wait_ms_total: list[int]
+    _wait_ms_max: list[int]
+
+    def __init__(self) -> None:
+        self._busy = False
+        self._queues = [[] for _ in range(_PRIORITY_COUNT)]
+
+        self._dispatched = [0] * _PRIORITY_COUNT
+        self._timed_out = [0] * _PRIORITY_COUNT
+        self._wait_ms_total = [0] * _PRIORITY_COUNT
+        self._wait_ms_max = [0] * _PRIORITY_COUNT
+
+    @property
+    def busy(self) -> bool:
+        return self._busy
+
+    def queue_depth(self, priority: int | None = None) -> int:
+        """
+        Args:
+            priority: Only count commands of this priority, or all if None.
+
+        Returns:
+            int: The number of commands waiting to be dispatched.
+        """
+        if priority is not None:
+            return len(self._queues[priority])
+
+        return sum(len(queue) for queue in self._queues)
+
+    def get_stats(self) -> dict:
+        """
+        Returns:
+            dict: Per-priority counters, each a list indexed by priority:
+                - queue_depth: commands currently waiting
+                - dispatched: commands that got the channel
+                - timed_out: commands whose deadline passed while queued
+                - wait_ms_total: total time dispatched commands spent queued
+                - wait_ms_max: longest time a dispatched command spent queued
+        """
+        return {
+            "queue_depth": [len(queue) for queue in self._queues],
+            "dispatched": list(self._dispatched),
+            "timed_out": list(self._timed_out),
+            "wait_ms_total": list(self._wait_ms_total),
+            "wait_ms_max": list(self._wait_ms_max),
+        }
+
+    async def acquire(self, priority: int, deadline: int) -> None:
+        """
+        Wait until the command channel is granted to the caller.
+
+        Args:
+            priority: One of PRIORITY_SEND, PRIORITY_QUERY or PRIORITY_CONFIG.
+            deadline: utime.ticks_ms() value after which the command gives up.
+
+        Raises:
+            uasyncio.TimeoutError: If the deadline passed before the channel was granted.
+        """
+        queued_at = utime.ticks_ms()
+
+        if not self._busy:
+            self._busy = True
+            self._record_dispatch(priority, 0)
+            return
+
+        granted = uasyncio.Event()
+        queue = self._queues[priority]
+        queue.append(granted)
+
+        try:
+            await uasyncio.wait_for_ms(
+                granted.wait(),
+                max(0, utime.ticks_diff(deadline, queued_at)),
+            )
+        except BaseException as e:
+            if granted.is_set():
+                # the channel was handed over just as we gave up, pass it on
+                self.release()
+            else:
+                queue.remove(granted)
+
+            if isinstance(e, uasyncio.TimeoutError):
+                self._timed_out[priority] += 1
+
+            raise
+
+        self._record_dispatch(priority, utime.ticks_diff(utime.ticks_ms(), queued_at))
+
+    def release(self) -> None:
+        """Hand the command channel to the highest priority waiting command."""
+        for queue in self._queues:
+            if queue:
+                queue.pop(0).set()
+                return
+
+        self._busy = False
+
+    def _record_dispatch(self, priority: int, wait_ms: int) -> None:
+        self._dispatched[priority] += 1
+        self._wait_ms_total[priority] += wait_ms
+        if wait_ms > self._wait_ms_max[priority]:
+            self._wait_ms_max[priority] = wait_ms
@@ -4,18 +4,33 @@ from typing import Callable
 from micropython import const
 
 
-_ORD_PLUS = const(0x2B)  # ord("+")
-_ORD_0 = const(0x30)  # ord("0")
+# The ESP-01S supports up to 5 simultaneous connections (IDs 0-4)
+_MAX_CONNECTIONS = const(5)
 
-_MSG_URC_CONNECT = const(b",CONNECT\r\n")
-_MSG_URC_CLOSED = const(b",CLOSED\r\n")
-_MSG_URC_IPD = const(b"+IPD,")
+_DEFAULT_CONNECTION_BUFFER_LEN = const(2048)
 
 
 class TCPServer:
+    """
+    Tracks the TCP server connections and reassembles the data received on them.
+
+    Every connection slot has its own TCPServerConnectionBuffer, allocated
+    once when the server is created. +IPD payloads are appended to the
+    buffer of their connection as the tokenizer frames them, and the
+    connection is notified once a whole +IPD message has been received,
+    however many UART reads it arrived in. Data the consumer has not
+    consumed yet stays buffered, so a message split across several +IPD
+    frames is assembled in place as well.
+
+    The only exception is a message larger than the free space left in the
+    buffer, which is notified as it arrives so that a consumer streaming it
+    can make room for the rest.
+    """
+
     __slots__ = (
         "_requests",
         "_connections",
+        "_buffers",
         "_on_connection_opened",
         "_on_connection_closed",
         "_on_connection_data",
@@ -23,81 +38,204 @@ class TCPServer:
 
     _requests: list[uasyncio.Task]
     _connections: TCPServerConnections
+    _buffers: tuple[TCPServerConnectionBuffer, ...]
 
     _on_connection_opened: Callable[[int], None] | None
     _on_connection_closed: Callable[[int], None] | None
-    _on_connection_data: Callable[[int, memoryview], None] | None
+    _on_connection_data: Callable[[int, TCPServerConnectionBuffer], None] | None
 
     def __init__(
         self,
         on_connection_opened: Callable[[int], None] | None,
         on_connection_closed: Callable[[int], None] | None,
-        on_connection_data: Callable[[int, memoryview], None] | None,
+        on_connection_data: Callable[[int, TCPServerConnectionBuffer], None] | None,
+        buffer_len: int = _DEFAULT_CONNECTION_BUFFER_LEN,
     ) -> None:
         self._connections = TCPServerConnections()
+        self._buffers = tuple(
+            TCPServerConnectionBuffer(buffer_len) for _ in range(_MAX_CONNECTIONS)
+        )
 
         self._on_connection_opened = on_connection_opened
         self._on_connection_closed = on_connection_closed
         self._on_connection_data = on_connection_data
 
-    def _extract_connection_id(
+    def is_connection_open(
         self,
-        message: bytes,
-    ) -> int:
-        """
-        Extract the connection ID from a URC message.
+        connection_id: int,
+    ) -> bool:
+        return connection_id in self._connections
+
+    def get_connection_buffer(
+        self,
+        connection_id: int,
+    ) -> TCPServerConnectionBuffer:
+        return self._buffers[connection_id]
+
+    def handle_connection_opened(
+        self,
+        connection_id: int,
+    ) -> None:
+        if not _is_valid_connection_id(connection_id) or connection_id in self._connections:
+            return
+
+        self._connections.add(connection_id)
+        self._buffers[connection_id].reset()
+
+        if self._on_connection_opened:
+            self._on_connection_opened(connection_id)
+
+    def handle_connection_closed(
+        self,
+        connection_id: int,
+    ) -> None:
+        if not _is_valid_connection_id(connection_id) or connection_id not in self._connections:
+            return
 
-        Handles formats:
-            - CONNECT/CLOSED: b"0,CONNECT", b"1,CLOSED"
-            - IPD: b"+IPD,0,5:hello"
+        self._connections.remove(connection_id)
+
+        if self._on_connection_closed:
+            self._on_connection_closed(connection_id)
+
+        # only reset once the consumer knows, it may still be reading from it
+        self._buffers[connection_id].reset()
+
+    def handle_connection_data(
+        self,
+        connection_id: int,
+        data: memoryview,
+        remaining: int,
+    ) -> None:
+        """
+        Handle a +IPD payload framed by the tokenizer.
 
         Args:
-            message: The raw URC message bytes.
+            connection_id: The connection the payload was received on (0-4).
+            data: The payload, only valid for the duration of the call.
+            remaining: Bytes of the same +IPD frame that are still to come.
+        """
+        if not _is_valid_connection_id(connection_id) or connection_id not in self._connections:
+            return
+
+        buffer = self._buffers[connection_id]
+        buffer.append(data)
+
+        if remaining and remaining <= buffer.free:
+            return
+
+        if self._on_connection_data:
+            self._on_connection_data(
+                connection_id,
+                buffer,
+            )
+
+
+class TCPServerConnectionBuffer:
+    """
+    Fixed-size reassembly buffer for the data received on one connection.
 
+    Received data is appended at the end and consumed from the start, and
+    the consumer decides when the unconsumed data may be moved back to the
+    front of the buffer with compact(). Appending never moves data, so
+    memoryviews into view() stay valid while a message is being handled
+    even as more data keeps arriving behind it.
+
+    Data that does not fit is dropped and the buffer is marked as
+    overflowed: the stream is no longer intact, so the connection should be
+    answered with an error and closed.
+
+    Example:
+        length = parse(buffer.view())
+        if length > 0:
+            ...  # handle the message
+            buffer.consume(length)
+            buffer.compact()
+    """
+
+    __slots__ = (
+        "overflowed",
+        "_buffer",
+        "_view",
+        "_start",
+        "_end",
+    )
+
+    overflowed: bool
+
+    _buffer: bytearray
+    _view: memoryview
+    _start: int
+    _end: int
+
+    def __init__(self, buffer_len: int) -> None:
+        self._buffer = bytearray(buffer_len)
+        self._view = memoryview(self._buffer)
+        self.reset()
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    @property
+    def capacity(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def free(self) -> int:
+        """
         Returns:
-            int: The connection ID (0-4).
+            int: How many more bytes can be appended before the next compact().
         """
+        return len(self._buffer) - self._end
 
-        # +IPD,<id>,<len>:<data>
-        if message[0] == _ORD_PLUS:
-            return message[5] - _ORD_0
+    def reset(self) -> None:
+        self.overflowed = False
+        self._start = 0
+        self._end = 0
 
-        # <id>,CONNECT or <id>,CLOSED
-        return message[0] - _ORD_0
+    def view(self) -> memoryview:
+        """
+        Returns:
+            memoryview: The data that has not been consumed yet, valid until
+                the next compact() or reset().
+        """
+        return self._view[self._start : self._end]
 
-    def handle_message(
-        self,
-        message: bytes,
-    ) -> None:
-        if _MSG_URC_CONNECT in message:
-            connection_id = self._extract_connection_id(message)
-            if connection_id in self._connections:
-                return
+    def append(self, data: memoryview) -> bool:
+        """
+        Returns:
+            bool: True if data was buffered, False if it did not fit and was dropped.
+        """
+        count = len(data)
+        if self.overflowed or self._end + count > len(self._buffer):
+            self.overflowed = True
+            return False
+
+        self._view[self._end : self._end + count] = data
+        self._end += count
 
-            self._connections.add(connection_id)
+        return True
 
-        if _MSG_URC_CLOSED in message:
-            connection_id = self._extract_connection_id(message)
-            if connection_id not in self._connections:
-                return
+    def consume(self, count: int) -> None:
+        """Discard count bytes from the start of the unconsumed data."""
+        self._start = min(self._start + count, self._end)
 
-            self._connections.remove(connection_id)
+    def compact(self) -> None:
+        """
+        Move the unconsumed data back to the start of the buffer, making all
+        the free space available to append() again.
 
-        if _MSG_URC_IPD in message:
-            connection_id = self._extract_connection_id(message)
-            if connection_id not in self._connections:
-                return
+        Invalidates every memoryview previously returned by view().
+        """
+        start = self._start
+        if start == 0:
+            return
 
-            if self._on_connection_data:
-                data = memoryview(message)[
-                    (message.find(b":", message.find(_MSG_URC_IPD)) + 1) :
-                ]
+        pending = self._end - start
+        if pending:
+            self._view[:pending] = self._view[start : self._end]
 
-                if len(data):
-                    self._on_connection_data(
-                        connection_id,
-                        data,
-                    )
+        self._start = 0
+        self._end = pending
 
 
 class TCPServerConnections:
@@ -146,3 +284,8 @@ class TCPServerConnections:
                 yield connection_id
             mask >>= 1
             connection_id += 1
+
+
+def _is_valid_connection_id(connection_id: int) -> bool:
+    """Whether connection_id, as reported by the ESP, is one of its connection slots."""
+    return 0 <= connection_id < _MAX_CONNECTIONS
@@ -0,0 +1,337 @@
+from typing import Callable
+from micropython import const
+
+from ...util import find_ord, parse_int
+
+
+_DEFAULT_BUFFER_LEN = const(2048)
+
+# +IPD,<id>,<len>[,<remote_ip>,<remote_port>]: never gets anywhere near this long
+_MAX_IPD_HEADER_LEN = const(64)
+
+_ORD_LF = const(0x0A)  # ord("\n")
+_ORD_CR = const(0x0D)  # ord("\r")
+_ORD_SPACE = const(0x20)  # ord(" ")
+_ORD_PLUS = const(0x2B)  # ord("+")
+_ORD_COMMA = const(0x2C)  # ord(",")
+_ORD_0 = const(0x30)  # ord("0")
+_ORD_9 = const(0x39)  # ord("9")
+_ORD_COLON = const(0x3A)  # ord(":")
+_ORD_GT = const(0x3E)  # ord(">")
+
+_MSG_URC_IPD = const(b"+IPD,")
+_MSG_URC_CONNECT = const(b"CONNECT")
+_MSG_URC_CLOSED = const(b"CLOSED")
+
+
+class ATTokenizer:
+    """
+    Incremental tokenizer for the ESP-AT UART stream.
+
+    UART bytes are read straight into a preallocated buffer and framed in
+    place, emitting one event per token:
+
+        - command response lines (without the trailing \\r\\n)
+        - the ">" prompt that follows AT+CIPSEND
+        - <id>,CONNECT and <id>,CLOSED URCs
+        - +IPD payloads, delimited by their length field
+
+    The buffer is used as a ring whose unconsumed tail is moved back to the
+    start whenever the write position reaches the end, so every token is
+    always contiguous and can be handed out as a memoryview slice. Each byte
+    is scanned at most once, tokens split across reads are picked up where
+    the previous read left off, and nothing is allocated per byte.
+
+    Memoryviews passed to the callbacks point into the internal buffer and
+    are only valid for the duration of the callback.
+    """
+
+    __slots__ = (
+        "_buffer",
+        "_view",
+        "_read",
+        "_write",
+        "_scan",
+        "_ipd_connection_id",
+        "_ipd_remaining",
+        "_on_line",
+        "_on_prompt",
+        "_on_connection_opened",
+        "_on_connection_closed",
+        "_on_connection_data",
+    )
+
+    _buffer: bytearray
+    _view: memoryview
+    _read: int
+    _write: int
+    _scan: int
+
+    _ipd_connection_id: int
+    _ipd_remaining: int
+
+    _on_line: Callable[[memoryview], None]
+    _on_prompt: Callable[[], None]
+    _on_connection_opened: Callable[[int], None]
+    _on_connection_closed: Callable[[int], None]
+    _on_connection_data: Callable[[int, memoryview, int], None]
+
+    def __init__(
+        self,
+        on_line: Callable[[memoryview], None],
+        on_prompt: Callable[[], None],
+        on_connection_opened: Callable[[int], None],
+        on_connection_closed: Callable[[int], None],
+        on_connection_data: Callable[[int, memoryview, int], None],
+        buffer_len: int = _DEFAULT_BUFFER_LEN,
+    ) -> None:
+        self._buffer = bytearray(buffer_len)
+        self._view = memoryview(self._buffer)
+
+        self._on_line = on_line
+        self._on_prompt = on_prompt
+        self._on_connection_opened = on_connection_opened
+        self._on_connection_closed = on_connection_closed
+        self._on_connection_data = on_connection_data
+
+        self.reset()
+
+    def reset(self) -> None:
+        self._read = 0
+        self._write = 0
+        self._scan = 0
+        self._ipd_connection_id = -1
+        self._ipd_remaining = 0
+
+    def reserve(self) -> memoryview:
+        """
+        Get the free space at the end of the buffer, to read into directly.
+
+        Example:
+            count = await transport.readinto(tokenizer.reserve())
+            tokenizer.commit(count)
+
+        Returns:
+            memoryview: A view of the free space, valid until the next commit().
+        """
+        self._make_room()
+
+        return self._view[self._write :]
+
+    def commit(self, count: int) -> None:
+        """
+        Process count bytes that were read into the view returned by reserve().
+        """
+        if count:
+            self._write += count
+            self._process()
+
+    def feed(self, data: bytes | bytearray | memoryview) -> None:
+        """
+        Copy data into the tokenizer and process it.
+
+        Args:
+            data: Raw bytes received from the ESP.
+        """
+        view = memoryview(data)
+        offset = 0
+        while offset < len(view):
+            self._make_room()
+
+            count = min(len(view) - offset, len(self._buffer) - self._write)
+            self._view[self._write : self._write + count] = view[offset : offset + count]
+            self._write += count
+            offset += count
+
+            self._process()
+
+    def _make_room(self) -> None:
+        read = self._read
+        write = self._write
+
+        if read == write:
+            # everything has been consumed, start over at the front
+            self._read = self._write = self._scan = 0
+            return
+
+        if write < len(self._buffer):
+            return
+
+        if read > 0:
+            # move the unconsumed tail back to the start of the buffer
+            pending = write - read
+            self._view[:pending] = self._view[read:write]
+            self._read = 0
+            self._write = pending
+            self._scan -= read
+            return
+
+        # a single line filled the whole buffer without a line ending, it
+        # cannot be framed so drop it and resynchronize on the next one
+        self._read = self._write = self._scan = 0
+
+    def _process(self) -> None:
+        buffer = self._buffer
+
+        while self._read < self._write:
+            if self._ipd_remaining:
+                if not self._process_ipd_payload():
+                    return
+                continue
+
+            start = self._read
+            end = self._write
+            first = buffer[start]
+
+            if first == _ORD_GT:
+                # "> " prompt, sent without a line ending
+                self._read = self._scan = start + 1
+                self._on_prompt()
+                continue
+
+            if first == _ORD_SPACE:
+                # the space trailing the prompt, which may arrive in a later read
+                self._read = self._scan = start + 1
+                continue
+
+            if first == _ORD_PLUS:
+                matched = self._match_ipd_prefix(start, end)
+                if matched < 0:
+                    return
+
+                if matched:
+                    parsed = self._process_ipd_header(start, end)
+                    if parsed > 0:
+                        continue
+                    if parsed < 0:
+                        return
+
+                    # malformed header, fall through and hand it out as a line
+
+            lf = find_ord(buffer, _ORD_LF, max(start, self._scan), end)
+            if lf < 0:
+                self._scan = end
+                return
+
+            self._read = self._scan = lf + 1
+
+            line_end = lf
+            if line_end > start and buffer[line_end - 1] == _ORD_CR:
+                line_end -= 1
+
+            if line_end > start:
+                self._process_line(start, line_end)
+
+    def _match_ipd_prefix(self, start: int, end: int) -> int:
+        """
+        Returns:
+            int: 1 if buffer[start:end] starts with +IPD, 0 if it does not,
+                and -1 if there are not enough bytes to tell yet.
+        """
+        buffer = self._buffer
+        count = min(end - start, len(_MSG_URC_IPD))
+
+        for i in range(count):
+            if buffer[start + i] != _MSG_URC_IPD[i]:
+                return 0
+
+        return 1 if count == len(_MSG_URC_IPD) else -1
+
+    def _process_ipd_header(self, start: int, end: int) -> int:
+        """
+        Parse +IPD,<id>,<len>[,<remote_ip>,<remote_port>]: and switch to
+        payload mode.
+
+        Returns:
+            int: 1 if the header was consumed, 0 if it is malformed and -1 if
+                it is still incomplete.
+        """
+        buffer = self._buffer
+
+        colon = find_ord(buffer, _ORD_COLON, start, min(end, start + _MAX_IPD_HEADER_LEN))
+        if colon < 0:
+            return -1 if end - start < _MAX_IPD_HEADER_LEN else 0
+
+        id_start = start + len(_MSG_URC_IPD)
+        id_end = find_ord(buffer, _ORD_COMMA, id_start, colon)
+        if id_end < 0:
+            return 0
+
+        len_end = find_ord(buffer, _ORD_COMMA, id_end + 1, colon)
+        if len_end < 0:
+            len_end = colon
+
+        connection_id = parse_int(buffer, id_start, id_end)
+        length = parse_int(buffer, id_end + 1, len_end)
+        if connection_id < 0 or length < 0:
+            return 0
+
+        self._read = self._scan = colon + 1
+        self._ipd_connection_id = connection_id
+        self._ipd_remaining = length
+
+        return 1
+
+    def _process_ipd_payload(self) -> bool:
+        """
+        Deliver the current +IPD payload.
+
+        Payloads are delivered in one piece once they are fully buffered.
+        Payloads larger than the buffer itself are delivered a buffer-full at a
+        time, with the number of bytes still to come passed along.
+
+        Returns:
+            bool: True if bytes were delivered, False if more data is needed.
+        """
+        start = self._read
+        available = self._write - start
+        remaining = self._ipd_remaining
+
+        if available < remaining and (
+            remaining <= len(self._buffer) or self._write < len(self._buffer)
+        ):
+            return False
+
+        count = min(available, remaining)
+        remaining -= count
+
+        self._read = self._scan = start + count
+        self._ipd_remaining = remaining
+
+        self._on_connection_data(
+            self._ipd_connection_id,
+            self._view[start : start + count],
+            remaining,
+        )
+
+        return True
+
+    def _process_line(self, start: int, end: int) -> None:
+        buffer = self._buffer
+
+        # <id>,CONNECT or <id>,CLOSED
+        if (
+            end - start > 2
+            and _ORD_0 <= buffer[start] <= _ORD_9
+            and buffer[start + 1] == _ORD_COMMA
+        ):
+            if self._match(start + 2, end, _MSG_URC_CONNECT):
+                self._on_connection_opened(buffer[start] - _ORD_0)
+                return
+
+            if self._match(start + 2, end, _MSG_URC_CLOSED):
+                self._on_connection_closed(buffer[start] - _ORD_0)
+                return
+
+        self._on_line(self._view[start:end])
+
+    def _match(self, start: int, end: int, expected: bytes) -> bool:
+        if end - start != len(expected):
+            return False
+
+        buffer = self._buffer
+        for i in range(len(expected)):
+            if buffer[start + i] != expected[i]:
+                return False
+
+        return True
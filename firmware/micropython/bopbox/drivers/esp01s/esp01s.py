@@ -1,10 +1,13 @@
-import machine
+import utime
 import uasyncio
 
 from typing import Callable
 from micropython import const
 
-from . import _tcp
+from . import _scheduler, _tcp, _tokenizer
+from ._tcp import TCPServerConnectionBuffer
+from ..transport import UARTTransport
+from ...services import metrics
 
 
 _DEFAULT_UART_ID = const(1)
@@ -15,10 +18,18 @@ _DEFAULT_UART_TX_BUFFER_LEN = const(1024)
 _DEFAULT_UART_RX_BUFFER_LEN = const(_DEFAULT_UART_TX_BUFFER_LEN * 2)
 
 _DEFAULT_CMD_TIMEOUT_MS = const(5000)  # 5 seconds
+_DEFAULT_SEND_TIMEOUT_MS = const(5000)  # 5 seconds
+
+# Time for the ESP to switch baud rates after acknowledging AT+UART_CUR
+_UART_BAUD_RATE_SETTLE_MS = const(20)
+
+# The most AT+CIPSEND accepts in a single send
+_TCP_SEND_DATA_MAX_LEN = const(2048)
 
 # Basic AT Commands
 # ref: https://espressif-docs.readthedocs-hosted.com/projects/esp-at/en/release-v2.3.0.0_esp8266/AT_Command_Set/Basic_AT_Commands.html
 _CMD_TEST = const(b"AT")
+_CMD_SET_UART_CURRENT = const(b"AT+UART_CUR=")
 # WiFi AT Commands
 # ref: https://espressif-docs.readthedocs-hosted.com/projects/esp-at/en/release-v2.3.0.0_esp8266/AT_Command_Set/Wi-Fi_AT_Commands.html
 _CMD_WIFI_GET_MODE = const(b"AT+CWMODE?")
@@ -34,11 +45,51 @@ _CMD_TCP_STOP_SERVER = const(b"AT+CIPSERVER=")
 _CMD_TCP_SET_IPD_MESSAGE_MODE = const(b"AT+CIPDINFO=")
 _CMD_TCP_SEND_DATA = const(b"AT+CIPSEND=")
 _CMD_TCP_SEND_DATA_EX = const(b"AT+CIPSEND=")
+_CMD_TCP_CLOSE_CONNECTION = const(b"AT+CIPCLOSE=")
+_CMD_TCP_SET_SERVER_TIMEOUT = const(b"AT+CIPSTO=")
 
 _CMD_RESPONSE_OK = const(b"OK\r\n")
 _CMD_RESPONSE_ERROR = const(b"ERROR\r\n")
 _CMD_RESPONSE_FAIL = const(b"FAIL\r\n")
 
+_CMD_RESPONSE_SEND_OK = const(b"SEND OK\r\n")
+
+_CMD_RESPONSE_LINE_OK = const(b"OK")
+_CMD_RESPONSE_LINE_ERROR = const(b"ERROR")
+_CMD_RESPONSE_LINE_FAIL = const(b"FAIL")
+_CMD_RESPONSE_LINE_SEND_OK = const(b"SEND OK")
+_CMD_RESPONSE_LINE_SEND_FAIL = const(b"SEND FAIL")
+_CMD_RESPONSE_LINE_BUSY_PROCESSING = const(b"busy p...")
+_CMD_RESPONSE_LINE_BUSY_SENDING = const(b"busy s...")
+_CMD_RESPONSE_PROMPT = const(b">")
+
+_CMD_LINE_ENDING = const(b"\r\n")
+
+# the ESP rejects commands it cannot take yet with a lone busy line
+_CMD_RESPONSE_ENDINGS = (
+    _CMD_RESPONSE_LINE_OK,
+    _CMD_RESPONSE_LINE_ERROR,
+    _CMD_RESPONSE_LINE_FAIL,
+    _CMD_RESPONSE_LINE_BUSY_PROCESSING,
+    _CMD_RESPONSE_LINE_BUSY_SENDING,
+)
+
+# AT+CIPSEND answers with OK followed by the > prompt, or ERROR if the link is gone
+_CMD_RESPONSE_ENDINGS_SEND_PROMPT = (
+    _CMD_RESPONSE_PROMPT,
+    _CMD_RESPONSE_LINE_ERROR,
+    _CMD_RESPONSE_LINE_FAIL,
+    _CMD_RESPONSE_LINE_BUSY_PROCESSING,
+    _CMD_RESPONSE_LINE_BUSY_SENDING,
+)
+
+# once the data is written the ESP answers with Recv <n> bytes and then SEND OK/FAIL
+_CMD_RESPONSE_ENDINGS_SEND_DATA = (
+    _CMD_RESPONSE_LINE_SEND_OK,
+    _CMD_RESPONSE_LINE_SEND_FAIL,
+    _CMD_RESPONSE_LINE_ERROR,
+)
+
 WIFI_MODE_OFF = const(0)
 WIFI_MODE_STATION = const(1)
 WIFI_MODE_ACCESS_POINT = const(2)
@@ -47,25 +98,47 @@ WIFI_MODE_BOTH = const(WIFI_MODE_STATION + WIFI_MODE_ACCESS_POINT)
 SERVER_MULTIPLEXING_MODE_OFF = const(0)
 SERVER_MULTIPLEXING_MODE_ON = const(1)
 
+# Series of AT+CIPSEND, timed from the command to SEND OK
+_METRICS_COMMAND_SEND_DATA = const(b"+CIPSEND")
+# Distinct AT commands timed separately, the rest are counted together
+_METRICS_MAX_COMMANDS = const(16)
+
+_command_duration = metrics.histogram(
+    b"bopbox_esp01s_command_duration_seconds",
+    b"Round trip time of the AT commands sent to the ESP01S.",
+    label=b"command",
+    max_series=_METRICS_MAX_COMMANDS,
+)
+_command_timeouts = metrics.counter(
+    b"bopbox_esp01s_command_timeouts_total",
+    b"AT commands the ESP01S did not answer in time.",
+    label=b"command",
+    max_series=_METRICS_MAX_COMMANDS,
+)
+
 
 class ESP01S:
     __slots__ = (
-        "_uart",
-        "_cmd_lock",
+        "_transport",
+        "_scheduler",
         "_cmd_response_prefix",
+        "_cmd_response_endings",
         "_cmd_response_bytes",
         "_cmd_response_complete",
         "_tcp_server",
+        "_tokenizer",
     )
 
-    _uart: machine.UART
+    _transport: UARTTransport
 
-    _cmd_lock: uasyncio.Lock
+    _scheduler: _scheduler.ATCommandScheduler
     _cmd_response_prefix: bytes
+    _cmd_response_endings: tuple[bytes, ...]
     _cmd_response_bytes: bytes
     _cmd_response_complete: uasyncio.Event
 
     _tcp_server: _tcp.TCPServer
+    _tokenizer: _tokenizer.ATTokenizer
 
     def __init__(
         self,
@@ -74,18 +147,18 @@ class ESP01S:
         rx_pin: int = _DEFAULT_UART_RX_PIN,
         on_tcp_connection_opened: Callable[[int], None] | None = None,
         on_tcp_connection_closed: Callable[[int], None] | None = None,
-        on_tcp_connection_data: Callable[[int, memoryview], None] | None = None,
+        on_tcp_connection_data: Callable[[int, TCPServerConnectionBuffer], None] | None = None,
     ):
-        self._uart = machine.UART(
+        self._transport = UARTTransport(
             uart_id,
-            tx=machine.Pin(tx_pin),
-            rx=machine.Pin(rx_pin),
+            tx_pin=tx_pin,
+            rx_pin=rx_pin,
+            baudrate=_DEFAULT_UART_BAUD_RATE,
             txbuf=_DEFAULT_UART_TX_BUFFER_LEN,
             rxbuf=_DEFAULT_UART_RX_BUFFER_LEN,
-            baudrate=_DEFAULT_UART_BAUD_RATE,
         )
 
-        self._cmd_lock = uasyncio.Lock()
+        self._scheduler = _scheduler.ATCommandScheduler()
         self._cmd_response_complete = uasyncio.Event()
 
         self._tcp_server = _tcp.TCPServer(
@@ -94,10 +167,20 @@ class ESP01S:
             on_tcp_connection_data,
         )
 
+        self._tokenizer = _tokenizer.ATTokenizer(
+            on_line=self._handle_line,
+            on_prompt=self._handle_prompt,
+            on_connection_opened=self._tcp_server.handle_connection_opened,
+            on_connection_closed=self._tcp_server.handle_connection_closed,
+            on_connection_data=self._tcp_server.handle_connection_data,
+            buffer_len=_DEFAULT_UART_RX_BUFFER_LEN,
+        )
+
         self._flush()
 
     def _flush(self):
         self._cmd_response_prefix = b""
+        self._cmd_response_endings = ()
         self._cmd_response_bytes = b""
 
     def _get_cmd_response_prefix(self, command: bytes) -> bytes:
@@ -187,52 +270,107 @@ class ESP01S:
         self,
         command: bytes,
         timeout_ms: int = _DEFAULT_CMD_TIMEOUT_MS,
+        priority: int = _scheduler.PRIORITY_CONFIG,
     ):
-        async with self._cmd_lock:
-            self._cmd_response_prefix = self._get_cmd_response_prefix(command)
-            self._cmd_response_bytes = b""
-            self._cmd_response_complete.clear()
+        deadline = utime.ticks_add(utime.ticks_ms(), timeout_ms)
+        prefix = self._get_cmd_response_prefix(command)
+
+        await self._scheduler.acquire(priority, deadline)
+        try:
+            # timed from the command going out, not from when it was queued
+            started = utime.ticks_ms()
+            response = await self._exchange(
+                command,
+                _CMD_LINE_ENDING,
+                prefix,
+                _CMD_RESPONSE_ENDINGS,
+                deadline,
+            )
+            _command_duration.observe(
+                utime.ticks_diff(utime.ticks_ms(), started),
+                _command_duration.series(prefix),
+            )
 
-            self._uart.write(command + b"\r\n")
+            return response
+        except uasyncio.TimeoutError:
+            _command_timeouts.inc(_command_timeouts.series(prefix))
+            raise
+        finally:
+            self._scheduler.release()
 
-            await uasyncio.wait_for(
-                self._cmd_response_complete.wait(), timeout_ms / 1000
-            )
+    async def _exchange(
+        self,
+        data: bytes | memoryview,
+        ending: bytes | None,
+        prefix: bytes,
+        endings: tuple[bytes, ...],
+        deadline: int,
+    ) -> bytes:
+        """
+        Write data to the ESP01S and wait for one of the expected response endings.
 
-            response = self._cmd_response_bytes
+        The data and its line ending are written separately so callers never
+        have to build a concatenated copy. Must be called while holding the
+        command channel from the scheduler.
 
+        Args:
+            data: The command or payload to write.
+            ending: Written after data, e.g. the \\r\\n terminating a command.
+            prefix: Response lines starting with this prefix are collected.
+            endings: Lines (or the > prompt) that complete the response.
+            deadline: utime.ticks_ms() value to stop waiting for the response at.
+
+        Returns:
+            bytes: The collected response lines, each terminated by \\r\\n.
+        """
+        self._cmd_response_prefix = prefix
+        self._cmd_response_endings = endings
+        self._cmd_response_bytes = b""
+        self._cmd_response_complete.clear()
+
+        try:
+            await self._transport.write(data)
+            if ending:
+                await self._transport.write(ending)
+
+            await uasyncio.wait_for_ms(
+                self._cmd_response_complete.wait(),
+                max(0, utime.ticks_diff(deadline, utime.ticks_ms())),
+            )
+
+            return self._cmd_response_bytes
+        finally:
             self._cmd_response_complete.clear()
             self._flush()
 
-            return response
+    def _handle_line(self, line: memoryview) -> None:
+        # Lines are only interesting while we are waiting on a command response
+        if not self._cmd_response_endings:
+            return
+
+        line = bytes(line)
+        is_ending = line in self._cmd_response_endings
+
+        if is_ending or line.startswith(self._cmd_response_prefix):
+            self._cmd_response_bytes += line + _CMD_LINE_ENDING
+
+            if is_ending:
+                self._cmd_response_complete.set()
+
+    def _handle_prompt(self) -> None:
+        if _CMD_RESPONSE_PROMPT in self._cmd_response_endings:
+            self._cmd_response_bytes += _CMD_RESPONSE_PROMPT
+            self._cmd_response_complete.set()
 
     async def receive(self) -> None:
-        if self._uart.any():
-            chunk = self._uart.read()
-            if chunk:
-                # Handle tcp server messages
-                if self._tcp_server:
-                    self._tcp_server.handle_message(chunk)
-
-                # Handle responses if we sent a command
-                if self._cmd_lock.locked:
-                    has_prefix = self._cmd_response_prefix in chunk
-                    has_ending = any(
-                        prefix in chunk
-                        for prefix in (
-                            _CMD_RESPONSE_OK,
-                            _CMD_RESPONSE_ERROR,
-                            _CMD_RESPONSE_FAIL,
-                        )
-                    )
-
-                    if has_prefix or has_ending:
-                        self._cmd_response_bytes += chunk
-
-                        if has_ending:
-                            self._cmd_response_complete.set()
-
-        await uasyncio.sleep(0.01)
+        """
+        Wait for data from the ESP01S and process it.
+
+        Reads straight into the tokenizer's buffer, returning as soon as
+        whatever arrived has been handled.
+        """
+        tokenizer = self._tokenizer
+        tokenizer.commit(await self._transport.readinto(tokenizer.reserve()))
 
     async def test(self) -> bool:
         """
@@ -241,7 +379,82 @@ class ESP01S:
         Returns:
             bool: True if we get a successful response, False otherwise.
         """
-        return _CMD_RESPONSE_OK in await self._send_command(_CMD_TEST)
+        return _CMD_RESPONSE_OK in await self._send_command(
+            _CMD_TEST,
+            priority=_scheduler.PRIORITY_QUERY,
+        )
+
+    async def set_uart_baud_rate(self, baudrate: int) -> bool:
+        """
+        Switch the UART link with the ESP01S to a different baud rate.
+
+        Sends AT+UART_CUR, which is not saved to the ESP's flash so a reset
+        always brings it back to the default rate, reconfigures the local UART
+        to match and verifies the link with a test command. If the ESP does
+        not answer at the new rate, both sides are switched back.
+
+        Args:
+            baudrate: The baud rate to switch to, e.g. 921600.
+
+        Returns:
+            bool: True if the link is now running at baudrate, False if it is
+                still running at the previous rate.
+        """
+        previous = self._transport.baudrate
+        if baudrate == previous:
+            return True
+
+        try:
+            switched = await self._switch_uart_baud_rate(baudrate)
+        except uasyncio.TimeoutError:
+            switched = False
+
+        if not switched:
+            return False
+
+        if await self._verify_uart():
+            return True
+
+        # The ESP took the new rate but we cannot talk to it, ask it (at the new
+        # rate) to go back and follow it regardless of what it answers.
+        try:
+            await self._switch_uart_baud_rate(previous)
+        except uasyncio.TimeoutError:
+            pass
+
+        self._set_local_uart_baud_rate(previous)
+        await self._verify_uart()
+
+        return False
+
+    async def _switch_uart_baud_rate(self, baudrate: int) -> bool:
+        response = await self._send_command(
+            _CMD_SET_UART_CURRENT
+            + self._build_params(
+                # <baudrate>,<databits>,<stopbits>,<parity>,<flow control>
+                required=[str(baudrate).encode(), b"8", b"1", b"0", b"0"],
+            ),
+        )
+
+        if _CMD_RESPONSE_OK not in response:
+            return False
+
+        # the ESP answers at the old rate, then switches
+        await uasyncio.sleep_ms(_UART_BAUD_RATE_SETTLE_MS)
+        self._set_local_uart_baud_rate(baudrate)
+
+        return True
+
+    def _set_local_uart_baud_rate(self, baudrate: int) -> None:
+        self._transport.set_baudrate(baudrate)
+        self._transport.flush_input()
+        self._tokenizer.reset()
+
+    async def _verify_uart(self) -> bool:
+        try:
+            return await self.test()
+        except uasyncio.TimeoutError:
+            return False
 
     async def set_wifi_mode(self, mode=WIFI_MODE_BOTH) -> bool:
         """
@@ -268,6 +481,11 @@ class ESP01S:
         """
         Asks the ESP01S to connect to the specified access point ssid.
 
+        This can take up to 30 seconds, during which the ESP answers every
+        other command with busy. It is queued at configuration priority so it
+        never starts ahead of pending data sends, and sends queued behind it
+        give up at their own deadline instead of waiting it out.
+
         Returns:
             bool: True if we connected, False otherwise
         """
@@ -393,9 +611,151 @@ class ESP01S:
 
         return _CMD_RESPONSE_OK in response
 
+    async def set_tcp_server_timeout(self, timeout_s: int) -> bool:
+        """
+        Set how long the TCP server keeps idle client connections open.
+
+        Sends the AT+CIPSTO=<timeout_s> command. The ESP closes any client
+        connection that has not sent anything for that long itself.
+
+        Args:
+            timeout_s: The idle timeout in seconds (0-7200, 0 never times out).
+
+        Returns:
+            bool: True if the timeout was successfully set, False otherwise.
+        """
+
+        response = await self._send_command(
+            _CMD_TCP_SET_SERVER_TIMEOUT
+            + self._build_params(
+                required=[str(timeout_s).encode()],
+            )
+        )
+
+        return _CMD_RESPONSE_OK in response
+
+    async def close_tcp_server_connection(self, connection_id: int) -> bool:
+        """
+        Close a client connection of the TCP server.
+
+        Sends the AT+CIPCLOSE=<connection_id> command. The ESP reports the
+        closed connection with the usual <id>,CLOSED message.
+
+        Args:
+            connection_id: The connection to close (0-4).
+
+        Returns:
+            bool: True if the connection was closed, False otherwise.
+        """
+
+        try:
+            response = await self._send_command(
+                _CMD_TCP_CLOSE_CONNECTION
+                + self._build_params(
+                    required=[str(connection_id).encode()],
+                ),
+                priority=_scheduler.PRIORITY_SEND,
+            )
+        except uasyncio.TimeoutError:
+            return False
+
+        return _CMD_RESPONSE_OK in response
+
     async def send_tcp_server_connection_data(
         self,
         connection_id: int,
         data: memoryview,
-    ) -> None:
-        pass
+        timeout_ms: int = _DEFAULT_SEND_TIMEOUT_MS,
+    ) -> bool:
+        """
+        Send data to a client connected to the TCP server.
+
+        The data is split into segments of at most 2048 bytes (the most a
+        single AT+CIPSEND accepts), each sent as AT+CIPSEND=<id>,<len>, waiting
+        for the > prompt, writing the segment straight from the memoryview and
+        waiting for SEND OK.
+
+        The command channel is requested per segment at the highest priority,
+        so sends jump ahead of queued queries and configuration commands, and
+        sends to the other multiplexed connections are interleaved segment by
+        segment instead of waiting for one large (or slow) client to finish.
+
+        Args:
+            connection_id: The connection to send to (0-4).
+            data: The data to send.
+            timeout_ms: How long to wait for each segment to be sent.
+
+        Returns:
+            bool: True if all the data was sent, False otherwise.
+        """
+        view = memoryview(data)
+        sent = 0
+
+        while sent < len(view):
+            if not self._tcp_server.is_connection_open(connection_id):
+                return False
+
+            segment = view[sent : sent + _TCP_SEND_DATA_MAX_LEN]
+            if not await self._send_tcp_segment(connection_id, segment, timeout_ms):
+                return False
+
+            sent += len(segment)
+
+        return True
+
+    async def _send_tcp_segment(
+        self,
+        connection_id: int,
+        segment: memoryview,
+        timeout_ms: int,
+    ) -> bool:
+        deadline = utime.ticks_add(utime.ticks_ms(), timeout_ms)
+
+        try:
+            await self._scheduler.acquire(_scheduler.PRIORITY_SEND, deadline)
+        except uasyncio.TimeoutError:
+            return False
+
+        try:
+            started = utime.ticks_ms()
+            response = await self._exchange(
+                _CMD_TCP_SEND_DATA
+                + self._build_params(
+                    required=[str(connection_id).encode(), str(len(segment)).encode()]
+                ),
+                _CMD_LINE_ENDING,
+                _CMD_RESPONSE_PROMPT,
+                _CMD_RESPONSE_ENDINGS_SEND_PROMPT,
+                deadline,
+            )
+
+            if _CMD_RESPONSE_PROMPT not in response:
+                return False
+
+            response = await self._exchange(
+                segment,
+                None,
+                _CMD_RESPONSE_LINE_SEND_OK,
+                _CMD_RESPONSE_ENDINGS_SEND_DATA,
+                deadline,
+            )
+
+            _command_duration.observe(
+                utime.ticks_diff(utime.ticks_ms(), started),
+                _command_duration.series(_METRICS_COMMAND_SEND_DATA),
+            )
+
+            return _CMD_RESPONSE_SEND_OK in response
+        except uasyncio.TimeoutError:
+            _command_timeouts.inc(_command_timeouts.series(_METRICS_COMMAND_SEND_DATA))
+            return False
+        finally:
+            self._scheduler.release()
+
+    def get_command_stats(self) -> dict:
+        """
+        Returns:
+            dict: Queue depth and wait time statistics of the AT command
+                scheduler, see ATCommandScheduler.get_stats().
+        """
+        return self._scheduler.get_stats()
@@ -1,3 +1,4 @@
-__all__ = ["PN532"]
+__all__ = ["PN532", "SPITransport"]
 
 from .pn532 import PN532
+from .spi import SPITransport
@@ -1,11 +1,12 @@
 import utime
 import uasyncio
-import machine
 
 from typing import Callable
 from micropython import const
 
-from ...services import logger
+from ...services import logger, metrics
+from ..transport import UARTTransport
+from .spi import SPITransport
 
 
 _DEFAULT_UART_ID = const(0)
@@ -17,9 +18,89 @@ _DEFAULT_UART_RX_BUFFER_LEN = const(_DEFAULT_UART_TX_BUFFER_LEN * 5)
 
 _DEFAULT_CMD_TIMEOUT_MS = const(5000)  # 5 seconds
 
+# Time for the PN532 to switch baud rates after the host acknowledges SetSerialBaudRate
+_UART_BAUD_RATE_SETTLE_MS = const(10)
+
 # ref: https://www.nxp.com/docs/en/user-guide/141520.pdf (§7)
 _CMD_GET_FIRMWARE_VERSION = const(0x02)
+_CMD_SET_SERIAL_BAUD_RATE = const(0x10)
+_CMD_POWER_DOWN = const(0x16)
+_CMD_SAM_CONFIGURATION = const(0x14)
+_CMD_RF_CONFIGURATION = const(0x32)
+_CMD_IN_DATA_EXCHANGE = const(0x40)
 _CMD_IN_LIST_PASSIVE_TARGET = const(0x4A)
+_CMD_IN_AUTO_POLL = const(0x60)
+
+# InAutoPoll (§7.3.13): the period is given in units of 150ms and a poll count
+# of 0xFF polls forever, which would leave no way to tell a lost command apart
+_AUTO_POLL_PERIOD_UNIT_MS = const(150)
+_AUTO_POLL_MAX_COUNT = const(0xFE)
+# ~1.5 seconds per command for one type, so that other commands never wait
+# long for the PN532 while it is auto-polling
+_DEFAULT_AUTO_POLL_COUNT = const(10)
+_DEFAULT_AUTO_POLL_PERIOD = const(1)
+
+# WakeUpEnable of PowerDown (§7.2.11)
+WAKE_UP_RF = const(0x08)  # an external RF field, i.e. a phone or another reader
+WAKE_UP_HSU = const(0x10)  # the host sending the wake-up preamble
+WAKE_UP_SPI = const(0x20)  # the host pulling NSS low
+
+# Status byte of InDataExchange, the low 6 bits are the error code (§7.1)
+_STATUS_ERROR_MASK = const(0x3F)
+
+# The first target activated by InListPassiveTarget or InAutoPoll
+_TARGET_NUMBER = const(0x01)
+
+# ref: https://www.nxp.com/docs/en/data-sheet/NTAG213_215_216.pdf (§10)
+_NTAG_CMD_FAST_READ = const(0x3A)
+_NTAG_PAGE_LEN = const(4)
+# Pages per FAST_READ that keep the response (TFI, command code and status
+# included) within a normal information frame
+_NTAG_MAX_FAST_READ_PAGES = const(60)
+
+# Baud rate and modulation of the targets to list with InListPassiveTarget
+# (§7.3.5), the same codes as the generic passive target types of InAutoPoll
+BAUD_RATE_106A = const(0x00)  # ISO/IEC14443 Type A: Mifare, NTAG
+BAUD_RATE_212F = const(0x01)  # FeliCa 212 kbps
+BAUD_RATE_424F = const(0x02)  # FeliCa 424 kbps
+BAUD_RATE_106B = const(0x03)  # ISO/IEC14443-3 Type B
+
+BAUD_RATE_NAMES = {
+    BAUD_RATE_106A: b"106A",
+    BAUD_RATE_212F: b"212F",
+    BAUD_RATE_424F: b"424F",
+    BAUD_RATE_106B: b"106B",
+}
+
+# InAutoPoll answers with the type of the target it found, which for the
+# generic types it was asked to poll for is the more specific one (§7.3.13)
+_AUTO_POLL_TYPE_BAUD_RATES = {
+    0x10: BAUD_RATE_106A,  # Mifare
+    0x20: BAUD_RATE_106A,  # ISO/IEC14443-4A
+    0x11: BAUD_RATE_212F,  # FeliCa 212 kbps
+    0x12: BAUD_RATE_424F,  # FeliCa 424 kbps
+    0x23: BAUD_RATE_106B,  # ISO/IEC14443-4B
+}
+
+# Targets the PN532 can list or auto-poll at once
+MAX_TARGETS = const(2)
+
+# InitiatorData of FeliCa: a polling request for any system code, without
+# request code, in a single time slot
+_FELICA_POLLING_REQUEST = (0x00, 0xFF, 0xFF, 0x00, 0x00)
+# InitiatorData of Type B: the AFI, 0x00 for every application family
+_ISO14443B_AFI_ANY = const(0x00)
+
+# SEL_RES bit of a Type A target compliant with ISO/IEC14443-4, which the
+# PN532 has sent RATS to, so its target data ends with the ATS
+_SEL_RES_ISO14443_4 = const(0x20)
+_ATQB_LEN = const(12)
+# Offset and length of the PUPI in the ATQB, a Type B card's identifier
+_ATQB_PUPI_OFFSET = const(1)
+_ATQB_PUPI_LEN = const(4)
+# Offset and length of the NFCID2 in the POL_RES of FeliCa, after its length and response code
+_POL_RES_NFCID2_OFFSET = const(2)
+_POL_RES_NFCID2_LEN = const(8)
 
 # ref: https://www.nxp.com/docs/en/user-guide/141520.pdf (§6.2.1.1)
 _FRAME_PART_PREAMBLE = const(0x00)
@@ -30,6 +111,15 @@ _FRAME_PART_HOST_TO_PN532 = const(0xD4)
 _FRAME_PART_PN532_TO_HOST = const(0xD5)
 
 _FRAME_WAKE_UP = const(b"\x55\x55\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00")
+_FRAME_ACK = const(b"\x00\x00\xFF\x00\xFF\x00")
+
+# SetSerialBaudRate takes the index of the rate in this table (§7.2.13)
+_SERIAL_BAUD_RATES = (9600, 19200, 38400, 57600, 115200, 230400, 460800, 921600, 1288000)
+
+# A normal information frame carries at most 255 bytes (TFI included)
+_FRAME_MAX_LEN = const(255)
+# Frames that can be waiting to be handled before the oldest is dropped
+_FRAME_QUEUE_LEN = const(4)
 
 _FRAME_TYPE_ACK = const(0)
 _FRAME_TYPE_NACK = const(1)
@@ -43,46 +133,114 @@ _FRAME_PARSER_STATE_PARSE_BODY = const(4)
 _FRAME_PARSER_STATE_PARSE_DCS = const(5)
 _FRAME_PARSER_STATE_PARSE_POSTAMBLE = const(6)
 
+# Label values of the commands in the metrics, any other is labelled by its code
+_METRICS_COMMAND_NAMES = {
+    _CMD_GET_FIRMWARE_VERSION: b"GetFirmwareVersion",
+    _CMD_SET_SERIAL_BAUD_RATE: b"SetSerialBaudRate",
+    _CMD_POWER_DOWN: b"PowerDown",
+    _CMD_SAM_CONFIGURATION: b"SAMConfiguration",
+    _CMD_RF_CONFIGURATION: b"RFConfiguration",
+    _CMD_IN_DATA_EXCHANGE: b"InDataExchange",
+    _CMD_IN_LIST_PASSIVE_TARGET: b"InListPassiveTarget",
+    _CMD_IN_AUTO_POLL: b"InAutoPoll",
+}
+_METRICS_MAX_COMMANDS = const(10)
+
+_command_duration = metrics.histogram(
+    b"bopbox_pn532_command_duration_seconds",
+    b"Time from sending a command to the PN532 to receiving its response.",
+    label=b"command",
+    max_series=_METRICS_MAX_COMMANDS,
+)
+_command_errors = metrics.counter(
+    b"bopbox_pn532_command_errors_total",
+    b"PN532 commands that failed or were not answered in time.",
+    label=b"command",
+    max_series=_METRICS_MAX_COMMANDS,
+)
+_frame_errors = metrics.counter(
+    b"bopbox_pn532_frame_errors_total",
+    b"Malformed frames received from the PN532.",
+)
+
 
 class PN532Frame:
+    """
+    A frame received from the PN532.
+
+    Frames are preallocated by the parser and reused, see PN532FrameParser.
+    """
+
     __slots__ = (
         "type",
         "command",
-        "data",
+        "length",
+        "_buffer",
+        "_view",
     )
 
     type: int
     command: int | None
-    data: bytearray | None
+    length: int  # of the frame body, TFI and command code included
+
+    _buffer: bytearray
+    _view: memoryview
+
+    def __init__(self) -> None:
+        self.type = _FRAME_TYPE_ACK
+        self.command = None
+        self.length = 0
+        self._buffer = bytearray(_FRAME_MAX_LEN)
+        self._view = memoryview(self._buffer)
+
+    @property
+    def data(self) -> memoryview | None:
+        """The data following the command code of a data frame, None for (N)ACK frames."""
+        if self.type != _FRAME_TYPE_DATA:
+            return None
 
-    def __init__(
-        self,
-        type: int,
-        command: int | None = None,
-        data: bytearray | None = None,
-    ) -> None:
-        self.type = type
-        self.command = command
-        self.data = data
+        return self._view[2 : self.length]
 
 
 class PN532FrameParser:
+    """
+    Incremental parser for the frames received from the PN532.
+
+    Frame bodies are written straight into a fixed ring of preallocated
+    frames, which doubles as the queue of frames waiting to be handled, and
+    the data checksum is summed as the body arrives. Parsing a frame
+    therefore allocates nothing.
+
+    A frame handed out by pop() stays valid until _FRAME_QUEUE_LEN - 1
+    further frames have been received, since its slot is then reused. When
+    frames are not popped fast enough the oldest ones are dropped.
+    """
+
     __slots__ = (
         "_state",
-        "_buffer",
+        "_frames",
+        "_head",
+        "_count",
+        "_frame",
         "_pos",
         "_len",
         "_lcs",
+        "_dcs",
         "_on_error",
         "_on_frame",
     )
 
     _state: int
 
-    _buf: bytearray
+    _frames: tuple[PN532Frame, ...]
+    _head: int
+    _count: int
+
+    _frame: PN532Frame  # the slot the frame being parsed is written to
     _pos: int
     _len: int
     _lcs: int
+    _dcs: int
 
     _on_error: Callable[[PN532Error], None]
     _on_frame: Callable[[PN532Frame], None]
@@ -92,31 +250,77 @@ class PN532FrameParser:
         on_error: Callable[[PN532Error], None],
         on_frame: Callable[[PN532Frame], None],
     ) -> None:
-        self._state = _FRAME_PARSER_STATE_IDLE
-        self._buffer = bytearray(_DEFAULT_UART_RX_BUFFER_LEN)
-        self._pos = 0
-        self._len = 0
-        self._lcs = 0
+        self._frames = tuple(PN532Frame() for _ in range(_FRAME_QUEUE_LEN))
+        self._head = 0
+        self._count = 0
         self._on_error = on_error
         self._on_frame = on_frame
+        self.reset()
+
+    def __len__(self) -> int:
+        return self._count
 
     def reset(self) -> None:
+        """Drop the frame being parsed, keeping the frames already queued."""
         self._state = _FRAME_PARSER_STATE_IDLE
+        self._frame = self._frames[(self._head + self._count) % _FRAME_QUEUE_LEN]
         self._pos = 0
         self._len = 0
         self._lcs = 0
+        self._dcs = 0
+
+    def clear(self) -> None:
+        """Drop the frame being parsed and every queued frame."""
+        self._head = 0
+        self._count = 0
+        self.reset()
+
+    def pop(self) -> PN532Frame | None:
+        """
+        Returns:
+            PN532Frame | None: The oldest queued frame, or None if there is none.
+        """
+        if not self._count:
+            return None
+
+        frame = self._frames[self._head]
+        self._head = (self._head + 1) % _FRAME_QUEUE_LEN
+        self._count -= 1
+
+        return frame
 
     def _signal_error(self, error: PN532Error) -> None:
         self._on_error(error)
         self.reset()
 
-    def _signal_frame(self, frame: PN532Frame) -> None:
+    def _signal_frame(self, type: int) -> None:
+        frame = self._frame
+        frame.type = type
+        frame.length = self._len
+        frame.command = frame._buffer[1] if type == _FRAME_TYPE_DATA else None
+
+        if self._count == _FRAME_QUEUE_LEN:
+            # full, drop the oldest frame to make room
+            self._head = (self._head + 1) % _FRAME_QUEUE_LEN
+            self._count -= 1
+
+        self._count += 1
+        self._state = _FRAME_PARSER_STATE_IDLE
+        self._frame = self._frames[(self._head + self._count) % _FRAME_QUEUE_LEN]
+
         self._on_frame(frame)
 
-    def process(self, data: bytes) -> None:
-        buffer = self._buffer
+    def process(self, data: bytes | bytearray | memoryview, length: int = -1) -> None:
+        """
+        Parse received bytes, queueing every frame they complete.
 
-        for i in range(len(data)):
+        Args:
+            data: The received bytes.
+            length: How many bytes of data to parse, all of them if negative.
+        """
+        buffer = self._frame._buffer
+
+        for i in range(len(data) if length < 0 else length):
             byte = data[i]
             state = self._state
 
@@ -149,44 +353,181 @@ class PN532FrameParser:
                     self._signal_error(PN532Error(f"Bad LCS: {lcs}"))
                 elif ln < 1:
                     self._signal_error(PN532Error("Empty Frame"))
-                elif ln > len(self._buffer):
-                    self._signal_error(PN532Error(f"Frame too large: {ln}"))
                 else:
+                    # the frame is written to the next free slot of the ring
+                    buffer = self._frame._buffer
                     self._pos = 0
+                    self._dcs = 0
                     self._state = _FRAME_PARSER_STATE_PARSE_BODY
 
             elif state == _FRAME_PARSER_STATE_PARSE_BODY:
                 buffer[self._pos] = byte
                 self._pos += 1
+                self._dcs += byte
                 if self._pos >= self._len:
                     self._state = _FRAME_PARSER_STATE_PARSE_DCS
 
             elif state == _FRAME_PARSER_STATE_PARSE_DCS:
-                dcs_sum = byte
-                for j in range(self._len):
-                    dcs_sum += buffer[j]
-
-                if dcs_sum & 0xFF != 0:
-                    self._signal_error(PN532Error(f"Bad DCS: {dcs_sum}"))
+                if (self._dcs + byte) & 0xFF != 0:
+                    self._signal_error(PN532Error(f"Bad DCS: {self._dcs + byte}"))
                 else:
                     self._state = _FRAME_PARSER_STATE_PARSE_POSTAMBLE
 
             elif state == _FRAME_PARSER_STATE_PARSE_POSTAMBLE:
                 ln = self._len
                 if ln == 0:
-                    self._signal_frame(PN532Frame(_FRAME_TYPE_ACK))
+                    self._signal_frame(_FRAME_TYPE_ACK)
                 elif ln == 0xFF:
-                    self._signal_frame(PN532Frame(_FRAME_TYPE_NACK))
-                elif buffer[0] != _FRAME_PART_PN532_TO_HOST:
+                    self._signal_frame(_FRAME_TYPE_NACK)
+                elif ln < 2 or buffer[0] != _FRAME_PART_PN532_TO_HOST:
                     self._signal_error(PN532Error(f"Bad TFI: {buffer[0]}"))
                 else:
-                  self._signal_frame(
-                      PN532Frame(_FRAME_TYPE_DATA, buffer[1], buffer[2:ln])
-                  )
+                    self._signal_frame(_FRAME_TYPE_DATA)
 
                 self._state = _FRAME_PARSER_STATE_IDLE
 
 
+class PassiveTarget:
+    """
+    A target listed by InListPassiveTarget or InAutoPoll.
+
+    What the fields hold depends on the target's baud rate:
+
+        106A: sens_res is the SENS_RES (ATQA), sel_res the SEL_RES (SAK), uid
+            the NFCID1 and ats the ATS, TL included, if the target is
+            ISO/IEC14443-4 compliant.
+        212F/424F: sens_res is the POL_RES (SENSF_RES) and uid the NFCID2.
+        106B: sens_res is the ATQB (SENSB_RES) and uid the PUPI.
+    """
+
+    __slots__ = (
+        "baud_rate",
+        "number",
+        "sens_res",
+        "sel_res",
+        "uid",
+        "ats",
+    )
+
+    baud_rate: int
+    number: int  # Tg, what InDataExchange addresses the target by
+    sens_res: bytes
+    sel_res: int | None
+    uid: bytes
+    ats: bytes
+
+    def __init__(
+        self,
+        baud_rate: int,
+        number: int,
+        sens_res: bytes,
+        uid: bytes,
+        sel_res: int | None = None,
+        ats: bytes = b"",
+    ) -> None:
+        self.baud_rate = baud_rate
+        self.number = number
+        self.sens_res = sens_res
+        self.sel_res = sel_res
+        self.uid = uid
+        self.ats = ats
+
+    @property
+    def baud_rate_name(self) -> bytes:
+        return BAUD_RATE_NAMES.get(self.baud_rate, b"unknown")
+
+
+def _parse_target(
+    baud_rate: int,
+    data: memoryview,
+    start: int,
+    end: int,
+) -> PassiveTarget | None:
+    """
+    Parse the TargetData of one target, data[start:end].
+
+    Returns:
+        PassiveTarget | None: The target, None if its data is truncated or of
+            an unsupported baud rate.
+    """
+    if end - start < 2 or end > len(data):
+        return None
+
+    number = data[start]
+
+    if baud_rate == BAUD_RATE_106A:
+        # Tg, SENS_RES (2), SEL_RES, NFCIDLength, NFCID1, [ATS]
+        if end - start < 5:
+            return None
+
+        uid_end = start + 5 + data[start + 4]
+        if uid_end > end:
+            return None
+
+        sel_res = data[start + 3]
+        ats = b""
+        if sel_res & _SEL_RES_ISO14443_4 and uid_end < end:
+            ats = bytes(data[uid_end : min(uid_end + data[uid_end], end)])
+
+        return PassiveTarget(
+            baud_rate,
+            number,
+            bytes(data[start + 1 : start + 3]),
+            bytes(data[start + 5 : uid_end]),
+            sel_res,
+            ats,
+        )
+
+    if baud_rate == BAUD_RATE_212F or baud_rate == BAUD_RATE_424F:
+        # Tg, POL_RES length (itself included), 0x01, NFCID2 (8), Pad (8), [SYST_CODE (2)]
+        pol_res_end = start + 1 + data[start + 1]
+        if pol_res_end > end or data[start + 1] < _POL_RES_NFCID2_OFFSET + _POL_RES_NFCID2_LEN:
+            return None
+
+        uid_start = start + 1 + _POL_RES_NFCID2_OFFSET
+        return PassiveTarget(
+            baud_rate,
+            number,
+            bytes(data[start + 2 : pol_res_end]),
+            bytes(data[uid_start : uid_start + _POL_RES_NFCID2_LEN]),
+        )
+
+    if baud_rate == BAUD_RATE_106B:
+        # Tg, ATQB (12), ATTRIB_RES length, ATTRIB_RES
+        if end - start < 1 + _ATQB_LEN:
+            return None
+
+        uid_start = start + 1 + _ATQB_PUPI_OFFSET
+        return PassiveTarget(
+            baud_rate,
+            number,
+            bytes(data[start + 1 : start + 1 + _ATQB_LEN]),
+            bytes(data[uid_start : uid_start + _ATQB_PUPI_LEN]),
+        )
+
+    return None
+
+
+def _target_data_len(baud_rate: int, data: memoryview, start: int) -> int:
+    """The length of the TargetData at data[start], as InListPassiveTarget does not give it."""
+    remaining = len(data) - start
+
+    if baud_rate == BAUD_RATE_106A and remaining >= 5:
+        length = 5 + data[start + 4]
+        if data[start + 3] & _SEL_RES_ISO14443_4 and length < remaining:
+            length += data[start + length]
+
+        return min(length, remaining)
+
+    if (baud_rate == BAUD_RATE_212F or baud_rate == BAUD_RATE_424F) and remaining >= 2:
+        return min(1 + data[start + 1], remaining)
+
+    if baud_rate == BAUD_RATE_106B and remaining > 1 + _ATQB_LEN:
+        return min(2 + _ATQB_LEN + data[start + 1 + _ATQB_LEN], remaining)
+
+    return remaining
+
+
 class PN532Error(Exception):
     def __init__(self, *args: object) -> None:
         super().__init__(*args)
@@ -195,40 +536,60 @@ class PN532Error(Exception):
 class PN532:
     __slots__ = (
         "_logger",
-        "_uart",
+        "_transport",
+        "_hsu",
         "_send_command_lock",
+        "_awake",
+        "_rx_buffer",
         "_frame_parser",
         "_frame_ready",
-        "_frame_queue",
     )
 
     _logger: logger.Logger
-    _uart: machine.UART
+    _transport: UARTTransport | SPITransport
+    _hsu: bool  # whether the transport is HSU, the UART, rather than SPI
 
     _send_command_lock: uasyncio.Lock
+    # whether the PN532 is known to be awake, so commands can skip waking it up
+    _awake: bool
+    _rx_buffer: bytearray
 
     _frame_parser: PN532FrameParser
     _frame_ready: uasyncio.Event
-    _frame_queue: list[PN532Frame]
 
     def __init__(
         self,
         uart_id: int = _DEFAULT_UART_ID,
         tx_pin: int = _DEFAULT_UART_TX_PIN,
         rx_pin: int = _DEFAULT_UART_RX_PIN,
+        transport: SPITransport | None = None,
     ):
+        """
+        Args:
+            uart_id: The UART the PN532's HSU interface is on.
+            tx_pin: The UART's TX pin.
+            rx_pin: The UART's RX pin.
+            transport: An SPITransport to talk to the PN532 over instead of
+                the UART, in which case the UART arguments are ignored.
+        """
         self._logger = logger.get_logger("pn532")
 
-        self._uart = machine.UART(
-            uart_id,
-            tx=machine.Pin(tx_pin),
-            rx=machine.Pin(rx_pin),
-            txbuf=_DEFAULT_UART_TX_BUFFER_LEN,
-            rxbuf=_DEFAULT_UART_RX_BUFFER_LEN,
-            baudrate=_DEFAULT_UART_BAUD_RATE,
-        )
+        if transport is None:
+            transport = UARTTransport(
+                uart_id,
+                tx_pin=tx_pin,
+                rx_pin=rx_pin,
+                baudrate=_DEFAULT_UART_BAUD_RATE,
+                txbuf=_DEFAULT_UART_TX_BUFFER_LEN,
+                rxbuf=_DEFAULT_UART_RX_BUFFER_LEN,
+            )
+
+        self._transport = transport
+        self._hsu = isinstance(transport, UARTTransport)
 
         self._send_command_lock = uasyncio.Lock()
+        self._awake = False
+        self._rx_buffer = bytearray(_DEFAULT_UART_RX_BUFFER_LEN)
 
         self._frame_parser = PN532FrameParser(
             on_error=self._handle_frame_parser_error,
@@ -236,7 +597,6 @@ class PN532:
         )
 
         self._frame_ready = uasyncio.Event()
-        self._frame_queue = []
 
     # ── Command Building & Sending ────────────────────────────
 
@@ -271,9 +631,23 @@ class PN532:
         self,
         command: int,
         data: list[int] = [],
+        timeout_ms: int = _DEFAULT_CMD_TIMEOUT_MS,
     ) -> PN532Frame:
         async with self._send_command_lock:
-            await self.wake_up()
+            return await self._exchange(command, data, timeout_ms)
+
+    async def _exchange(
+        self,
+        command: int,
+        data: list[int] = [],
+        timeout_ms: int = _DEFAULT_CMD_TIMEOUT_MS,
+    ) -> PN532Frame:
+        """Send a command and wait for its response, the caller holding _send_command_lock."""
+        started = utime.ticks_ms()
+
+        try:
+            if not self._awake:
+                await self.wake_up()
 
             # build and send the command frame
             command_frame = self._build_command_frame(command, data)
@@ -283,31 +657,47 @@ class PN532:
             await self._wait_frame(_FRAME_TYPE_ACK)
 
             # wait and return data frame
-            return await self._wait_frame(_FRAME_TYPE_DATA)
+            frame = await self._wait_frame(_FRAME_TYPE_DATA, timeout_ms)
+        except PN532Error:
+            # what is left of the exchange would only get in the way of the next
+            self._transport.flush_input()
+            # it may have gone back to sleep, wake it up before the next command
+            self._awake = False
+            _command_errors.inc(
+                _command_errors.series(command, _METRICS_COMMAND_NAMES.get(command))
+            )
+            raise
+
+        # it answered, so it is awake until told to power down
+        self._awake = command != _CMD_POWER_DOWN
+
+        _command_duration.observe(
+            utime.ticks_diff(utime.ticks_ms(), started),
+            _command_duration.series(command, _METRICS_COMMAND_NAMES.get(command)),
+        )
+
+        return frame
 
     # --- UART Writing -----------------------------------------
 
     async def _write_bytes(self, data: bytes | bytearray) -> None:
-        """Write data to UART, raising on failure."""
-        written = self._uart.write(data)
-        if written is None or written < len(data):
-            raise PN532Error("UART write failed: %s/%d bytes" % (written, len(data)))
+        """Write data to the transport, waiting for it to drain."""
+        await self._transport.write(data)
 
     # --- UART Reading -----------------------------------------
 
     def _handle_frame_parser_error(self, error: PN532Error) -> None:
+        _frame_errors.inc()
         self._frame_ready.clear()
 
     def _handle_frame_parser_result(self, frame: PN532Frame) -> None:
         self._frame_ready.set()
-        self._frame_queue.append(frame)
 
     async def receive(self) -> None:
-        """Read data from UART"""
-        if self._uart.any():
-            data = self._uart.read()
-            if data:
-                self._frame_parser.process(data)
+        """Wait for data from the transport and feed it to the frame parser"""
+        count = await self._transport.readinto(self._rx_buffer)
+        if count:
+            self._frame_parser.process(self._rx_buffer, count)
 
     #
 
@@ -319,8 +709,8 @@ class PN532:
         deadline = utime.ticks_add(utime.ticks_ms(), timeout_ms)
 
         while True:
-            if self._frame_queue:
-                frame = self._frame_queue.pop(0)
+            frame = self._frame_parser.pop()
+            if frame is not None:
                 if expected_type is None or frame.type == expected_type:
                     return frame
 
@@ -333,7 +723,7 @@ class PN532:
             self._frame_ready.clear()
 
             try:
-                await uasyncio.wait_for(
+                await uasyncio.wait_for_ms(
                     self._frame_ready.wait(),
                     remaining,
                 )
@@ -342,23 +732,265 @@ class PN532:
 
     # --- High-Level Commands ----------------------------------
 
+    @property
+    def awake(self) -> bool:
+        return self._awake
+
     async def wake_up(self) -> None:
-        """Wake PN532 from low-power state on HSU interface."""
-        await self._write_bytes(_FRAME_WAKE_UP)
+        """Wake PN532 from low-power state, with the HSU preamble or NSS."""
+        if self._hsu:
+            await self._write_bytes(_FRAME_WAKE_UP)
+        else:
+            await self._transport.wake_up()
+
+    async def power_down(self, wake_up_sources: int | None = None) -> bool:
+        """
+        Put the PN532 into its power down mode, RF field off, until one of
+        wake_up_sources wakes it up. The next command wakes it up over the
+        interface it is on.
+
+        Args:
+            wake_up_sources: WAKE_UP_HSU, WAKE_UP_SPI and/or WAKE_UP_RF, by
+                default the interface it is on and WAKE_UP_RF.
+
+        Returns:
+            bool: True if the PN532 is powering down.
+        """
+        if wake_up_sources is None:
+            wake_up_sources = (WAKE_UP_HSU if self._hsu else WAKE_UP_SPI) | WAKE_UP_RF
+
+        frame = await self._send_command(_CMD_POWER_DOWN, [wake_up_sources])
+
+        data = frame.data
+        return data is not None and len(data) > 0 and not data[0] & _STATUS_ERROR_MASK
 
     async def get_firmware_version(self) -> tuple:
         frame = await self._send_command(_CMD_GET_FIRMWARE_VERSION)
         return (frame.data[0], frame.data[1], frame.data[2], frame.data[3])
 
     async def get_passive_target(self) -> bytes | None:
-        frame = await self._send_command(_CMD_IN_LIST_PASSIVE_TARGET, [0x01, 0x00])
-        if frame.data is None or frame.data[0] == 0x00:
-            return None
+        """
+        Returns:
+            bytes | None: The UID of a Type A card in the field, None if there is none.
+        """
+        targets = await self.list_passive_targets(BAUD_RATE_106A, 1)
+        return targets[0].uid if targets else None
+
+    async def list_passive_targets(
+        self,
+        baud_rate: int = BAUD_RATE_106A,
+        max_targets: int = MAX_TARGETS,
+    ) -> tuple[PassiveTarget, ...]:
+        """
+        List the cards of one baud rate in the field, using InListPassiveTarget.
+
+        Two cards in the field at once are both activated and returned by the
+        one command, there is no need to poll again for the second.
+
+        Args:
+            baud_rate: BAUD_RATE_106A, BAUD_RATE_212F, BAUD_RATE_424F or BAUD_RATE_106B.
+            max_targets: How many cards to list, 1 or 2.
+
+        Returns:
+            tuple[PassiveTarget, ...]: The cards, in the order of their target number.
+        """
+        data = [min(max(max_targets, 1), MAX_TARGETS), baud_rate]
+        if baud_rate == BAUD_RATE_212F or baud_rate == BAUD_RATE_424F:
+            data.extend(_FELICA_POLLING_REQUEST)
+        elif baud_rate == BAUD_RATE_106B:
+            data.append(_ISO14443B_AFI_ANY)
+        elif baud_rate != BAUD_RATE_106A:
+            raise PN532Error(f"Unsupported baud rate: {baud_rate}")
+
+        frame = await self._send_command(_CMD_IN_LIST_PASSIVE_TARGET, data)
+
+        # NbTg, then the TargetData of every target, back to back
+        data = frame.data
+        if data is None or not len(data):
+            return ()
+
+        targets = []
+        start = 1
+        for _ in range(min(data[0], MAX_TARGETS)):
+            end = start + _target_data_len(baud_rate, data, start)
+            target = _parse_target(baud_rate, data, start, end)
+            if target is None:
+                break
+
+            targets.append(target)
+            start = end
+
+        return tuple(targets)
+
+    async def auto_poll(
+        self,
+        poll_count: int = _DEFAULT_AUTO_POLL_COUNT,
+        period: int = _DEFAULT_AUTO_POLL_PERIOD,
+        baud_rates: tuple[int, ...] = (BAUD_RATE_106A,),
+    ) -> tuple[PassiveTarget, ...]:
+        """
+        Wait for cards to enter the field, using InAutoPoll.
+
+        The PN532 polls for cards on its own, every period × 150ms, and only
+        answers once it has found some or has polled poll_count times. Nothing
+        goes over the UART in between, unlike a loop of list_passive_targets().
+
+        Args:
+            poll_count: How many times to poll before giving up (1-254).
+            period: Time between polls, in units of 150ms (1-15).
+            baud_rates: The baud rates to poll for in turn, any of
+                BAUD_RATE_106A, BAUD_RATE_212F, BAUD_RATE_424F and BAUD_RATE_106B.
+
+        Returns:
+            tuple[PassiveTarget, ...]: The cards, empty if none showed up.
+        """
+        poll_count = min(max(poll_count, 1), _AUTO_POLL_MAX_COUNT)
+
+        frame = await self._send_command(
+            _CMD_IN_AUTO_POLL,
+            [poll_count, period] + list(baud_rates),
+            # every poll goes through each of the types in turn
+            timeout_ms=(
+                poll_count * period * len(baud_rates) * _AUTO_POLL_PERIOD_UNIT_MS + _DEFAULT_CMD_TIMEOUT_MS
+            ),
+        )
+
+        # NbTg, then per target its Type, AutoPollTargetDataLength and the
+        # same TargetData as InListPassiveTarget
+        data = frame.data
+        if data is None or not len(data):
+            return ()
+
+        targets = []
+        start = 1
+        for _ in range(min(data[0], MAX_TARGETS)):
+            if start + 2 > len(data):
+                break
+
+            end = start + 2 + data[start + 1]
+            baud_rate = _AUTO_POLL_TYPE_BAUD_RATES.get(data[start], data[start])
+            target = _parse_target(baud_rate, data, start + 2, end)
+            if target is None:
+                break
+
+            targets.append(target)
+            start = end
+
+        return tuple(targets)
+
+    async def ntag_fast_read(
+        self,
+        start_page: int,
+        end_page: int,
+        into: bytearray | memoryview,
+        target: int = _TARGET_NUMBER,
+    ) -> int:
+        """
+        Read consecutive pages of the NTAG21x in the field with a single
+        FAST_READ, sent with InDataExchange.
+
+        Args:
+            start_page: The first page to read.
+            end_page: The last page to read, at most 59 pages after start_page.
+            into: Where to copy the pages to, 4 bytes per page.
+            target: The number of the target to read, see PassiveTarget.number.
+
+        Returns:
+            int: The number of bytes read.
+        """
+        if end_page < start_page or end_page - start_page >= _NTAG_MAX_FAST_READ_PAGES:
+            raise PN532Error(f"Unsupported page range: {start_page}-{end_page}")
+
+        frame = await self._send_command(
+            _CMD_IN_DATA_EXCHANGE,
+            [target, _NTAG_CMD_FAST_READ, start_page, end_page],
+        )
+
+        # Status, then the data returned by the target
+        data = frame.data
+        if data is None or not len(data) or data[0] & _STATUS_ERROR_MASK:
+            raise PN532Error(f"FAST_READ failed: {data[0] if data else None}")
+
+        count = min(len(data) - 1, (end_page - start_page + 1) * _NTAG_PAGE_LEN, len(into))
+        into[:count] = data[1 : 1 + count]
+
+        return count
+
+    async def set_serial_baud_rate(self, baudrate: int) -> bool:
+        """
+        Switch the HSU link with the PN532 to a different baud rate.
+
+        Sends SetSerialBaudRate at the current rate, acknowledges the response
+        (the PN532 only switches once the host has sent an ACK frame),
+        reconfigures the local UART to match and verifies the link by reading
+        the firmware version. If the PN532 does not answer at the new rate,
+        both sides are switched back.
+
+        Args:
+            baudrate: One of 9600, 19200, 38400, 57600, 115200, 230400, 460800,
+                921600 or 1288000.
+
+        Returns:
+            bool: True if the link is now running at baudrate, False if it is
+                still running at the previous rate or is not HSU.
+        """
+        if baudrate not in _SERIAL_BAUD_RATES:
+            raise PN532Error(f"Unsupported baud rate: {baudrate}")
+
+        if not self._hsu:
+            return False
+
+        previous = self._transport.baudrate
+        if baudrate == previous:
+            return True
+
+        try:
+            await self._switch_serial_baud_rate(baudrate)
+        except PN532Error:
+            return False
+
+        if await self._verify_serial():
+            return True
+
+        # The PN532 took the new rate but we cannot talk to it, ask it (at the
+        # new rate) to go back and follow it regardless of what it answers.
+        try:
+            await self._switch_serial_baud_rate(previous)
+        except PN532Error:
+            self._set_local_serial_baud_rate(previous)
+
+        await self._verify_serial()
+
+        return False
+
+    async def _switch_serial_baud_rate(self, baudrate: int) -> None:
+        # held throughout, any other command sent before the ACK would take
+        # its place and leave the two sides at different rates
+        async with self._send_command_lock:
+            await self._exchange(
+                _CMD_SET_SERIAL_BAUD_RATE,
+                [_SERIAL_BAUD_RATES.index(baudrate)],
+            )
+
+            await self._write_bytes(_FRAME_ACK)
+            await uasyncio.sleep_ms(_UART_BAUD_RATE_SETTLE_MS)
+            self._set_local_serial_baud_rate(baudrate)
+
+    def _set_local_serial_baud_rate(self, baudrate: int) -> None:
+        self._transport.set_baudrate(baudrate)
+        self._transport.flush_input()
+        self._frame_parser.clear()
+
+    async def _verify_serial(self) -> bool:
+        try:
+            await self.get_firmware_version()
+        except PN532Error:
+            return False
 
-        return bytes(frame.data[6:6 + frame.data[5]])
+        return True
 
     async def sam_config(self, mode=0x01):
-        await self._send_command(0x14, [mode, 0x14, 0x01])
+        await self._send_command(_CMD_SAM_CONFIGURATION, [mode, 0x14, 0x01])
 
     async def set_retries(self, atr=0xFF, psl=0x01, passive=0x14):
         """
@@ -371,4 +1003,4 @@ class PN532:
                     Each retry is ~50ms. 0x14 (20) ≈ 1 second.
                     0xFF = wait forever.
         """
-        await self._send_command(0x32, data=[0x05, atr, psl, passive])
+        await self._send_command(_CMD_RF_CONFIGURATION, data=[0x05, atr, psl, passive])
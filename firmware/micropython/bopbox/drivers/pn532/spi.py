@@ -0,0 +1,210 @@
+import machine
+import uasyncio
+
+from micropython import const
+
+from ... import util
+
+
+# ref: https://www.nxp.com/docs/en/user-guide/141520.pdf (§6.2.5)
+_PREFIX_DATA_WRITE = const(0x01)
+_PREFIX_STATUS_READ = const(0x02)
+_PREFIX_DATA_READ = const(0x03)
+_STATUS_READY = const(0x01)
+
+_DEFAULT_BAUD_RATE = const(1_000_000)  # the PN532 takes up to 5MHz
+
+# How often the status byte is read while a frame is expected, backing off
+# from the first to the last while the PN532 is busy, e.g. polling for cards
+_MIN_STATUS_POLL_INTERVAL_MS = const(1)
+_MAX_STATUS_POLL_INTERVAL_MS = const(16)
+# How long NSS is held low for the PN532 to wake up from power down
+_WAKE_UP_MS = const(2)
+
+# Preamble, start code (2), LEN and LCS, what a frame's length is read from
+_FRAME_HEADER_LEN = const(5)
+_FRAME_LEN_OFFSET = const(3)
+_FRAME_LCS_OFFSET = const(4)
+# A normal information frame: the header, up to 255 bytes of body, DCS and postamble
+_FRAME_MAX_LEN = const(_FRAME_HEADER_LEN + 255 + 2)
+
+# A command frame is answered with an ACK frame and then the response
+_FRAMES_PER_COMMAND = const(2)
+
+
+class SPITransport:
+    """
+    Frame transport over the PN532's SPI interface, with the same readinto()
+    and write() as UARTTransport so that PN532 runs over either.
+
+    Every transfer is one transaction with NSS held low, that starts with a
+    prefix: DW writes a frame, SR reads the status byte, which says whether
+    the PN532 has a frame ready, and DR reads that frame. The status is only
+    polled while a frame is expected, from a command being written until its
+    ACK and response have been read, a NACK has been read or flush_input()
+    gives up on them, so an idle reader keeps the bus quiet.
+
+    The PN532 shifts bytes LSB first, so they are bit-reversed around
+    machine.SPI, which not every port can switch to LSB first.
+
+    Example:
+        transport = SPITransport(0, sck_pin=18, mosi_pin=19, miso_pin=16, cs_pin=17)
+        driver = pn532.PN532(transport=transport)
+    """
+
+    __slots__ = (
+        "_spi",
+        "_cs",
+        "_tx_buffer",
+        "_status_request",
+        "_status",
+        "_data_read_request",
+        "_expected_frames",
+        "_frame_expected",
+    )
+
+    _spi: machine.SPI
+    _cs: machine.Pin
+
+    _tx_buffer: bytearray
+    _status_request: bytearray
+    _status: bytearray
+    _data_read_request: bytearray
+
+    _expected_frames: int
+    _frame_expected: uasyncio.Event
+
+    def __init__(
+        self,
+        spi_id: int,
+        sck_pin: int,
+        mosi_pin: int,
+        miso_pin: int,
+        cs_pin: int,
+        baudrate: int = _DEFAULT_BAUD_RATE,
+    ) -> None:
+        self._spi = machine.SPI(
+            spi_id,
+            baudrate=baudrate,
+            polarity=0,
+            phase=0,
+            sck=machine.Pin(sck_pin),
+            mosi=machine.Pin(mosi_pin),
+            miso=machine.Pin(miso_pin),
+        )
+        self._cs = machine.Pin(cs_pin, machine.Pin.OUT, value=1)
+
+        self._tx_buffer = bytearray(1 + _FRAME_MAX_LEN)
+
+        self._status_request = bytearray((_PREFIX_STATUS_READ, 0x00))
+        util.reverse_bits(self._status_request, 0, 1)
+        self._status = bytearray(2)
+
+        self._data_read_request = bytearray((_PREFIX_DATA_READ,))
+        util.reverse_bits(self._data_read_request, 0, 1)
+
+        self._expected_frames = 0
+        self._frame_expected = uasyncio.Event()
+
+    async def wake_up(self) -> None:
+        """Wake the PN532 from power down, which a falling edge on NSS does."""
+        self._cs.value(0)
+        await uasyncio.sleep_ms(_WAKE_UP_MS)
+        self._cs.value(1)
+
+    async def write(self, data: bytes | bytearray | memoryview) -> None:
+        """Write a command frame, after which its ACK and response are read."""
+        length = len(data)
+        if length > _FRAME_MAX_LEN:
+            raise ValueError(f"Frame too long: {length}")
+
+        buffer = self._tx_buffer
+        buffer[0] = _PREFIX_DATA_WRITE
+        buffer[1 : 1 + length] = data
+        util.reverse_bits(buffer, 0, 1 + length)
+
+        self._cs.value(0)
+        try:
+            self._spi.write(memoryview(buffer)[: 1 + length])
+        finally:
+            self._cs.value(1)
+
+        self._expected_frames = _FRAMES_PER_COMMAND
+        self._frame_expected.set()
+
+    def flush_input(self) -> None:
+        """Stop expecting the frames of the last command, e.g. once it timed out."""
+        self._expected_frames = 0
+
+    async def readinto(self, buffer: bytearray) -> int:
+        """
+        Wait until the PN532 has a frame ready and read it into buffer.
+
+        Returns:
+            int: The number of bytes read, one whole frame.
+        """
+        interval = _MIN_STATUS_POLL_INTERVAL_MS
+
+        while True:
+            while not self._expected_frames:
+                self._frame_expected.clear()
+                await self._frame_expected.wait()
+                interval = _MIN_STATUS_POLL_INTERVAL_MS
+
+            if self._is_ready():
+                break
+
+            await uasyncio.sleep_ms(interval)
+            interval = min(interval * 2, _MAX_STATUS_POLL_INTERVAL_MS)
+
+        count = self._read_frame(buffer)
+
+        length = buffer[_FRAME_LEN_OFFSET]
+        if length == 0xFF and buffer[_FRAME_LCS_OFFSET] == 0x00:
+            # a NACK, the PN532 will not send a response
+            self._expected_frames = 0
+        elif self._expected_frames:
+            self._expected_frames -= 1
+
+        return count
+
+    def _is_ready(self) -> bool:
+        self._cs.value(0)
+        try:
+            self._spi.write_readinto(self._status_request, self._status)
+        finally:
+            self._cs.value(1)
+
+        util.reverse_bits(self._status, 1, 2)
+        return bool(self._status[1] & _STATUS_READY)
+
+    def _read_frame(self, buffer: bytearray) -> int:
+        view = memoryview(buffer)
+
+        self._cs.value(0)
+        try:
+            self._spi.write(self._data_read_request)
+
+            # the header says how much of the frame is left
+            self._spi.readinto(view[:_FRAME_HEADER_LEN], 0x00)
+            util.reverse_bits(buffer, 0, _FRAME_HEADER_LEN)
+
+            length = buffer[_FRAME_LEN_OFFSET]
+            lcs = buffer[_FRAME_LCS_OFFSET]
+            if (length == 0x00 and lcs == 0xFF) or (length == 0xFF and lcs == 0x00):
+                # an ACK or NACK only has its postamble left
+                remaining = 1
+            elif (length + lcs) & 0xFF == 0:
+                # any other frame its body, DCS and postamble
+                remaining = min(length + 2, len(buffer) - _FRAME_HEADER_LEN)
+            else:
+                # garbage, or an extended frame, which the parser rejects
+                remaining = 0
+
+            end = _FRAME_HEADER_LEN + remaining
+            self._spi.readinto(view[_FRAME_HEADER_LEN:end], 0x00)
+            util.reverse_bits(buffer, _FRAME_HEADER_LEN, end)
+        finally:
+            self._cs.value(1)
+
+        return end
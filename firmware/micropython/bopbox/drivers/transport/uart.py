@@ -0,0 +1,100 @@
+import machine
+import uasyncio
+
+
+class UARTTransport:
+    """
+    Event-driven byte transport over a machine.UART, shared by the radio drivers.
+
+    Reads and writes go through a uasyncio stream, so a reader is woken by
+    the scheduler's IO poller as soon as bytes arrive instead of waking up
+    on a timer to check for them, and writers yield while the TX buffer
+    drains instead of blocking the event loop.
+
+    Example:
+        transport = UARTTransport(1, tx_pin=20, rx_pin=21, baudrate=115200)
+
+        buffer = bytearray(64)
+        count = await transport.readinto(buffer)
+    """
+
+    __slots__ = (
+        "_uart",
+        "_stream",
+        "_txbuf",
+        "_baudrate",
+    )
+
+    _uart: machine.UART
+    _stream: uasyncio.StreamReader
+    _txbuf: int
+    _baudrate: int
+
+    def __init__(
+        self,
+        uart_id: int,
+        tx_pin: int,
+        rx_pin: int,
+        baudrate: int,
+        txbuf: int = 64,
+        rxbuf: int = 256,
+    ) -> None:
+        self._uart = machine.UART(
+            uart_id,
+            tx=machine.Pin(tx_pin),
+            rx=machine.Pin(rx_pin),
+            txbuf=txbuf,
+            rxbuf=rxbuf,
+            baudrate=baudrate,
+        )
+
+        self._stream = uasyncio.StreamReader(self._uart)
+        self._txbuf = txbuf
+        self._baudrate = baudrate
+
+    @property
+    def baudrate(self) -> int:
+        return self._baudrate
+
+    def set_baudrate(self, baudrate: int) -> None:
+        """
+        Reconfigure the UART to a different baud rate, keeping its pins and buffers.
+        """
+        self._uart.init(baudrate=baudrate)
+        self._baudrate = baudrate
+
+    def flush_input(self) -> None:
+        """Drop anything waiting in the RX buffer, e.g. garbage left by a baud rate switch."""
+        while self._uart.any():
+            self._uart.read()
+
+    def any(self) -> int:
+        """
+        Returns:
+            int: The number of bytes that can be read without waiting.
+        """
+        return self._uart.any()
+
+    async def readinto(self, buffer: bytearray | memoryview) -> int:
+        """
+        Wait until bytes are available and read as many as fit into buffer.
+
+        Returns:
+            int: The number of bytes read.
+        """
+        return await self._stream.readinto(buffer) or 0
+
+    async def write(self, data: bytes | bytearray | memoryview) -> None:
+        """
+        Write data, a TX buffer at a time, waiting for each piece to drain.
+
+        Writing in TX buffer sized slices keeps the stream from having to
+        copy the part of a large payload the UART could not take yet.
+        """
+        view = memoryview(data)
+        stream = self._stream
+        txbuf = self._txbuf
+
+        for offset in range(0, len(view), txbuf):
+            stream.write(view[offset : offset + txbuf])
+            await stream.drain()
@@ -0,0 +1,318 @@
+import array
+
+from typing import Callable
+from micropython import const
+
+
+# Upper bounds of the histogram buckets, in milliseconds, doubling from 1ms
+# to ~16s (anything slower lands in +Inf)
+_DEFAULT_BUCKETS_MS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+# Label of the series that every value recorded past max_series goes to
+_LABEL_OTHER = const(b"other")
+
+_TYPE_COUNTER = const(b"counter")
+_TYPE_GAUGE = const(b"gauge")
+_TYPE_HISTOGRAM = const(b"histogram")
+
+_metrics: dict[bytes, "_Metric"] = {}
+
+
+def counter(
+    name: bytes,
+    help: bytes,
+    label: bytes | None = None,
+    max_series: int = 1,
+) -> "Counter":
+    """Get or create the counter with the given name."""
+    if name not in _metrics:
+        _metrics[name] = Counter(name, help, label, max_series)
+
+    return _metrics[name]
+
+
+def gauge(
+    name: bytes,
+    help: bytes,
+    read: Callable[[], int] | None = None,
+) -> "Gauge":
+    """Get or create the gauge with the given name."""
+    if name not in _metrics:
+        _metrics[name] = Gauge(name, help, read)
+
+    return _metrics[name]
+
+
+def histogram(
+    name: bytes,
+    help: bytes,
+    label: bytes | None = None,
+    max_series: int = 1,
+    buckets_ms: tuple[int, ...] = _DEFAULT_BUCKETS_MS,
+) -> "Histogram":
+    """Get or create the histogram with the given name."""
+    if name not in _metrics:
+        _metrics[name] = Histogram(name, help, label, max_series, buckets_ms)
+
+    return _metrics[name]
+
+
+def get_metrics() -> list["_Metric"]:
+    return list(_metrics.values())
+
+
+class _Metric:
+    """
+    A metric family, optionally split into series by the value of one label.
+
+    Every series is given a slot in arrays allocated up front, so recording a
+    value never allocates: the caller looks its series up with series() once
+    per key (a dict lookup) and records into it by index. A key only
+    allocates the first time it is seen, and once max_series - 1 keys have
+    been seen every new key shares the last series, labelled "other".
+
+    Every kind of metric encodes its family with expose(), which yields it in
+    the Prometheus text exposition format a few lines at a time, so that it
+    never has to be held in memory whole.
+    """
+
+    __slots__ = (
+        "name",
+        "help",
+        "label",
+        "_max_series",
+        "_series",
+        "_series_labels",
+    )
+
+    name: bytes
+    help: bytes
+    label: bytes | None
+
+    _max_series: int
+    _series: dict[object, int]
+    _series_labels: list[bytes]
+
+    def __init__(
+        self,
+        name: bytes,
+        help: bytes,
+        label: bytes | None,
+        max_series: int,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.label = label
+
+        self._max_series = max_series if label else 1
+        self._series = {}
+        self._series_labels = []
+
+    def series(self, key: object, label_value: bytes | None = None) -> int:
+        """
+        Get the index of the series for a key.
+
+        Args:
+            key: Any hashable identifying the series, e.g. a command code.
+            label_value: The label value of the series, if not the key itself.
+
+        Returns:
+            int: The index to record the key's values at.
+        """
+        index = self._series.get(key)
+        if index is not None:
+            return index
+
+        index = len(self._series_labels)
+        if index >= self._max_series - 1:
+            return self._max_series - 1
+
+        if label_value is None:
+            label_value = key if isinstance(key, bytes) else str(key).encode()
+
+        self._series[key] = index
+        self._series_labels.append(label_value)
+
+        return index
+
+    def _expose_header(self, type: bytes) -> bytes:
+        return b"# HELP " + self.name + b" " + self.help + b"\n# TYPE " + self.name + b" " + type + b"\n"
+
+    def _series_label(self, index: int) -> bytes:
+        if index < len(self._series_labels):
+            return self._series_labels[index]
+
+        return _LABEL_OTHER
+
+    def _labels(self, index: int, extra: bytes = b"") -> bytes:
+        if not self.label:
+            return b"{" + extra + b"}" if extra else b""
+
+        labels = self.label + b'="' + self._series_label(index) + b'"'
+        if extra:
+            labels += b"," + extra
+
+        return b"{" + labels + b"}"
+
+
+class Counter(_Metric):
+    """
+    Example:
+        errors = metrics.counter(b"bopbox_errors_total", b"Errors.")
+        errors.inc()
+    """
+
+    __slots__ = ("_values",)
+
+    _values: array.array
+
+    def __init__(
+        self,
+        name: bytes,
+        help: bytes,
+        label: bytes | None = None,
+        max_series: int = 1,
+    ) -> None:
+        super().__init__(name, help, label, max_series)
+        self._values = array.array("I", [0] * self._max_series)
+
+    def inc(self, series: int = 0, value: int = 1) -> None:
+        self._values[series] += value
+
+    def expose(self):
+        lines = [self._expose_header(_TYPE_COUNTER)]
+
+        for index in range(len(self._values)):
+            value = self._values[index]
+            if value or not self.label:
+                lines.append(self.name + self._labels(index) + b" " + str(value).encode() + b"\n")
+
+        yield b"".join(lines)
+
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down, either set or read from a callback
+    whenever the metrics are exposed.
+
+    Example:
+        metrics.gauge(b"bopbox_mem_free_bytes", b"Free heap.", read=gc.mem_free)
+    """
+
+    __slots__ = ("_value", "_read")
+
+    _value: array.array
+    _read: Callable[[], int] | None
+
+    def __init__(
+        self,
+        name: bytes,
+        help: bytes,
+        read: Callable[[], int] | None = None,
+    ) -> None:
+        super().__init__(name, help, None, 1)
+        self._value = array.array("i", [0])
+        self._read = read
+
+    def set(self, value: int) -> None:
+        self._value[0] = value
+
+    def expose(self):
+        if self._read is not None:
+            self._value[0] = self._read()
+
+        yield (
+            self._expose_header(_TYPE_GAUGE)
+            + self.name
+            + b" "
+            + str(self._value[0]).encode()
+            + b"\n"
+        )
+
+
+class Histogram(_Metric):
+    """
+    Distribution of durations in log2-sized buckets, exposed in seconds.
+
+    Example:
+        latency = metrics.histogram(
+            b"bopbox_command_duration_seconds", b"Command latency.", label=b"command", max_series=8
+        )
+
+        started = utime.ticks_ms()
+        ...
+        latency.observe(utime.ticks_diff(utime.ticks_ms(), started), latency.series(command))
+    """
+
+    __slots__ = (
+        "_buckets_ms",
+        "_counts",
+        "_sums_ms",
+    )
+
+    _buckets_ms: tuple[int, ...]
+    _counts: array.array  # per series, a count per bucket and +Inf
+    _sums_ms: array.array
+
+    def __init__(
+        self,
+        name: bytes,
+        help: bytes,
+        label: bytes | None = None,
+        max_series: int = 1,
+        buckets_ms: tuple[int, ...] = _DEFAULT_BUCKETS_MS,
+    ) -> None:
+        super().__init__(name, help, label, max_series)
+        self._buckets_ms = buckets_ms
+        self._counts = array.array("I", [0] * (self._max_series * (len(buckets_ms) + 1)))
+        self._sums_ms = array.array("I", [0] * self._max_series)
+
+    def observe(self, value_ms: int, series: int = 0) -> None:
+        buckets = self._buckets_ms
+
+        bucket = 0
+        while bucket < len(buckets) and value_ms > buckets[bucket]:
+            bucket += 1
+
+        self._counts[series * (len(buckets) + 1) + bucket] += 1
+        self._sums_ms[series] += value_ms
+
+    def expose(self):
+        buckets = self._buckets_ms
+        bucket_count = len(buckets) + 1
+
+        yield self._expose_header(_TYPE_HISTOGRAM)
+
+        for index in range(len(self._sums_ms)):
+            start = index * bucket_count
+
+            count = 0
+            for bucket in range(bucket_count):
+                count += self._counts[start + bucket]
+
+            if not count and self.label:
+                continue
+
+            lines = []
+            cumulative = 0
+            for bucket in range(bucket_count):
+                cumulative += self._counts[start + bucket]
+                le = _seconds(buckets[bucket]) if bucket < len(buckets) else b"+Inf"
+                lines.append(
+                    self.name
+                    + b"_bucket"
+                    + self._labels(index, b'le="' + le + b'"')
+                    + b" "
+                    + str(cumulative).encode()
+                    + b"\n"
+                )
+
+            labels = self._labels(index)
+            lines.append(self.name + b"_sum" + labels + b" " + _seconds(self._sums_ms[index]) + b"\n")
+            lines.append(self.name + b"_count" + labels + b" " + str(count).encode() + b"\n")
+
+            yield b"".join(lines)
+
+
+def _seconds(ms: int) -> bytes:
+    return ("%d.%03d" % (ms // 1000, ms % 1000)).encode()
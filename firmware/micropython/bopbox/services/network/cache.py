@@ -0,0 +1,141 @@
+from micropython import const
+
+from . import http, router
+
+
+_DEFAULT_BUDGET_BYTES = const(4096)
+
+
+class ResponseCache:
+    """
+    LRU cache of serialized GET responses, keyed by route.
+
+    A cached route's handler only runs on a miss. Its 200 response is then
+    serialized once, Content-Type and Content-Length headers included, and
+    every hit sends those bytes as they are without running the handler or
+    encoding anything.
+
+    The cache holds at most budget bytes of responses, evicting the least
+    recently used ones to make room. Entries are never stale by time, they
+    have to be invalidated by whatever changes the state they were built
+    from.
+
+    Example:
+        cache = ResponseCache()
+        network.add_http_server_route(b"GET", b"/status", cache.cached(b"/status", get_status))
+
+        cache.invalidate(b"/status")  # whenever the status changes
+    """
+
+    __slots__ = (
+        "_budget",
+        "_size",
+        "_entries",
+        "_order",
+        "_hits",
+        "_misses",
+        "_evictions",
+    )
+
+    _budget: int
+    _size: int
+    _entries: dict[bytes, bytes]
+    _order: list[bytes]  # least recently used first
+
+    _hits: int
+    _misses: int
+    _evictions: int
+
+    def __init__(self, budget: int = _DEFAULT_BUDGET_BYTES) -> None:
+        self._budget = budget
+        self._size = 0
+        self._entries = {}
+        self._order = []
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get_stats(self) -> dict:
+        """
+        Returns:
+            dict: Counters of the cache:
+                - hits: requests answered from the cache
+                - misses: requests that ran their handler
+                - evictions: entries dropped to stay within the budget
+                - entries: responses currently cached
+                - size: bytes currently cached
+        """
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "entries": len(self._entries),
+            "size": self._size,
+        }
+
+    def get(self, key: bytes) -> bytes | None:
+        data = self._entries.get(key)
+        if data is None:
+            self._misses += 1
+            return None
+
+        self._hits += 1
+
+        order = self._order
+        if order[-1] != key:
+            order.remove(key)
+            order.append(key)
+
+        return data
+
+    def put(self, key: bytes, data: bytes) -> None:
+        self.invalidate(key)
+
+        if len(data) > self._budget:
+            return
+
+        while self._size + len(data) > self._budget:
+            self._evictions += 1
+            self.invalidate(self._order[0])
+
+        self._entries[key] = data
+        self._order.append(key)
+        self._size += len(data)
+
+    def invalidate(self, key: bytes) -> None:
+        data = self._entries.pop(key, None)
+        if data is not None:
+            self._order.remove(key)
+            self._size -= len(data)
+
+    def clear(self) -> None:
+        self._entries = {}
+        self._order = []
+        self._size = 0
+
+    def cached(self, key: bytes, handler: router.Handler) -> router.Handler:
+        """
+        Wrap a GET handler so its responses are served from the cache.
+
+        Args:
+            key: The cache key, usually the route's path.
+            handler: Sets a 200 response with set_body() when the response can
+                be cached, anything else is sent but not cached.
+        """
+
+        async def handle(context: http.HTTPContext) -> None:
+            response = context.response
+
+            data = self.get(key)
+            if data is not None:
+                response.set_serialized(data)
+                return
+
+            await handler(context)
+
+            data = response.serialize()
+            if data is not None:
+                self.put(key, data)
+
+        return handle
@@ -0,0 +1,493 @@
+import uos
+import ubinascii
+
+from micropython import const
+
+from . import http
+
+
+# Uploads are written to flash in blocks of this size, one flash sector
+_UPLOAD_BLOCK_LEN = const(4096)
+
+# Files are sent in reads of this size, the most a single AT+CIPSEND takes
+_STATIC_FILE_BLOCK_LEN = const(2048)
+
+# The ESP-01S supports up to 5 simultaneous connections (IDs 0-4)
+_MAX_CONNECTIONS = const(5)
+
+_MAX_FILE_NAME_LEN = const(32)
+_MAX_ETAG_LEN = const(64)
+
+_PARTIAL_FILE_SUFFIX = ".part"
+# The ETag of a file is stored next to it, in <name>.etag
+_ETAG_FILE_SUFFIX = ".etag"
+# A gzip compressed copy of a file is stored next to it, in <name>.gz
+_GZIP_FILE_SUFFIX = ".gz"
+
+# Files that only exist alongside another are neither served nor uploaded
+_RESERVED_FILE_SUFFIXES = tuple(
+    suffix.encode() for suffix in (_PARTIAL_FILE_SUFFIX, _ETAG_FILE_SUFFIX, _GZIP_FILE_SUFFIX)
+)
+
+_INDEX_FILE_NAME = "index.html"
+
+# Optional CRC-32 of the upload in hex, checked before the file is kept
+_HEADER_CHECKSUM_CRC32 = const(b"x-checksum-crc32")
+_HEADER_IF_NONE_MATCH = const(b"if-none-match")
+_HEADER_ACCEPT_ENCODING = const(b"accept-encoding")
+
+_HEADER_CONTENT_ENCODING_GZIP = const(b"Content-Encoding: gzip\r\n")
+_HEADER_VARY_ACCEPT_ENCODING = const(b"Vary: Accept-Encoding\r\n")
+# Always revalidate, which costs a 304 without a body while the file is unchanged
+_HEADER_CACHE_CONTROL_NO_CACHE = const(b"Cache-Control: no-cache\r\n")
+_HEADER_RETRY_AFTER = const(b"Retry-After: 1\r\n")
+
+_TOKEN_GZIP = const(b"gzip")
+_TOKEN_ANY = const(b"*")
+
+_PARAM_NAME = const(b"name")
+_PARAM_WILDCARD = const(b"*")
+
+_ORD_DOT = const(0x2E)  # ord(".")
+
+# stat() st_mode flag of directories
+_S_IFDIR = const(0x4000)
+
+_CONTENT_TYPES = {
+    "html": http.CONTENT_TYPE_HTML,
+    "css": http.CONTENT_TYPE_CSS,
+    "js": http.CONTENT_TYPE_JAVASCRIPT,
+    "json": http.CONTENT_TYPE_JSON,
+    "txt": http.CONTENT_TYPE_TEXT,
+    "svg": http.CONTENT_TYPE_SVG,
+    "png": http.CONTENT_TYPE_PNG,
+    "mp3": http.CONTENT_TYPE_AUDIO_MPEG,
+    "wav": http.CONTENT_TYPE_AUDIO_WAV,
+}
+
+
+class FileUploadHandler:
+    """
+    Handles PUT <path>/<name> requests by streaming the body into a file.
+
+    The body, with a Content-Length or chunked, is read as it is received
+    and written to flash one block at a time, with its CRC-32 computed along
+    the way, so an upload of any size only ever needs a single block of RAM.
+    An upload that arrives while another is in progress is turned away with
+    a 503 and Retry-After right away: waiting its turn, its body would
+    overflow the connection buffer before it is read.
+
+    The upload is written to <name>.part first, and only replaces <name>
+    once the whole body has been received, matches the X-Checksum-CRC32
+    request header if there is one, and has been flushed to flash. The
+    response is not sent until then, so a 201 means the file is on flash.
+
+    The ETag of the file, derived from its CRC-32 and size, is stored in
+    <name>.etag for StaticFileHandler, and any stale <name>.gz is removed.
+
+    Example:
+        uploads = FileUploadHandler("/clips")
+        network.add_http_server_route(b"PUT", b"/clips/<name>", uploads.handle)
+    """
+
+    __slots__ = (
+        "_directory",
+        "_block",
+        "_block_view",
+        "_busy",
+    )
+
+    _directory: str
+    _block: bytearray
+    _block_view: memoryview
+    _busy: bool
+
+    def __init__(
+        self,
+        directory: str,
+        block_len: int = _UPLOAD_BLOCK_LEN,
+    ) -> None:
+        self._directory = directory
+        self._block = bytearray(block_len)
+        self._block_view = memoryview(self._block)
+        self._busy = False
+
+    async def handle(self, context: http.HTTPContext) -> None:
+        response = context.response
+
+        name = context.params.get(_PARAM_NAME) if context.params else None
+        if not is_valid_file_name(name):
+            response.reset(400)
+            return
+
+        # headers are no longer available once the body is being read
+        expected_crc32 = _parse_crc32(context.request.header(_HEADER_CHECKSUM_CRC32))
+
+        if self._busy:
+            response.reset(503)
+            response.add_header(_HEADER_RETRY_AFTER)
+            return
+
+        path = self._directory + "/" + name.decode()
+        partial_path = path + _PARTIAL_FILE_SUFFIX
+
+        self._busy = True
+        try:
+            _make_directory(self._directory)
+
+            try:
+                size, crc32 = await self._write_body(context.body, partial_path)
+            except BaseException:
+                _remove_file(partial_path)
+                raise
+
+            if expected_crc32 >= 0 and crc32 != expected_crc32:
+                _remove_file(partial_path)
+                response.reset(400)
+                return
+
+            # never leave the old ETag or compressed copy in place for the new file
+            _remove_file(path + _ETAG_FILE_SUFFIX)
+            _remove_file(path + _GZIP_FILE_SUFFIX)
+            _remove_file(path + _GZIP_FILE_SUFFIX + _ETAG_FILE_SUFFIX)
+
+            try:
+                uos.rename(partial_path, path)
+            except OSError:
+                # not every filesystem replaces an existing file on rename
+                _remove_file(path)
+                uos.rename(partial_path, path)
+
+            with open(path + _ETAG_FILE_SUFFIX, "wb") as f:
+                f.write(('"%08x-%x"' % (crc32, size)).encode())
+        finally:
+            self._busy = False
+
+        response.reset(201)
+        response.set_body(
+            ('{"size":%d,"crc32":"%08x"}' % (size, crc32)).encode(),
+            http.CONTENT_TYPE_JSON,
+        )
+
+    async def _write_body(
+        self,
+        body: http.HTTPBodyReader,
+        path: str,
+    ) -> tuple[int, int]:
+        """
+        Returns:
+            tuple[int, int]: The size and CRC-32 of the body written to path.
+        """
+        block = self._block_view
+        block_len = len(block)
+        size = 0
+        crc32 = 0
+
+        with open(path, "wb") as f:
+            while True:
+                # fill a whole block before writing, whatever size the
+                # pieces of the body arrive in
+                count = 0
+                while count < block_len:
+                    read = await body.readinto(block[count:])
+                    if not read:
+                        break
+                    count += read
+
+                if count:
+                    f.write(block[:count])
+                    crc32 = ubinascii.crc32(block[:count], crc32)
+                    size += count
+
+                if count < block_len:
+                    break
+
+            f.flush()
+
+        return size, crc32 & 0xFFFFFFFF
+
+
+class StaticFileHandler:
+    """
+    Handles GET requests by sending a file from a directory on flash.
+
+    The file is named by the wildcard (b"/ui/*") or <name> (b"/clips/<name>")
+    part of the route, and a directory is answered with its index.html.
+
+    Nothing is hashed per request: a file's ETag is read from <name>.etag,
+    written by FileUploadHandler or alongside the file when it was deployed,
+    and a request whose If-None-Match matches it is answered with a 304 and
+    no body. When the client accepts gzip and <name>.gz exists, that is sent
+    instead, with its own ETag from <name>.gz.etag.
+
+    The file is sent in fixed-size reads through the response, so a file of
+    any size only ever needs one block of RAM, preallocated per connection.
+
+    Example:
+        ui = StaticFileHandler("/www")
+        network.add_http_server_route(b"GET", b"/ui/*", ui.handle)
+    """
+
+    __slots__ = (
+        "_directory",
+        "_streams",
+    )
+
+    _directory: str
+    _streams: tuple[_FileStream, ...]
+
+    def __init__(
+        self,
+        directory: str,
+        block_len: int = _STATIC_FILE_BLOCK_LEN,
+    ) -> None:
+        self._directory = directory
+
+        # a connection only ever sends one response at a time
+        self._streams = tuple(_FileStream(block_len) for _ in range(_MAX_CONNECTIONS))
+
+    async def handle(self, context: http.HTTPContext) -> None:
+        request = context.request
+        response = context.response
+
+        path = self._resolve(context.params)
+        if path is None:
+            response.reset(404)
+            return
+
+        accept_encoding = request.header(_HEADER_ACCEPT_ENCODING)
+        accepts_gzip = (
+            accept_encoding is not None and _TOKEN_GZIP in bytes(accept_encoding).lower()
+        )
+
+        gzip_path = path + _GZIP_FILE_SUFFIX
+        gzip_size = _file_size(gzip_path)
+        has_gzip = gzip_size >= 0
+        send_gzip = has_gzip and accepts_gzip
+
+        if send_gzip:
+            send_path = gzip_path
+            size = gzip_size
+        else:
+            send_path = path
+            size = _file_size(path)
+            if size < 0:
+                response.reset(404)
+                return
+
+        response.reset(200)
+        response.add_header(_HEADER_CACHE_CONTROL_NO_CACHE)
+        if has_gzip:
+            response.add_header(_HEADER_VARY_ACCEPT_ENCODING)
+
+        etag = _read_etag(send_path + _ETAG_FILE_SUFFIX)
+        if etag is not None:
+            response.set_header(b"ETag", etag)
+
+            if _etag_matches(request.header(_HEADER_IF_NONE_MATCH), etag):
+                response.status = 304
+                return
+
+        if send_gzip:
+            response.add_header(_HEADER_CONTENT_ENCODING_GZIP)
+
+        stream = self._streams[context.connection_id]
+        stream.open(send_path)
+        response.set_stream(stream, _content_type(path), size)
+
+    def _resolve(self, params: dict[bytes, bytes] | None) -> str | None:
+        """
+        Returns:
+            str | None: The path of the file to send, or None if the requested
+                name is not a valid path inside the directory.
+        """
+        name = None
+        if params:
+            name = params.get(_PARAM_WILDCARD)
+            if name is None:
+                name = params.get(_PARAM_NAME)
+
+        path = self._directory
+        if name:
+            start = 0
+            end = len(name)
+            while start < end:
+                separator = name.find(b"/", start)
+                if separator < 0:
+                    separator = end
+
+                if separator > start:
+                    segment = name[start:separator]
+                    if not is_valid_file_name(segment):
+                        return None
+                    path += "/" + segment.decode()
+
+                start = separator + 1
+
+        if _is_directory(path):
+            path += "/" + _INDEX_FILE_NAME
+
+        return path
+
+
+class _FileStream:
+    """
+    Async iterable over the blocks of a file, read into one reused buffer.
+
+    Each block is only valid until the next one is read, which is all
+    HTTPResponse needs as it sends every block before asking for the next.
+    """
+
+    __slots__ = (
+        "_file",
+        "_block",
+        "_block_view",
+    )
+
+    _file: object | None
+    _block: bytearray
+    _block_view: memoryview
+
+    def __init__(self, block_len: int) -> None:
+        self._file = None
+        self._block = bytearray(block_len)
+        self._block_view = memoryview(self._block)
+
+    def open(self, path: str) -> None:
+        self.close()
+        self._file = open(path, "rb")
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> memoryview:
+        count = self._file.readinto(self._block) if self._file is not None else 0
+        if not count:
+            self.close()
+            raise StopAsyncIteration
+
+        return self._block_view[:count]
+
+
+def is_valid_file_name(name: bytes | None) -> bool:
+    """
+    Returns:
+        bool: Whether name is a plain file name made of letters, digits,
+            ".", "-" and "_", that does not start with a "." nor end with
+            the suffix of a partial upload, ETag or gzip file.
+    """
+    if not name or len(name) > _MAX_FILE_NAME_LEN or name[0] == _ORD_DOT:
+        return False
+
+    for c in name:
+        if not (
+            0x30 <= c <= 0x39  # 0-9
+            or 0x41 <= c <= 0x5A  # A-Z
+            or 0x61 <= c <= 0x7A  # a-z
+            or c in b".-_"
+        ):
+            return False
+
+    for suffix in _RESERVED_FILE_SUFFIXES:
+        if name.endswith(suffix):
+            return False
+
+    return True
+
+
+def _content_type(path: str) -> bytes:
+    dot = path.rfind(".")
+    if dot < 0:
+        return http.CONTENT_TYPE_OCTET_STREAM
+
+    return _CONTENT_TYPES.get(path[dot + 1 :].lower(), http.CONTENT_TYPE_OCTET_STREAM)
+
+
+def _etag_matches(if_none_match: memoryview | None, etag: bytes) -> bool:
+    """
+    Returns:
+        bool: Whether an If-None-Match header value lists etag (or is *).
+    """
+    if if_none_match is None:
+        return False
+
+    value = bytes(if_none_match)
+    if value == _TOKEN_ANY:
+        return True
+
+    # a list of, possibly weak, ETags: "a", W/"b"
+    start = value.find(etag)
+    while start >= 0:
+        end = start + len(etag)
+        if end == len(value) or value[end] in b" ,":
+            return True
+
+        start = value.find(etag, end)
+
+    return False
+
+
+def _read_etag(path: str) -> bytes | None:
+    try:
+        with open(path, "rb") as f:
+            etag = f.read(_MAX_ETAG_LEN).strip()
+    except OSError:
+        return None
+
+    return etag or None
+
+
+def _file_size(path: str) -> int:
+    """
+    Returns:
+        int: The size of the file at path, or -1 if there is no such file.
+    """
+    try:
+        stat = uos.stat(path)
+    except OSError:
+        return -1
+
+    if stat[0] & _S_IFDIR:
+        return -1
+
+    return stat[6]
+
+
+def _is_directory(path: str) -> bool:
+    try:
+        return bool(uos.stat(path)[0] & _S_IFDIR)
+    except OSError:
+        return False
+
+
+def _parse_crc32(value: memoryview | None) -> int:
+    """
+    Returns:
+        int: The CRC-32 in value, or -1 if there is none or it is invalid.
+    """
+    if value is None or not 0 < len(value) <= 8:
+        return -1
+
+    try:
+        return int(bytes(value), 16)
+    except ValueError:
+        return -1
+
+
+def _make_directory(path: str) -> None:
+    try:
+        uos.mkdir(path)
+    except OSError:
+        pass  # already exists
+
+
+def _remove_file(path: str) -> None:
+    try:
+        uos.remove(path)
+    except OSError:
+        pass
@@ -1,9 +1,135 @@
+import utime
+import uasyncio
+
+from array import array
+from typing import Awaitable, Callable
 from micropython import const
 
-from bopbox.util import find_ord_in_memoryview
+from bopbox.util import find_ord, parse_int
 
+_ORD_TAB = const(0x09)  # ord("\t")
+_ORD_LF = const(0x0A)  # ord("\n")
+_ORD_CR = const(0x0D)  # ord("\r")
 _ORD_SPACE = const(0x20)  # ord(" ")
+_ORD_0 = const(0x30)  # ord("0")
 _ORD_COLON = const(0x3A)  # ord(":")
+_ORD_SEMICOLON = const(0x3B)  # ord(";")
+_ORD_QUESTION_MARK = const(0x3F)  # ord("?")
+
+# Headers past this count are ignored rather than failing the request
+_MAX_HEADERS = const(16)
+
+# A request head (request line + headers) larger than this is rejected
+_MAX_HEAD_LEN = const(2048)
+
+_HEADER_CONTENT_LENGTH = const(b"content-length")
+_HEADER_TRANSFER_ENCODING = const(b"transfer-encoding")
+_HEADER_EXPECT = const(b"expect")
+
+# HTTPRequest.parse() results that are not a request length
+PARSE_INCOMPLETE = const(-1)
+PARSE_INVALID = const(-2)
+
+# How long a streamed body may go without any of it being received
+_DEFAULT_BODY_READ_TIMEOUT_MS = const(10000)
+
+# Responses are assembled into a buffer of this size before being sent, so a
+# small response goes out in a single AT+CIPSEND
+_RESPONSE_BUFFER_LEN = const(1024)
+
+# The largest chunk of a streamed response that still fits in the response
+# buffer along with its size line (at most "3f9\r\n") and CRLF
+MAX_CHUNK_LEN = const(_RESPONSE_BUFFER_LEN - 7)
+
+_CRLF = const(b"\r\n")
+_CHUNKED_BODY_END = const(b"0\r\n\r\n")
+
+_HEADER_SERVER = const(b"Server: bopbox\r\n")
+_HEADER_TRANSFER_ENCODING_CHUNKED = const(b"Transfer-Encoding: chunked\r\n")
+_HEADER_CONNECTION_CLOSE = const(b"Connection: close\r\n")
+_HEADER_CONNECTION_KEEP_ALIVE = const(b"Connection: keep-alive\r\n")
+_HEADER_CONNECTION = const(b"connection")
+
+_TOKEN_CLOSE = const(b"close")
+_TOKEN_KEEP_ALIVE = const(b"keep-alive")
+_TOKEN_CHUNKED = const(b"chunked")
+_TOKEN_100_CONTINUE = const(b"100-continue")
+
+# Sent ahead of the response to a request with Expect: 100-continue, before
+# reading its body
+RESPONSE_CONTINUE = const(b"HTTP/1.1 100 Continue\r\n\r\n")
+
+# Sent as is, without going through HTTPResponse, to turn a client away as
+# cheaply as possible: when the server is at capacity, and when a request
+# takes too long to arrive
+RESPONSE_SERVICE_UNAVAILABLE = const(
+    b"HTTP/1.1 503 Service Unavailable\r\n"
+    b"Server: bopbox\r\n"
+    b"Retry-After: 1\r\n"
+    b"Connection: close\r\n"
+    b"Content-Length: 0\r\n\r\n"
+)
+RESPONSE_REQUEST_TIMEOUT = const(
+    b"HTTP/1.1 408 Request Timeout\r\n"
+    b"Server: bopbox\r\n"
+    b"Connection: close\r\n"
+    b"Content-Length: 0\r\n\r\n"
+)
+
+# HTTPBodyReader states
+_BODY_DONE = const(0)
+_BODY_DATA = const(1)
+_BODY_CHUNK_SIZE = const(2)
+_BODY_CHUNK_DATA = const(3)
+_BODY_CHUNK_END = const(4)
+_BODY_CHUNK_TRAILER = const(5)
+
+CONTENT_TYPE_JSON = const(b"Content-Type: application/json\r\n")
+CONTENT_TYPE_TEXT = const(b"Content-Type: text/plain; charset=utf-8\r\n")
+CONTENT_TYPE_HTML = const(b"Content-Type: text/html; charset=utf-8\r\n")
+CONTENT_TYPE_OCTET_STREAM = const(b"Content-Type: application/octet-stream\r\n")
+CONTENT_TYPE_AUDIO_MPEG = const(b"Content-Type: audio/mpeg\r\n")
+CONTENT_TYPE_AUDIO_WAV = const(b"Content-Type: audio/wav\r\n")
+CONTENT_TYPE_CSS = const(b"Content-Type: text/css; charset=utf-8\r\n")
+CONTENT_TYPE_JAVASCRIPT = const(b"Content-Type: text/javascript; charset=utf-8\r\n")
+CONTENT_TYPE_SVG = const(b"Content-Type: image/svg+xml\r\n")
+CONTENT_TYPE_PNG = const(b"Content-Type: image/png\r\n")
+CONTENT_TYPE_EVENT_STREAM = const(b"Content-Type: text/event-stream\r\n")
+CONTENT_TYPE_PROMETHEUS = const(b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n")
+
+_STATUS_REASONS = {
+    200: b"OK",
+    201: b"Created",
+    204: b"No Content",
+    304: b"Not Modified",
+    400: b"Bad Request",
+    404: b"Not Found",
+    405: b"Method Not Allowed",
+    408: b"Request Timeout",
+    411: b"Length Required",
+    413: b"Payload Too Large",
+    500: b"Internal Server Error",
+    503: b"Service Unavailable",
+}
+
+# Reason phrase of any other status, by its class (status // 100)
+_STATUS_CLASS_REASONS = (
+    b"Unknown",
+    b"Informational",
+    b"Success",
+    b"Redirection",
+    b"Client Error",
+    b"Server Error",
+)
+
+# Responses to these never have a body, nor a Content-Length
+_STATUS_WITHOUT_BODY = (204, 304)
+
+# Status line and Server header for every known status, encoded once at import
+_STATUS_HEADS = {
+    status: b"HTTP/1.1 " + str(status).encode() + b" " + reason + _CRLF + _HEADER_SERVER
+    for status, reason in _STATUS_REASONS.items()
+}
 
 
 class HTTPContext:
@@ -11,11 +137,15 @@ class HTTPContext:
         "connection_id",
         "request",
         "response",
+        "body",
+        "params",
     )
 
     connection_id: int
     request: HTTPRequest
     response: HTTPResponse
+    body: HTTPBodyReader | None
+    params: dict[bytes, bytes] | None
 
     def __init__(
         self,
@@ -26,97 +156,840 @@ class HTTPContext:
         self.connection_id = connection_id
         self.request = request
         self.response = response
+        self.body = None
+        self.params = None
 
 
 class HTTPRequest:
+    """
+    A parsed HTTP/1.x request.
+
+    Parsing never copies the request head: header lines are located with
+    find_ord() and only their offsets are recorded, so a header is only
+    decoded when a handler asks for it through header(). The method and path
+    are the only values copied out, since routing needs them as bytes.
+
+    The header and body views point into the buffer that was parsed and are
+    only valid for as long as that buffer is. A body that is still being
+    received is not available as body, it is read through an HTTPBodyReader
+    instead.
+
+    Example:
+        request = HTTPRequest()
+        length = request.parse(data)
+
+        if length == PARSE_INCOMPLETE:
+            ...  # wait for more data
+        elif length > 0:
+            content_type = request.header(b"content-type")
+    """
+
     __slots__ = (
         "method",
         "path",
-        "headers",
+        "query",
+        "version",
         "body",
+        "head_length",
+        "_data",
+        "_header_offsets",
+        "_header_count",
     )
 
     method: bytes
     path: bytes
-    headers: dict
+    query: bytes
+    version: int
     body: memoryview | None
+    head_length: int
 
-    def __init__(
-        self,
-        method: bytes,
-        path: bytes,
-        headers: dict,
-        body: memoryview | None = None,
-    ) -> None:
-        self.method = method
-        self.path = path
-        self.headers = headers
-        self.body = body
+    _data: memoryview | None
+    _header_offsets: array
+    _header_count: int
+
+    def __init__(self) -> None:
+        # (name start, colon, line end) for every header line
+        self._header_offsets = array("H", bytes(2 * 3 * _MAX_HEADERS))
+        self.reset()
+
+    def reset(self) -> None:
+        self.method = b""
+        self.path = b""
+        self.query = b""
+        self.version = 0
+        self.body = None
+        self.head_length = 0
+        self._data = None
+        self._header_count = 0
+
+    def release_data(self) -> None:
+        """
+        Drop the views into the parsed buffer, before the buffer is reused.
+
+        The method, path and query stay available, the headers and body do not.
+        """
+        self.body = None
+        self._data = None
+        self._header_count = 0
 
-    @staticmethod
     def parse(
+        self,
         data: memoryview,
-    ) -> HTTPRequest | None:
-        request = None
+    ) -> int:
+        """
+        Parse the request at the start of data.
 
-        reading_first_line = True
-        reading_header_lines = False
-        header_lines_end = 0
+        A request is only complete once its head and, if it has a
+        Content-Length, its whole body have been received. Once the head is
+        complete its length, method, path and headers are available even if
+        the body is not, so that the body can be streamed.
 
-        line_start, view_offset = 0, 0
-        while view_offset < len(data) - 1:
-            if data[view_offset] == 0x0D and data[view_offset + 1] == 0x0A:
-                line = data[line_start:view_offset]
+        Args:
+            data: The received bytes, starting at the request line.
 
-                if reading_first_line:
-                    # attempt to parse the first line of the message:
-                    # GET /test HTTP/1.1
+        Returns:
+            int: The length of the request (head and body) if it is complete,
+                PARSE_INCOMPLETE if more data is needed, or PARSE_INVALID if
+                data does not start with a valid request.
+        """
+        self.reset()
 
-                    method_space = find_ord_in_memoryview(line, _ORD_SPACE)
-                    path_space = method_space + find_ord_in_memoryview(
-                        line[method_space + 1 :], _ORD_SPACE
-                    )
+        end = len(data)
 
-                    if method_space != -1 and path_space != -1:
-                        method = bytes(line[:method_space])
-                        path = bytes(line[method_space + 1 : path_space + 1])
+        # GET /test HTTP/1.1
+        lf = find_ord(data, _ORD_LF, 0, min(end, _MAX_HEAD_LEN))
+        if lf < 0:
+            return PARSE_INCOMPLETE if end < _MAX_HEAD_LEN else PARSE_INVALID
 
-                        if method and path:
-                            request = HTTPRequest(
-                                method=method,
-                                path=path,
-                                headers={},
-                            )
+        line_end = _line_end(data, 0, lf)
+        method_space = find_ord(data, _ORD_SPACE, 0, line_end)
+        path_space = find_ord(data, _ORD_SPACE, method_space + 1, line_end)
+        if method_space < 1 or path_space < method_space + 2:
+            return PARSE_INVALID
 
-                    reading_first_line = False
-                    reading_header_lines = True
-                elif reading_header_lines:
-                    if len(line) == 0:
-                        reading_header_lines = False
-                        header_lines_end = (
-                            view_offset + 2
-                        )  # add 2 to account for the /r/n ending
+        # HTTP/1.x
+        if line_end - path_space != 9:
+            return PARSE_INVALID
 
-                        break
+        self.version = data[line_end - 1] - _ORD_0
 
-                    colon = find_ord_in_memoryview(line, _ORD_COLON)
-                    if colon != -1 and request:
-                        key = bytes(line[:colon]).strip().lower()
-                        value = bytes(line[colon + 1 :]).strip()
-                        request.headers[key] = value
+        # header lines until an empty line ends the head
+        offsets = self._header_offsets
+        count = 0
+        head_end = -1
 
-                line_start = view_offset + 2
-                view_offset += 1
-            view_offset += 1
+        line_start = lf + 1
+        while line_start < end:
+            lf = find_ord(data, _ORD_LF, line_start, min(end, _MAX_HEAD_LEN))
+            if lf < 0:
+                break
 
-        if request:
-            request.body = data[header_lines_end:]
+            line_end = _line_end(data, line_start, lf)
+            if line_end == line_start:
+                head_end = lf + 1
+                break
 
-        return request
+            colon = find_ord(data, _ORD_COLON, line_start, line_end)
+            if colon > line_start and count < _MAX_HEADERS:
+                offsets[count * 3] = line_start
+                offsets[count * 3 + 1] = colon
+                offsets[count * 3 + 2] = line_end
+                count += 1
 
+            line_start = lf + 1
 
-class HTTPResponse:
-    __slots__ = ""
+        if head_end < 0:
+            return PARSE_INCOMPLETE if end < _MAX_HEAD_LEN else PARSE_INVALID
+
+        self._data = data
+        self._header_count = count
+        self.head_length = head_end
+
+        self.method = bytes(data[:method_space])
+
+        query_start = find_ord(data, _ORD_QUESTION_MARK, method_space + 1, path_space)
+        if query_start < 0:
+            self.path = bytes(data[method_space + 1 : path_space])
+        else:
+            self.path = bytes(data[method_space + 1 : query_start])
+            self.query = bytes(data[query_start + 1 : path_space])
+
+        if self.chunked:
+            # only the chunks themselves tell where the body ends
+            return PARSE_INCOMPLETE
+
+        length = head_end
+        value = self.header(_HEADER_CONTENT_LENGTH)
+        if value is not None:
+            content_length = parse_int(value, 0, len(value))
+            if content_length < 0:
+                # without it, where the body ends and the next request starts
+                # is anyone's guess
+                return PARSE_INVALID
+
+            length += content_length
+            if length > end:
+                return PARSE_INCOMPLETE
+
+        self.body = data[head_end:length]
+
+        return length
+
+    def header(
+        self,
+        name: bytes,
+    ) -> memoryview | None:
+        """
+        Look up a header value without decoding any of the others.
+
+        Args:
+            name: The lowercase header name, e.g. b"content-type".
+
+        Returns:
+            memoryview | None: The value with surrounding whitespace removed,
+                or None if the request has no such header.
+        """
+        data = self._data
+        offsets = self._header_offsets
+        length = len(name)
+
+        for i in range(0, self._header_count * 3, 3):
+            start = offsets[i]
+            colon = offsets[i + 1]
+            if colon - start != length:
+                continue
+
+            # ASCII case-insensitive compare against the lowercase name
+            for j in range(length):
+                if data[start + j] | 0x20 != name[j] | 0x20:
+                    break
+            else:
+                value_start = colon + 1
+                value_end = offsets[i + 2]
+                while value_start < value_end and data[value_start] in (_ORD_SPACE, _ORD_TAB):
+                    value_start += 1
+                while value_end > value_start and data[value_end - 1] in (_ORD_SPACE, _ORD_TAB):
+                    value_end -= 1
+
+                return data[value_start:value_end]
+
+        return None
+
+    def get_header(
+        self,
+        name: bytes,
+        default: bytes | None = None,
+    ) -> bytes | None:
+        """
+        Like header(), but copies the value out into bytes.
+        """
+        value = self.header(name)
+        return default if value is None else bytes(value)
+
+    @property
+    def keep_alive(self) -> bool:
+        """
+        Returns:
+            bool: Whether the client wants the connection kept open after the
+                response: by default for HTTP/1.1, on request for HTTP/1.0.
+        """
+        value = self.header(_HEADER_CONNECTION)
+        if value is None:
+            return self.version >= 1
+
+        value = bytes(value).lower()
+        if self.version >= 1:
+            return _TOKEN_CLOSE not in value
+
+        return _TOKEN_KEEP_ALIVE in value
+
+    @property
+    def content_length(self) -> int:
+        """
+        Returns:
+            int: The Content-Length of the request, or -1 if it has none (or an invalid one).
+        """
+        value = self.header(_HEADER_CONTENT_LENGTH)
+        if value is None:
+            return -1
+
+        return parse_int(value, 0, len(value))
+
+    @property
+    def chunked(self) -> bool:
+        """
+        Returns:
+            bool: Whether the body is sent with Transfer-Encoding: chunked.
+        """
+        value = self.header(_HEADER_TRANSFER_ENCODING)
+        return value is not None and _TOKEN_CHUNKED in bytes(value).lower()
+
+    @property
+    def expects_continue(self) -> bool:
+        """
+        Returns:
+            bool: Whether the client waits for RESPONSE_CONTINUE before sending the body.
+        """
+        value = self.header(_HEADER_EXPECT)
+        return value is not None and bytes(value).lower() == _TOKEN_100_CONTINUE
+
+
+class HTTPBodyError(Exception):
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
+
+
+class HTTPBodyReader:
+    """
+    Reads a request body out of the connection buffer as it is received,
+    for bodies too large to be buffered whole.
+
+    Both Content-Length and chunked bodies are supported, chunked bodies are
+    decoded on the fly. The body is copied into the caller's buffer as it
+    arrives, and every byte read is released from the connection buffer right
+    away to make room for the next ones, so reading a body of any size only
+    ever needs the caller's buffer.
+
+    Making room moves the buffered data, after which the request's headers
+    and body are no longer available: read every header needed before
+    reading the body.
+
+    Example:
+        block = bytearray(512)
+        while True:
+            count = await context.body.readinto(block)
+            if not count:
+                break
+            ...  # handle block[:count]
+    """
+
+    __slots__ = (
+        "_buffer",
+        "_received",
+        "_request",
+        "_state",
+        "_remaining",
+        "_timeout_ms",
+        "_waited_ms",
+    )
+
+    _buffer: object | None
+    _received: uasyncio.Event | None
+    _request: HTTPRequest | None
+    _state: int
+    _remaining: int
+    _timeout_ms: int
+    _waited_ms: int  # time spent waiting for the body to be received
 
     def __init__(self) -> None:
-        pass
+        self.reset()
+
+    def reset(
+        self,
+        buffer: object | None = None,
+        received: uasyncio.Event | None = None,
+        request: HTTPRequest | None = None,
+        timeout_ms: int = _DEFAULT_BODY_READ_TIMEOUT_MS,
+    ) -> None:
+        """
+        Start reading the body of request.
+
+        Args:
+            buffer: The connection buffer, positioned at the start of the body
+                (see TCPServerConnectionBuffer).
+            received: Set whenever more data has been appended to buffer.
+            request: The request whose head has been parsed.
+            timeout_ms: How long a read waits for more of the body to be
+                received before giving up.
+        """
+        self._buffer = buffer
+        self._received = received
+        self._request = request
+        self._remaining = 0
+        self._timeout_ms = timeout_ms
+        self._waited_ms = 0
+        self._state = _BODY_DONE
+
+        if request is None:
+            return
+
+        if request.chunked:
+            self._state = _BODY_CHUNK_SIZE
+            return
+
+        content_length = request.content_length
+        if content_length > 0:
+            self._state = _BODY_DATA
+            self._remaining = content_length
+
+    @property
+    def done(self) -> bool:
+        """
+        Returns:
+            bool: Whether the whole body has been read.
+        """
+        return self._state == _BODY_DONE
+
+    @property
+    def waited_ms(self) -> int:
+        """
+        Returns:
+            int: How long reads have spent waiting for the body to be received.
+        """
+        return self._waited_ms
+
+    async def readinto(self, into: bytearray | memoryview) -> int:
+        """
+        Read the next part of the body, waiting for it to be received if needed.
+
+        Args:
+            into: Buffer to copy the body into.
+
+        Returns:
+            int: The number of bytes read, at most len(into), or 0 once the
+                whole body has been read.
+
+        Raises:
+            HTTPBodyError: If the body is malformed, was not received intact,
+                or none of it was received for timeout_ms.
+        """
+        while True:
+            state = self._state
+            if state == _BODY_DONE or not len(into):
+                return 0
+
+            buffer = self._buffer
+            view = buffer.view()
+            available = len(view)
+
+            if state == _BODY_DATA or state == _BODY_CHUNK_DATA:
+                if available:
+                    count = min(available, self._remaining, len(into))
+                    into[:count] = view[:count]
+
+                    self._remaining -= count
+                    if not self._remaining:
+                        self._state = _BODY_CHUNK_END if state == _BODY_CHUNK_DATA else _BODY_DONE
+
+                    self._release(count)
+                    return count
+            else:
+                lf = find_ord(view, _ORD_LF, 0, available)
+                if lf >= 0:
+                    self._process_line(view, _line_end(view, 0, lf))
+                    self._release(lf + 1)
+                    continue
+
+                if available == buffer.capacity:
+                    raise HTTPBodyError("Chunk line too long")
+
+            if buffer.overflowed:
+                raise HTTPBodyError("Body was not received intact")
+
+            received = self._received
+            received.clear()
+
+            started = utime.ticks_ms()
+            try:
+                await uasyncio.wait_for_ms(received.wait(), self._timeout_ms)
+            except uasyncio.TimeoutError:
+                raise HTTPBodyError("Timed out waiting for the body")
+            finally:
+                self._waited_ms += utime.ticks_diff(utime.ticks_ms(), started)
+
+    def skip(self) -> bool:
+        """
+        Discard the part of a Content-Length body that is already buffered
+        and was not read.
+
+        Returns:
+            bool: True if the whole body has been read or discarded, False if
+                more of it is still to be received or it was not received intact.
+        """
+        if self._buffer is not None and self._buffer.overflowed:
+            return False
+
+        if self._state == _BODY_DATA:
+            count = min(len(self._buffer), self._remaining)
+            self._buffer.consume(count)
+            self._remaining -= count
+            if not self._remaining:
+                self._state = _BODY_DONE
+
+        return self._state == _BODY_DONE
+
+    def _process_line(self, view: memoryview, end: int) -> None:
+        state = self._state
+
+        if state == _BODY_CHUNK_SIZE:
+            # <size in hex>[;extensions]
+            size_end = find_ord(view, _ORD_SEMICOLON, 0, end)
+            size = _parse_hex(view, 0, end if size_end < 0 else size_end)
+            if size < 0:
+                raise HTTPBodyError("Invalid chunk size")
+
+            self._remaining = size
+            self._state = _BODY_CHUNK_DATA if size else _BODY_CHUNK_TRAILER
+        elif state == _BODY_CHUNK_END:
+            if end:
+                raise HTTPBodyError("Missing chunk end")
+
+            self._state = _BODY_CHUNK_SIZE
+        elif not end:
+            # the empty line ending the (ignored) trailer fields
+            self._state = _BODY_DONE
+
+    def _release(self, count: int) -> None:
+        buffer = self._buffer
+        buffer.consume(count)
+
+        request = self._request
+        if request is not None:
+            # the request views are about to be moved out from under it
+            request.release_data()
+            self._request = None
+
+        buffer.compact()
+
+
+def _parse_hex(
+    data: memoryview,
+    start: int,
+    end: int,
+) -> int:
+    """
+    Returns:
+        int: The value of the hexadecimal number in data[start:end], ignoring
+            surrounding whitespace, or -1 if it is empty or invalid.
+    """
+    while start < end and data[start] in (_ORD_SPACE, _ORD_TAB):
+        start += 1
+    while end > start and data[end - 1] in (_ORD_SPACE, _ORD_TAB):
+        end -= 1
+
+    if start >= end or end - start > 8:
+        return -1
+
+    value = 0
+    for i in range(start, end):
+        digit = data[i] | 0x20  # lowercase
+        if _ORD_0 <= digit <= _ORD_0 + 9:
+            digit -= _ORD_0
+        elif 0x61 <= digit <= 0x66:  # a-f
+            digit -= 0x57
+        else:
+            return -1
+        value = value * 16 + digit
+
+    return value
+
+
+def _line_end(
+    data: memoryview,
+    start: int,
+    lf: int,
+) -> int:
+    """Index of the end of the line ending at lf, excluding a \\r before it."""
+    if lf > start and data[lf - 1] == _ORD_CR:
+        return lf - 1
+
+    return lf
+
+
+class HTTPResponse:
+    """
+    An HTTP/1.1 response, sent with either a fixed body or a streamed one.
+
+    The status line, Server header and common Content-Type headers are
+    encoded once at import, so only Content-Length (or the chunk sizes) and
+    any extra headers are formatted per response.
+
+    The response is assembled in a fixed-size buffer that is sent whenever it
+    fills up, so a small response goes out in one AT+CIPSEND, and a large or
+    streamed body never has to be held in RAM in full.
+
+    Example:
+        response.set_body(b'{"ok":true}', CONTENT_TYPE_JSON)
+
+        response.set_stream(chunks, CONTENT_TYPE_AUDIO_MPEG)  # Transfer-Encoding: chunked
+        response.set_stream(blocks, CONTENT_TYPE_AUDIO_MPEG, size)  # Content-Length: size
+        response.set_serialized(data)  # data from an earlier serialize()
+    """
+
+    __slots__ = (
+        "status",
+        "keep_alive",
+        "_content_type",
+        "_headers",
+        "_body",
+        "_stream",
+        "_stream_length",
+        "_serialized",
+        "_buffer",
+        "_buffer_view",
+        "_buffer_len",
+        "_send_data",
+        "_connection_id",
+    )
+
+    status: int
+    keep_alive: bool
+
+    _content_type: bytes | None
+    _headers: list[bytes]
+    _body: bytes | memoryview | None
+    _stream: object | None
+    _stream_length: int
+    _serialized: bytes | None
+
+    _buffer: bytearray
+    _buffer_view: memoryview
+    _buffer_len: int
+
+    _send_data: Callable[[int, memoryview], Awaitable[bool]] | None
+    _connection_id: int
+
+    def __init__(self, status: int = 200) -> None:
+        self._buffer = bytearray(_RESPONSE_BUFFER_LEN)
+        self._buffer_view = memoryview(self._buffer)
+        self._send_data = None
+        self._connection_id = -1
+        self._stream = None
+        self.reset(status)
+
+    def reset(self, status: int = 200) -> None:
+        self._close_stream()
+
+        self.status = status
+        self.keep_alive = False
+        self._content_type = None
+        self._headers = []
+        self._body = None
+        self._stream_length = -1
+        self._serialized = None
+        self._buffer_len = 0
+
+    def add_header(self, line: bytes) -> None:
+        """
+        Add a pre-encoded header line, e.g. b"Cache-Control: no-cache\\r\\n".
+        """
+        self._headers.append(line)
+
+    def set_header(self, name: bytes, value: bytes) -> None:
+        self._headers.append(name + b": " + value + _CRLF)
+
+    def set_body(
+        self,
+        body: bytes | memoryview,
+        content_type: bytes = CONTENT_TYPE_OCTET_STREAM,
+    ) -> None:
+        """
+        Send body with a Content-Length.
+
+        Args:
+            body: The whole body, it is sent as is without being copied first.
+            content_type: A pre-encoded Content-Type header line, e.g. CONTENT_TYPE_JSON.
+        """
+        self._close_stream()
+
+        self._body = body
+        self._content_type = content_type
+
+    def set_stream(
+        self,
+        stream,
+        content_type: bytes = CONTENT_TYPE_OCTET_STREAM,
+        content_length: int = -1,
+    ) -> None:
+        """
+        Send the body with Transfer-Encoding: chunked, one chunk per item of
+        stream, or as is with a Content-Length if the length is known.
+
+        Chunks are sent as soon as they are produced, so a stream can be as
+        slow or long-lived as an event stream.
+
+        Args:
+            stream: An async iterable of bytes-like chunks, e.g. an object with
+                __aiter__()/__anext__(), or an async generator where supported.
+                Empty chunks are skipped. If it has a close() method, it is
+                called once the response has been sent or failed to, or is
+                reset or given another body before that.
+            content_type: A pre-encoded Content-Type header line, e.g. CONTENT_TYPE_AUDIO_MPEG.
+            content_length: The total length of the chunks, or -1 if unknown.
+        """
+        if stream is not self._stream:
+            self._close_stream()
+
+        self._body = None
+        self._stream = stream
+        self._stream_length = content_length
+        self._content_type = content_type
+
+    def serialize(self) -> bytes | None:
+        """
+        Encode a 200 response with a fixed body into bytes that can be sent
+        again with set_serialized(), e.g. to cache it.
+
+        Returns:
+            bytes | None: The headers (except Connection) and body, or None if
+                the response is not a 200 with a body set by set_body().
+        """
+        if self.status != 200 or self._body is None or self._stream is not None:
+            return None
+
+        return (
+            b"".join(self._headers)
+            + (self._content_type or b"")
+            + ("Content-Length: %d\r\n\r\n" % len(self._body)).encode()
+            + self._body
+        )
+
+    def set_serialized(self, data: bytes) -> None:
+        """
+        Send a 200 response from the result of serialize(), as is.
+        """
+        self.reset(200)
+        self._serialized = data
+
+    async def send(
+        self,
+        send_data: Callable[[int, memoryview], Awaitable[bool]],
+        connection_id: int,
+    ) -> bool:
+        """
+        Send the response.
+
+        Args:
+            send_data: Sends data on a connection, e.g. ESP01S.send_tcp_server_connection_data.
+            connection_id: The connection to send the response on.
+
+        Returns:
+            bool: True if the whole response was sent, False otherwise.
+        """
+        self._send_data = send_data
+        self._connection_id = connection_id
+        self._buffer_len = 0
+
+        try:
+            return await self._send()
+        finally:
+            self._send_data = None
+            self._close_stream()
+
+    def _close_stream(self) -> None:
+        """Let go of the stream, if any, so that whatever it holds is not leaked."""
+        stream = self._stream
+        self._stream = None
+
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+
+    async def _send(self) -> bool:
+        write = self._write
+
+        head = _STATUS_HEADS.get(self.status)
+        if head is None:
+            status_class = self.status // 100
+            reason = _STATUS_CLASS_REASONS[
+                status_class if 0 < status_class < len(_STATUS_CLASS_REASONS) else 0
+            ]
+            head = b"HTTP/1.1 " + str(self.status).encode() + b" " + reason + _CRLF + _HEADER_SERVER
+
+        if not await write(head):
+            return False
+
+        if not await write(
+            _HEADER_CONNECTION_KEEP_ALIVE if self.keep_alive else _HEADER_CONNECTION_CLOSE
+        ):
+            return False
+
+        if self._serialized is not None:
+            return await write(self._serialized) and await self._flush()
+
+        for line in self._headers:
+            if not await write(line):
+                return False
+
+        if self._content_type and not await write(self._content_type):
+            return False
+
+        if self.status in _STATUS_WITHOUT_BODY:
+            return await write(_CRLF) and await self._flush()
+
+        if self._stream is not None:
+            return await self._send_stream()
+
+        body = self._body if self._body is not None else b""
+
+        return (
+            await write(("Content-Length: %d\r\n\r\n" % len(body)).encode())
+            and await write(body)
+            and await self._flush()
+        )
+
+    async def _send_stream(self) -> bool:
+        write = self._write
+
+        if self._stream_length >= 0:
+            if not await write(("Content-Length: %d\r\n\r\n" % self._stream_length).encode()):
+                return False
+
+            async for chunk in self._stream:
+                if not await write(chunk):
+                    return False
+
+            return await self._flush()
+
+        if not await write(_HEADER_TRANSFER_ENCODING_CHUNKED + _CRLF):
+            return False
+
+        async for chunk in self._stream:
+            if not len(chunk):
+                continue
+
+            if not (
+                await write(("%x\r\n" % len(chunk)).encode())
+                and await write(chunk)
+                and await write(_CRLF)
+                and await self._flush()
+            ):
+                return False
+
+        return await write(_CHUNKED_BODY_END) and await self._flush()
+
+    async def _write(self, data: bytes | memoryview) -> bool:
+        """
+        Append data to the response buffer, sending the buffer whenever it
+        fills up. Data at least as large as the buffer is sent straight from
+        the caller's memory instead of being copied.
+        """
+        view = memoryview(data)
+        length = len(view)
+        capacity = len(self._buffer)
+
+        if length >= capacity:
+            return await self._flush() and await self._send_data(self._connection_id, view)
+
+        offset = 0
+        while offset < length:
+            count = min(length - offset, capacity - self._buffer_len)
+            self._buffer_view[self._buffer_len : self._buffer_len + count] = view[
+                offset : offset + count
+            ]
+            self._buffer_len += count
+            offset += count
+
+            if self._buffer_len == capacity and not await self._flush():
+                return False
+
+        return True
+
+    async def _flush(self) -> bool:
+        count = self._buffer_len
+        if not count:
+            return True
+
+        self._buffer_len = 0
+
+        return await self._send_data(self._connection_id, self._buffer_view[:count])
@@ -1,31 +1,147 @@
+import utime
 import uasyncio
 
 from micropython import const
 
-from ...services import logger
+from ...config import config
+from ...services import logger, metrics
 from ...drivers.esp01s import esp01s
 
-from . import http
+from . import http, router
+
+
+# The ESP-01S supports up to 5 simultaneous connections (IDs 0-4)
+_MAX_HTTP_SERVER_CONNECTIONS = const(5)
+
+_DEFAULT_HTTP_SERVER_IDLE_TIMEOUT_S = const(15)
+_DEFAULT_HTTP_SERVER_MAX_HANDLERS = const(3)
+_DEFAULT_HTTP_SERVER_REQUEST_TIMEOUT_S = const(30)
+_DEFAULT_HTTP_SERVER_HEADER_TIMEOUT_S = const(5)
+
+# How often connections are checked for requests that take too long to arrive
+_HTTP_SERVER_WATCHDOG_INTERVAL_MS = const(1000)
+
+# Distinct response status codes timed separately
+_METRICS_MAX_STATUS_CODES = const(8)
+
+_http_request_duration = metrics.histogram(
+    b"bopbox_http_request_duration_seconds",
+    b"Time from dispatching an HTTP request to its response having been sent.",
+    label=b"code",
+    max_series=_METRICS_MAX_STATUS_CODES,
+)
+_http_requests_shed = metrics.counter(
+    b"bopbox_http_requests_shed_total",
+    b"HTTP requests turned away with a 503 because every handler was busy.",
+)
+
+
+class _HTTPServerConnection:
+    """
+    State of one connection slot of the HTTP server.
+
+    One is allocated per slot when the server is created and reused by every
+    connection and request on that slot, so serving a request does not
+    allocate a request, response or buffer of its own.
+    """
+
+    __slots__ = (
+        "open",
+        "buffer",
+        "received",
+        "context",
+        "task",
+        "last_active",
+        "receiving",
+        "receiving_since",
+        "handled",
+        "closing",
+    )
+
+    open: bool
+    buffer: esp01s.TCPServerConnectionBuffer | None
+    received: uasyncio.Event
+    context: http.HTTPContext
+    task: uasyncio.Task | None
+    last_active: int
+
+    # whether part of a request has been received but not enough to handle it
+    receiving: bool
+    receiving_since: int
+
+    # set once the handler of the current request has returned
+    handled: uasyncio.Event
+
+    # whether the server is closing the connection, which the ESP reports
+    # as closed before it has acknowledged the close
+    closing: bool
+
+    def __init__(self, connection_id: int) -> None:
+        self.open = False
+        self.buffer = None
+        self.received = uasyncio.Event()
+        self.context = http.HTTPContext(
+            connection_id,
+            http.HTTPRequest(),
+            http.HTTPResponse(),
+        )
+        self.context.body = http.HTTPBodyReader()
+        self.task = None
+        self.last_active = 0
+        self.receiving = False
+        self.receiving_since = 0
+        self.handled = uasyncio.Event()
+        self.closing = False
 
 
 class Network:
     __slots__ = (
         "_logger",
         "_driver",
-        "_http_server_requests",
+        "_http_server_router",
+        "_http_server_connections",
+        "_http_server_watchdog",
+        "_http_server_handlers",
+        "_http_server_max_handlers",
+        "_http_server_request_timeout_ms",
+        "_http_server_header_timeout_ms",
     )
 
     _logger: logger.Logger
     _driver: esp01s.ESP01S
 
-    _http_server_requests: dict[int, uasyncio.Task]
+    _http_server_router: router.HTTPRouter
+
+    _http_server_connections: tuple[_HTTPServerConnection, ...]
+    _http_server_watchdog: uasyncio.Task | None
+
+    # admission control, handlers running right now and the most allowed
+    _http_server_handlers: int
+    _http_server_max_handlers: int
+    _http_server_request_timeout_ms: int
+    _http_server_header_timeout_ms: int
 
     def __init__(self) -> None:
         self._logger = logger.get_logger("network")
         self._driver = esp01s.ESP01S(
+            on_tcp_connection_opened=self.handle_http_server_connection_opened,
+            on_tcp_connection_closed=self.handle_http_server_connection_closed,
             on_tcp_connection_data=self.handle_http_server_request,
         )
 
+        self._http_server_connections = tuple(
+            _HTTPServerConnection(connection_id)
+            for connection_id in range(_MAX_HTTP_SERVER_CONNECTIONS)
+        )
+
+        self._http_server_router = router.HTTPRouter()
+        self._http_server_watchdog = None
+
+        self._http_server_handlers = 0
+        self._http_server_max_handlers = _DEFAULT_HTTP_SERVER_MAX_HANDLERS
+        self._http_server_request_timeout_ms = _DEFAULT_HTTP_SERVER_REQUEST_TIMEOUT_S * 1000
+        self._http_server_header_timeout_ms = _DEFAULT_HTTP_SERVER_HEADER_TIMEOUT_S * 1000
+
     async def connect(self, ssid: bytes, password: bytes) -> bool:
         self._logger.info(f'Connecting to wifi network ssid="{ssid.decode()}"')
 
@@ -36,6 +152,16 @@ class Network:
 
             return False
 
+        if config.wifi_uart_baud_rate:
+            if await self._driver.set_uart_baud_rate(config.wifi_uart_baud_rate):
+                self._logger.info(
+                    f'Switched the ESP01S UART to baud_rate="{config.wifi_uart_baud_rate}"'
+                )
+            else:
+                self._logger.warn(
+                    f'Unable to switch the ESP01S UART to baud_rate="{config.wifi_uart_baud_rate}", staying on the default'
+                )
+
         if await self._driver.set_wifi_mode(esp01s.WIFI_MODE_STATION) == False:
             self._logger.error(
                 f"Unable to connect to wifi network, failed to set ESP01S in WIFI_MODE_STATION"
@@ -53,10 +179,33 @@ class Network:
         self._logger.info(f'Connected to the wifi network ssid="{ssid.decode()}"')
         return True
 
+    def add_http_server_route(
+        self,
+        method: bytes,
+        path: bytes,
+        handler: router.Handler,
+    ) -> None:
+        """
+        Register an HTTP server route, see HTTPRouter.add_route().
+
+        Routes have to be added before the HTTP server is started.
+        """
+        self._http_server_router.add_route(method, path, handler)
+
     async def start_http_server(self, port: int) -> None:
         self._logger.info(f'Starting an HTTP server port="{port}"')
 
-        self._http_server_requests = {}
+        self._http_server_router.compile()
+
+        self._http_server_max_handlers = (
+            config.http_server_max_handlers or _DEFAULT_HTTP_SERVER_MAX_HANDLERS
+        )
+        self._http_server_request_timeout_ms = 1000 * (
+            config.http_server_request_timeout or _DEFAULT_HTTP_SERVER_REQUEST_TIMEOUT_S
+        )
+        self._http_server_header_timeout_ms = 1000 * (
+            config.http_server_header_timeout or _DEFAULT_HTTP_SERVER_HEADER_TIMEOUT_S
+        )
 
         await self._driver.set_tcp_ipd_message_mode(1)
         await self._driver.set_tcp_server_connection_multiplexing(
@@ -65,56 +214,368 @@ class Network:
 
         await self._driver.start_tcp_server(port)
 
+        # Let the ESP close keep-alive connections that went quiet, so they
+        # do not sit on one of its 5 connection slots forever
+        await self._driver.set_tcp_server_timeout(
+            config.http_server_idle_timeout or _DEFAULT_HTTP_SERVER_IDLE_TIMEOUT_S
+        )
+
+        if self._http_server_watchdog is None:
+            self._http_server_watchdog = uasyncio.create_task(
+                self._watch_http_server_connections()
+            )
+
         self._logger.info(f'HTTP server up and running on port="{port}"')
 
+    def handle_http_server_connection_opened(
+        self,
+        connection_id: int,
+    ) -> None:
+        connection = self._http_server_connections[connection_id]
+        connection.open = True
+        connection.last_active = utime.ticks_ms()
+
+        # With every slot taken the ESP turns new clients away, so make room by
+        # closing the keep-alive connection that has been idle the longest
+        if self._count_open_http_server_connections() >= _MAX_HTTP_SERVER_CONNECTIONS:
+            idle_id = self._find_idle_http_server_connection(connection_id)
+            if idle_id is not None:
+                self._logger.debug(f"Closing idle connection_id={idle_id}")
+                uasyncio.create_task(self._close_http_server_connection(idle_id))
+
+    def handle_http_server_connection_closed(
+        self,
+        connection_id: int,
+    ) -> None:
+        connection = self._http_server_connections[connection_id]
+        connection.open = False
+        connection.buffer = None
+        connection.receiving = False
+
+        # A close of our own is reported while it is still being awaited,
+        # possibly by the task serving the connection, which is done anyway
+        if connection.task and not connection.closing:
+            connection.task.cancel()
+
     def handle_http_server_request(
         self,
         connection_id: int,
-        data: memoryview,
+        buffer: esp01s.TCPServerConnectionBuffer,
     ) -> None:
-        self._logger.info(f"Processing HTTP request on connection_id={connection_id}")
+        connection = self._http_server_connections[connection_id]
+        connection.open = True
+        connection.buffer = buffer
+        connection.last_active = utime.ticks_ms()
+        connection.received.set()
 
-        request = http.HTTPRequest.parse(data)
-        if request == None:
-            return
+        # Pipelined requests, and the rest of a request that is still being
+        # received, are picked up by the task already serving this connection
+        # once it is done with the current request
+        if connection.task is None:
+            connection.task = uasyncio.create_task(
+                self.process_http_server_requests(connection_id, connection),
+            )
 
-        self._logger.info(f"request method={request.method} path={request.path}")
+    async def process_http_server_requests(
+        self,
+        connection_id: int,
+        connection: _HTTPServerConnection,
+    ) -> None:
+        """
+        Serve the requests received on a connection one after the other,
+        until the buffered data runs out or the connection should be closed.
+        """
+        context = connection.context
+        request = context.request
+        response = context.response
+        body = context.body
 
-        response = http.HTTPResponse()
-        context = http.HTTPContext(
-            connection_id,
-            request,
-            response,
-        )
+        try:
+            while connection.buffer is not None:
+                buffer = connection.buffer
 
-        if connection_id in self._http_server_requests:
-            return
+                # requests are handled where they were received, so only move
+                # what is left over to the front in between requests
+                buffer.compact()
 
-        self._http_server_requests[connection_id] = uasyncio.create_task(
-            self.process_http_server_request(context),
-        )
+                length = request.parse(buffer.view())
+
+                if length == http.PARSE_INCOMPLETE and not buffer.overflowed:
+                    # Wait for the rest of the request, unless its body has
+                    # to be streamed to the handler as it is received
+                    if not self._should_stream_http_server_request_body(request, buffer):
+                        # the watchdog times out requests that never complete
+                        if not connection.receiving and len(buffer):
+                            connection.receiving = True
+                            connection.receiving_since = utime.ticks_ms()
+                        return
+                elif length < 0:
+                    # 413 if the request did not fit in the connection buffer
+                    response.reset(400 if length == http.PARSE_INVALID else 413)
+                    await response.send(
+                        self._driver.send_tcp_server_connection_data,
+                        connection_id,
+                    )
+                    await self._close_http_server_connection(connection_id)
+                    return
+
+                connection.receiving = False
+
+                if self._http_server_handlers >= self._http_server_max_handlers:
+                    # At capacity: turn the client away right now rather than
+                    # leaving it waiting on a slot the ESP cannot spare
+                    self._logger.warn(
+                        f"Shedding request connection_id={connection_id} path={request.path}"
+                    )
+                    _http_requests_shed.inc()
+                    await self._driver.send_tcp_server_connection_data(
+                        connection_id,
+                        http.RESPONSE_SERVICE_UNAVAILABLE,
+                    )
+                    await self._close_http_server_connection(connection_id)
+                    return
+
+                # Take the slot before anything is awaited, or requests on other
+                # connections could all pass the check above in the meantime.
+                # process_http_server_request() gives it back.
+                self._http_server_handlers += 1
+                try:
+                    self._logger.info(
+                        f"request connection_id={connection_id} method={request.method} path={request.path}"
+                    )
+
+                    context.params = None
+                    response.reset()
+
+                    # the handler reads the body, if any, from right after the head
+                    buffer.consume(request.head_length)
+                    body.reset(buffer, connection.received, request)
+
+                    if length < 0 and request.expects_continue:
+                        await self._driver.send_tcp_server_connection_data(
+                            connection_id,
+                            http.RESPONSE_CONTINUE,
+                        )
+                except BaseException:
+                    self._http_server_handlers -= 1
+                    raise
+
+                keep_alive = await self.process_http_server_request(context)
+
+                connection.last_active = utime.ticks_ms()
+
+                if not keep_alive:
+                    await self._close_http_server_connection(connection_id)
+                    return
+        finally:
+            request.reset()
+            # closes a stream that was never sent, e.g. when the connection closed
+            response.reset()
+            body.reset()
+            connection.task = None
 
     async def process_http_server_request(
         self,
         context: http.HTTPContext,
-    ) -> None:
+    ) -> bool:
+        """
+        Run the handler for a request and send its response, giving back the
+        handler slot taken for it as soon as the handler has returned: the
+        response may be an event stream that is sent for as long as the
+        client stays connected.
+
+        Returns:
+            bool: True if the connection should be kept open for more requests.
+        """
+        # the headers are gone once the handler has read a streamed body
+        keep_alive = context.request.keep_alive
+        started = utime.ticks_ms()
+
         try:
-            # @TODO: implement the sending of the response
-            await self._driver.send_tcp_server_connection_data(
-                context.connection_id,
-                memoryview(bytes()),
+            await self._dispatch_http_server_request(context)
+        except uasyncio.TimeoutError:
+            self._logger.warn(f"HTTP handler timed out path={context.request.path}")
+            context.response.reset(503)
+        except http.HTTPBodyError as e:
+            self._logger.warn(
+                f"Invalid HTTP request body path={context.request.path} error={e}"
             )
-        finally:
-            self._http_server_requests.pop(
-                context.connection_id,
-                None,
+            context.response.reset(400)
+        except Exception as e:
+            self._logger.error(
+                f"HTTP handler failed path={context.request.path} error={e}"
             )
+            context.response.reset(500)
+        finally:
+            self._http_server_handlers -= 1
+
+        # Whatever the handler left of the body has to be skipped to get to
+        # the next request, which is only possible once all of it is buffered
+        context.response.keep_alive = keep_alive and context.body.skip()
+
+        sent = await context.response.send(
+            self._driver.send_tcp_server_connection_data,
+            context.connection_id,
+        )
+
+        _http_request_duration.observe(
+            utime.ticks_diff(utime.ticks_ms(), started),
+            _http_request_duration.series(context.response.status),
+        )
+
+        return sent and context.response.keep_alive
+
+    async def _dispatch_http_server_request(self, context: http.HTTPContext) -> None:
+        """
+        Run the handler for a request within http_server_request_timeout, not
+        counting the time it spends waiting for a streamed body to be
+        received, which the body reader limits per read instead: an upload
+        may take as long as it needs to, as long as it keeps coming.
+
+        The handler runs in a task of its own, which is cancelled along with
+        the task awaiting it, so that it never outlives its request.
+
+        Raises:
+            uasyncio.TimeoutError: If the handler ran out of time.
+        """
+        handled = self._http_server_connections[context.connection_id].handled
+        handled.clear()
+        errors = []
+
+        async def handle() -> None:
+            try:
+                await self._http_server_router.dispatch(context)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                handled.set()
+
+        task = uasyncio.create_task(handle())
+        started = utime.ticks_ms()
+
+        try:
+            while not handled.is_set():
+                deadline = utime.ticks_add(
+                    started,
+                    self._http_server_request_timeout_ms + context.body.waited_ms,
+                )
+                remaining = utime.ticks_diff(deadline, utime.ticks_ms())
+                if remaining <= 0:
+                    raise uasyncio.TimeoutError()
+
+                try:
+                    await uasyncio.wait_for_ms(handled.wait(), remaining)
+                except uasyncio.TimeoutError:
+                    # the body may have held it up, which moves the deadline
+                    pass
+        except BaseException:
+            # timed out, or the connection closed: the handler would otherwise
+            # go on with a context that is about to be reused
+            task.cancel()
+            await handled.wait()
+            raise
+
+        if errors:
+            raise errors[0]
+
+    async def _close_http_server_connection(self, connection_id: int) -> bool:
+        """
+        Close a connection of the HTTP server, without the closed connection
+        being reported cancelling whichever task is waiting for it to close.
+
+        Returns:
+            bool: True if the connection was closed.
+        """
+        connection = self._http_server_connections[connection_id]
+        connection.closing = True
+        try:
+            return await self._driver.close_tcp_server_connection(connection_id)
+        finally:
+            connection.closing = False
+
+    def _should_stream_http_server_request_body(
+        self,
+        request: http.HTTPRequest,
+        buffer: esp01s.TCPServerConnectionBuffer,
+    ) -> bool:
+        """
+        Whether to hand a request whose head has been received over to its
+        handler before its body has been: when the body is chunked, cannot fit
+        in the connection buffer, or is only sent once the client is told to.
+        """
+        if not request.head_length:
+            return False
+
+        return (
+            request.chunked
+            or request.head_length + request.content_length > buffer.capacity
+            or request.expects_continue
+        )
+
+    async def _watch_http_server_connections(self) -> None:
+        """
+        Close connections whose request has not been received in full within
+        http_server_header_timeout of its first bytes, so that clients
+        trickling in a request (slow loris) cannot hold on to connection slots.
+        """
+        while True:
+            await uasyncio.sleep_ms(_HTTP_SERVER_WATCHDOG_INTERVAL_MS)
+
+            now = utime.ticks_ms()
+            for connection_id, connection in enumerate(self._http_server_connections):
+                if not (connection.open and connection.receiving):
+                    continue
+
+                if (
+                    utime.ticks_diff(now, connection.receiving_since)
+                    < self._http_server_header_timeout_ms
+                ):
+                    continue
+
+                self._logger.warn(f"Request timed out connection_id={connection_id}")
+
+                connection.receiving = False
+                await self._driver.send_tcp_server_connection_data(
+                    connection_id,
+                    http.RESPONSE_REQUEST_TIMEOUT,
+                )
+                await self._close_http_server_connection(connection_id)
+
+    def _count_open_http_server_connections(self) -> int:
+        count = 0
+        for connection in self._http_server_connections:
+            if connection.open:
+                count += 1
+
+        return count
+
+    def _find_idle_http_server_connection(self, exclude_id: int) -> int | None:
+        idle_id = None
+        idle_since = 0
+
+        for connection_id, connection in enumerate(self._http_server_connections):
+            if (
+                connection_id == exclude_id
+                or not connection.open
+                or connection.task is not None
+            ):
+                continue
+
+            if idle_id is None or utime.ticks_diff(idle_since, connection.last_active) > 0:
+                idle_id = connection_id
+                idle_since = connection.last_active
+
+        return idle_id
 
     async def run(self) -> None:
         while True:
-            # Poll the ESP01S for new data
+            # Wait for the ESP01S to send us data
             await self._driver.receive()
 
     async def shutdown(self) -> None:
+        if self._http_server_watchdog is not None:
+            self._http_server_watchdog.cancel()
+            self._http_server_watchdog = None
+
         await self._driver.stop_tcp_server()
         await self._driver.disconnect_wifi_access_point()
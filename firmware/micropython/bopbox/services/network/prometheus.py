@@ -0,0 +1,90 @@
+from micropython import const
+
+from ...services import metrics
+
+from . import http
+
+
+_HEADER_CACHE_CONTROL_NO_STORE = const(b"Cache-Control: no-store\r\n")
+
+
+async def handle(context: http.HTTPContext) -> None:
+    """
+    Serve every registered metric in the Prometheus text exposition format.
+
+    The response is streamed as the metrics are encoded, in chunks that each
+    fill the response buffer, so the whole exposition is never held in memory
+    and yet goes out in as few AT+CIPSENDs as possible.
+
+    Example:
+        network.add_http_server_route(b"GET", b"/metrics", prometheus.handle)
+    """
+    response = context.response
+    response.add_header(_HEADER_CACHE_CONTROL_NO_STORE)
+    response.set_stream(_Exposition(metrics.get_metrics()), http.CONTENT_TYPE_PROMETHEUS)
+
+
+class _Exposition:
+    __slots__ = (
+        "_metrics",
+        "_index",
+        "_lines",
+        "_pending",
+        "_buffer",
+    )
+
+    _metrics: list
+    _index: int
+    _lines: object | None  # what is left of the metric being encoded
+    _pending: memoryview | None  # lines that did not fit in the last chunk
+    _buffer: bytearray
+
+    def __init__(self, metrics: list) -> None:
+        self._metrics = metrics
+        self._index = 0
+        self._lines = None
+        self._pending = None
+        self._buffer = bytearray(http.MAX_CHUNK_LEN)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> memoryview:
+        buffer = self._buffer
+        length = 0
+
+        # chunks need not end with a line, so every one but the last is full
+        while length < len(buffer):
+            lines = self._pending
+            if lines is None:
+                lines = self._next_lines()
+                if lines is None:
+                    break
+
+                lines = memoryview(lines)
+
+            count = min(len(lines), len(buffer) - length)
+            buffer[length : length + count] = lines[:count]
+            length += count
+
+            self._pending = lines[count:] if count < len(lines) else None
+
+        if not length:
+            raise StopAsyncIteration
+
+        # only read until the next chunk is asked for
+        return memoryview(buffer)[:length]
+
+    def _next_lines(self) -> bytes | None:
+        while True:
+            if self._lines is not None:
+                for lines in self._lines:
+                    return lines
+
+                self._lines = None
+
+            if self._index >= len(self._metrics):
+                return None
+
+            self._lines = self._metrics[self._index].expose()
+            self._index += 1
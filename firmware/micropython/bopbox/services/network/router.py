@@ -0,0 +1,201 @@
+from typing import Awaitable, Callable
+
+from . import http
+
+
+_SEPARATOR = b"/"
+_WILDCARD = b"*"
+_PARAM_START = b"<"
+_PARAM_END = b">"
+
+Handler = Callable[[http.HTTPContext], Awaitable[None]]
+
+
+class _RouteNode:
+    """One path segment of the prefix trie."""
+
+    __slots__ = (
+        "children",
+        "param_name",
+        "param_node",
+        "handlers",
+        "prefix_handlers",
+    )
+
+    children: dict[bytes, "_RouteNode"]
+    param_name: bytes | None
+    param_node: "_RouteNode | None"
+    handlers: dict[bytes, Handler]
+    prefix_handlers: dict[bytes, Handler]
+
+    def __init__(self) -> None:
+        self.children = {}
+        self.param_name = None
+        self.param_node = None
+        self.handlers = {}
+        self.prefix_handlers = {}
+
+
+class HTTPRouter:
+    """
+    Maps (method, path) to a request handler.
+
+    Paths can be exact (b"/status"), contain parameter segments
+    (b"/clips/<name>", available as context.params[b"name"]) or end in a
+    wildcard matching any remainder (b"/static/*", available as
+    context.params[b"*"]).
+
+    Routes are compiled once into a dict of exact paths, answered with a
+    single lookup, plus a small trie of path segments for parameter and
+    wildcard routes, so a request never scans the whole route table. When
+    walking the trie, a literal segment takes precedence over a parameter,
+    and the longest matching wildcard is used if nothing else matches.
+
+    Example:
+        router = HTTPRouter()
+        router.add_route(b"GET", b"/status", get_status)
+        router.add_route(b"PUT", b"/clips/<name>", put_clip)
+        router.compile()
+
+        await router.dispatch(context)
+    """
+
+    __slots__ = (
+        "_routes",
+        "_exact",
+        "_root",
+    )
+
+    _routes: list[tuple[bytes, bytes, Handler]]
+    _exact: dict[bytes, dict[bytes, Handler]]
+    _root: _RouteNode
+
+    def __init__(self) -> None:
+        self._routes = []
+        self._exact = {}
+        self._root = _RouteNode()
+
+    def add_route(
+        self,
+        method: bytes,
+        path: bytes,
+        handler: Handler,
+    ) -> None:
+        """
+        Register a handler, takes effect on the next compile().
+
+        Args:
+            method: The request method, e.g. b"GET".
+            path: The path pattern, e.g. b"/status", b"/clips/<name>" or b"/static/*".
+            handler: An async callable taking the HTTPContext.
+        """
+        self._routes.append((method, path, handler))
+
+    def compile(self) -> None:
+        """Build the lookup structures from the registered routes."""
+        self._exact = {}
+        self._root = _RouteNode()
+
+        for method, path, handler in self._routes:
+            if _WILDCARD not in path and _PARAM_START not in path:
+                self._exact.setdefault(path, {})[method] = handler
+                continue
+
+            node = self._root
+            for segment in path.strip(_SEPARATOR).split(_SEPARATOR):
+                if segment == _WILDCARD:
+                    break
+
+                if segment.startswith(_PARAM_START) and segment.endswith(_PARAM_END):
+                    if node.param_node is None:
+                        node.param_node = _RouteNode()
+                        node.param_name = segment[1:-1]
+                    node = node.param_node
+                else:
+                    node = node.children.setdefault(segment, _RouteNode())
+
+            if path.endswith(_WILDCARD):
+                node.prefix_handlers[method] = handler
+            else:
+                node.handlers[method] = handler
+
+    async def dispatch(self, context: http.HTTPContext) -> None:
+        """
+        Run the handler matching the request, or set the response status to
+        404 (no route for the path) or 405 (no route for the method).
+        """
+        request = context.request
+
+        methods = self._exact.get(request.path)
+        if methods is None:
+            methods = self._match(request.path, context)
+
+        if methods is None:
+            context.response.status = 404
+            return
+
+        handler = methods.get(request.method)
+        if handler is None:
+            context.response.status = 405
+            return
+
+        await handler(context)
+
+    def _match(
+        self,
+        path: bytes,
+        context: http.HTTPContext,
+    ) -> dict[bytes, Handler] | None:
+        """
+        Walk the trie one path segment at a time.
+
+        Returns:
+            dict | None: The handlers by method of the matched node, or None.
+        """
+        node = self._root
+        params = None
+        prefix = None
+        prefix_start = 0
+
+        start = 1 if path.startswith(_SEPARATOR) else 0
+        end = len(path)
+
+        while True:
+            if node.prefix_handlers:
+                prefix = node
+                prefix_start = start
+
+            if start >= end:
+                break
+
+            separator = path.find(_SEPARATOR, start)
+            if separator < 0:
+                separator = end
+
+            segment = path[start:separator]
+            child = node.children.get(segment)
+            if child is None and node.param_node is not None and segment:
+                child = node.param_node
+                if params is None:
+                    params = {}
+                params[node.param_name] = segment
+
+            if child is None:
+                node = None
+                break
+
+            node = child
+            start = separator + 1
+
+        if node is not None and node.handlers:
+            context.params = params
+            return node.handlers
+
+        if prefix is not None:
+            if params is None:
+                params = {}
+            params[_WILDCARD] = path[prefix_start:]
+            context.params = params
+            return prefix.prefix_handlers
+
+        return None
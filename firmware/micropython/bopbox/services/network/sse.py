@@ -0,0 +1,189 @@
+import uasyncio
+
+from micropython import const
+
+from . import http
+
+
+# The ESP-01S supports up to 5 simultaneous connections (IDs 0-4)
+_MAX_CONNECTIONS = const(5)
+
+# Events a subscriber can fall behind by before the oldest are dropped
+_DEFAULT_QUEUE_LEN = const(8)
+
+# Sent when there has been no event for this long, well within the default
+# http_server_idle_timeout so that the ESP never closes a quiet stream
+_DEFAULT_PING_INTERVAL_MS = const(10000)
+
+_MESSAGE_PING = const(b": ping\n\n")
+# First message of every stream, so the response head goes out right away
+_MESSAGE_RETRY = const(b"retry: 3000\n\n")
+
+_HEADER_CACHE_CONTROL_NO_CACHE = const(b"Cache-Control: no-cache\r\n")
+
+
+class EventStream:
+    """
+    Server-Sent Events endpoint broadcasting events to every subscriber.
+
+    A GET request on the route keeps its connection open and receives every
+    event published from then on, as a text/event-stream response.
+
+    publish() never blocks and never waits on a subscriber: the event is
+    encoded once and queued for every subscriber, each with a queue of a
+    fixed length that drops its oldest event when a subscriber falls behind.
+    A stuck client therefore costs neither memory nor time to the publisher.
+
+    Subscribers are preallocated per connection slot, a connection only ever
+    sending one response at a time.
+
+    Example:
+        events = EventStream()
+        network.add_http_server_route(b"GET", b"/events", events.handle)
+
+        events.publish(b"card-detected", b'{"uid":"04a1b2c3"}')
+    """
+
+    __slots__ = (
+        "_subscribers",
+        "_next_id",
+    )
+
+    _subscribers: tuple[_Subscriber, ...]
+    _next_id: int
+
+    def __init__(
+        self,
+        queue_len: int = _DEFAULT_QUEUE_LEN,
+        ping_interval_ms: int = _DEFAULT_PING_INTERVAL_MS,
+    ) -> None:
+        self._subscribers = tuple(
+            _Subscriber(queue_len, ping_interval_ms) for _ in range(_MAX_CONNECTIONS)
+        )
+        self._next_id = 1
+
+    @property
+    def subscriber_count(self) -> int:
+        count = 0
+        for subscriber in self._subscribers:
+            if subscriber.active:
+                count += 1
+
+        return count
+
+    def publish(self, event: bytes, data: bytes) -> None:
+        """
+        Queue an event for every subscriber.
+
+        Args:
+            event: The event type, e.g. b"card-detected".
+            data: The event data, on a single line.
+        """
+        message = None
+
+        for subscriber in self._subscribers:
+            if not subscriber.active:
+                continue
+
+            if message is None:
+                message = (
+                    b"id: "
+                    + str(self._next_id).encode()
+                    + b"\nevent: "
+                    + event
+                    + b"\ndata: "
+                    + data
+                    + b"\n\n"
+                )
+
+            subscriber.put(message)
+
+        self._next_id += 1
+
+    async def handle(self, context: http.HTTPContext) -> None:
+        subscriber = self._subscribers[context.connection_id]
+        subscriber.open()
+
+        response = context.response
+        response.add_header(_HEADER_CACHE_CONTROL_NO_CACHE)
+        response.set_stream(subscriber, http.CONTENT_TYPE_EVENT_STREAM)
+
+
+class _Subscriber:
+    """
+    Bounded queue of the encoded events waiting to be sent to one client,
+    iterated by the response until the connection closes.
+    """
+
+    __slots__ = (
+        "active",
+        "dropped",
+        "_queue",
+        "_head",
+        "_count",
+        "_ready",
+        "_ping_interval_ms",
+    )
+
+    active: bool
+    dropped: int
+
+    _queue: list[bytes | None]
+    _head: int
+    _count: int
+    _ready: uasyncio.Event
+    _ping_interval_ms: int
+
+    def __init__(self, queue_len: int, ping_interval_ms: int) -> None:
+        self._queue = [None] * queue_len
+        self._ready = uasyncio.Event()
+        self._ping_interval_ms = ping_interval_ms
+        self.active = False
+        self.close()
+
+    def open(self) -> None:
+        self.close()
+        self.active = True
+        self.put(_MESSAGE_RETRY)
+
+    def close(self) -> None:
+        """Called by the response once the stream ends, however it ends."""
+        self.active = False
+        self.dropped = 0
+        self._head = 0
+        self._count = 0
+        for i in range(len(self._queue)):
+            self._queue[i] = None
+        self._ready.clear()
+
+    def put(self, message: bytes) -> None:
+        queue = self._queue
+        length = len(queue)
+
+        if self._count == length:
+            # full, drop the oldest event to make room
+            self._head = (self._head + 1) % length
+            self._count -= 1
+            self.dropped += 1
+
+        queue[(self._head + self._count) % length] = message
+        self._count += 1
+        self._ready.set()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> bytes:
+        if not self._count:
+            self._ready.clear()
+            try:
+                await uasyncio.wait_for_ms(self._ready.wait(), self._ping_interval_ms)
+            except uasyncio.TimeoutError:
+                return _MESSAGE_PING
+
+        message = self._queue[self._head]
+        self._queue[self._head] = None
+        self._head = (self._head + 1) % len(self._queue)
+        self._count -= 1
+
+        return message
@@ -0,0 +1,314 @@
+import uos
+
+from micropython import const
+
+
+ACTION_CLIP = const(1)
+ACTION_PLAYLIST = const(2)
+ACTION_VOLUME = const(3)
+
+ACTION_NAMES = {
+    ACTION_CLIP: b"clip",
+    ACTION_PLAYLIST: b"playlist",
+    ACTION_VOLUME: b"volume",
+}
+
+# Record layout, fixed width so that the nth record is at n * _RECORD_LEN:
+#   0      UID length
+#   1-10   UID, zero padded
+#   11     action, _ACTION_REMOVED for a removed card
+#   12     argument length
+#   13-31  argument, zero padded
+_RECORD_LEN = const(32)
+_KEY_LEN = const(11)  # the UID length and UID, what records are sorted by
+MAX_UID_LEN = const(10)
+_OFFSET_ACTION = const(11)
+_OFFSET_ARGUMENT_LEN = const(12)
+_OFFSET_ARGUMENT = const(13)
+MAX_ARGUMENT_LEN = const(_RECORD_LEN - _OFFSET_ARGUMENT)
+
+_ACTION_REMOVED = const(0)
+
+_DEFAULT_COMPACT_THRESHOLD = const(64)
+
+# <path>.idx holds the records sorted by key, <path>.log the records added
+# since, in the order they were added
+_INDEX_FILE_SUFFIX = ".idx"
+_LOG_FILE_SUFFIX = ".log"
+_TEMP_FILE_SUFFIX = ".tmp"
+
+
+class CardAction:
+    __slots__ = (
+        "action",
+        "argument",
+    )
+
+    action: int
+    argument: bytes
+
+    def __init__(self, action: int, argument: bytes) -> None:
+        self.action = action
+        self.argument = argument
+
+    @property
+    def name(self) -> bytes:
+        return ACTION_NAMES.get(self.action, b"unknown")
+
+
+class ActionIndex:
+    """
+    Index of the action of every provisioned card, kept on flash.
+
+    Cards are stored as fixed-width records sorted by UID, so a lookup is a
+    binary search reading one 32 byte record per step into a preallocated
+    buffer: O(log n) reads and constant RAM however many cards there are.
+
+    Changes are appended to a log, looked through (newest first) before the
+    sorted records, and merged into them once the log holds
+    compact_threshold records. Merging streams both files into a new sorted
+    file one record at a time, which replaces the old one once complete, so
+    the index is never left half written.
+
+    Example:
+        index = ActionIndex("/cards")
+        index.put(uid, ACTION_CLIP, b"intro.mp3")
+
+        action = index.lookup(uid)
+    """
+
+    __slots__ = (
+        "_index_path",
+        "_log_path",
+        "_temp_path",
+        "_index_count",
+        "_log_count",
+        "_compact_threshold",
+        "_record",
+        "_key",
+    )
+
+    _index_path: str
+    _log_path: str
+    _temp_path: str
+
+    _index_count: int
+    _log_count: int
+    _compact_threshold: int
+
+    _record: bytearray
+    _key: bytearray
+
+    def __init__(
+        self,
+        path: str,
+        compact_threshold: int = _DEFAULT_COMPACT_THRESHOLD,
+    ) -> None:
+        self._index_path = path + _INDEX_FILE_SUFFIX
+        self._log_path = path + _LOG_FILE_SUFFIX
+        self._temp_path = path + _TEMP_FILE_SUFFIX
+
+        self._index_count = _file_size(self._index_path) // _RECORD_LEN
+        self._log_count = _file_size(self._log_path) // _RECORD_LEN
+        self._compact_threshold = compact_threshold
+
+        self._record = bytearray(_RECORD_LEN)
+        self._key = bytearray(_KEY_LEN)
+
+    def __len__(self) -> int:
+        """The number of records, removed and replaced cards still in the log included."""
+        return self._index_count + self._log_count
+
+    def lookup(self, uid: bytes) -> CardAction | None:
+        """
+        Returns:
+            CardAction | None: The action of the card, None if it has none.
+        """
+        if not _set_key(self._key, uid):
+            return None
+
+        if self._find_in_log() or self._find_in_index():
+            record = self._record
+            if record[_OFFSET_ACTION] == _ACTION_REMOVED:
+                return None
+
+            argument_len = min(record[_OFFSET_ARGUMENT_LEN], MAX_ARGUMENT_LEN)
+            return CardAction(
+                record[_OFFSET_ACTION],
+                bytes(record[_OFFSET_ARGUMENT : _OFFSET_ARGUMENT + argument_len]),
+            )
+
+        return None
+
+    def put(self, uid: bytes, action: int, argument: bytes = b"") -> None:
+        """
+        Set the action of a card.
+
+        Args:
+            uid: The card's UID, at most 10 bytes.
+            action: One of ACTION_CLIP, ACTION_PLAYLIST or ACTION_VOLUME.
+            argument: What the action applies to, e.g. the clip's file
+                name, at most MAX_ARGUMENT_LEN bytes.
+
+        Raises:
+            ValueError: If the UID or argument is too long.
+        """
+        if action == _ACTION_REMOVED or action not in ACTION_NAMES:
+            raise ValueError(f"Unknown action: {action}")
+
+        self._append(uid, action, argument)
+
+    def remove(self, uid: bytes) -> None:
+        self._append(uid, _ACTION_REMOVED, b"")
+
+    def compact(self) -> None:
+        """Merge the log into the sorted records."""
+        if not self._log_count:
+            return
+
+        # the log is at most compact_threshold records, the newest for a key wins
+        changes = {}
+        with open(self._log_path, "rb") as f:
+            for _ in range(self._log_count):
+                record = f.read(_RECORD_LEN)
+                if len(record) < _RECORD_LEN:
+                    break
+
+                changes[record[:_KEY_LEN]] = record
+
+        keys = sorted(changes)
+        count = 0
+
+        with open(self._temp_path, "wb") as out:
+            change = 0
+
+            if self._index_count:
+                record = self._record
+                with open(self._index_path, "rb") as f:
+                    for _ in range(self._index_count):
+                        f.readinto(record)
+                        key = bytes(record[:_KEY_LEN])
+
+                        # changes to cards sorted before this one
+                        while change < len(keys) and keys[change] < key:
+                            count += _write_unless_removed(out, changes[keys[change]])
+                            change += 1
+
+                        if change < len(keys) and keys[change] == key:
+                            count += _write_unless_removed(out, changes[keys[change]])
+                            change += 1
+                        else:
+                            count += _write_unless_removed(out, record)
+
+            while change < len(keys):
+                count += _write_unless_removed(out, changes[keys[change]])
+                change += 1
+
+            out.flush()
+
+        uos.rename(self._temp_path, self._index_path)
+        uos.remove(self._log_path)
+
+        self._index_count = count
+        self._log_count = 0
+
+    def _append(self, uid: bytes, action: int, argument: bytes) -> None:
+        if len(argument) > MAX_ARGUMENT_LEN:
+            raise ValueError(f"Argument too long: {len(argument)}")
+
+        record = self._record
+        if not _set_key(record, uid):
+            raise ValueError(f"Unsupported UID length: {len(uid)}")
+
+        record[_OFFSET_ACTION] = action
+        record[_OFFSET_ARGUMENT_LEN] = len(argument)
+        for i in range(MAX_ARGUMENT_LEN):
+            record[_OFFSET_ARGUMENT + i] = argument[i] if i < len(argument) else 0
+
+        with open(self._log_path, "ab") as f:
+            f.write(record)
+            f.flush()
+
+        self._log_count += 1
+
+        if self._log_count >= self._compact_threshold:
+            self.compact()
+
+    def _find_in_log(self) -> bool:
+        if not self._log_count:
+            return False
+
+        record = self._record
+        key = self._key
+
+        with open(self._log_path, "rb") as f:
+            # newest first
+            for i in range(self._log_count - 1, -1, -1):
+                f.seek(i * _RECORD_LEN)
+                if f.readinto(record) == _RECORD_LEN and _compare_key(record, key) == 0:
+                    return True
+
+        return False
+
+    def _find_in_index(self) -> bool:
+        if not self._index_count:
+            return False
+
+        record = self._record
+        key = self._key
+
+        with open(self._index_path, "rb") as f:
+            low = 0
+            high = self._index_count - 1
+
+            while low <= high:
+                middle = (low + high) // 2
+                f.seek(middle * _RECORD_LEN)
+                f.readinto(record)
+
+                order = _compare_key(record, key)
+                if order == 0:
+                    return True
+                elif order < 0:
+                    low = middle + 1
+                else:
+                    high = middle - 1
+
+        return False
+
+
+def _set_key(into: bytearray, uid: bytes) -> bool:
+    """Write the key of uid at the start of into, False if uid is too long."""
+    if not uid or len(uid) > MAX_UID_LEN:
+        return False
+
+    into[0] = len(uid)
+    for i in range(MAX_UID_LEN):
+        into[1 + i] = uid[i] if i < len(uid) else 0
+
+    return True
+
+
+def _compare_key(record: bytearray, key: bytearray) -> int:
+    """Compare the key of a record to key without slicing either."""
+    for i in range(_KEY_LEN):
+        order = record[i] - key[i]
+        if order:
+            return order
+
+    return 0
+
+
+def _write_unless_removed(f, record: bytes | bytearray) -> int:
+    if record[_OFFSET_ACTION] == _ACTION_REMOVED:
+        return 0
+
+    f.write(record)
+    return 1
+
+
+def _file_size(path: str) -> int:
+    try:
+        return uos.stat(path)[6]
+    except OSError:
+        return 0
@@ -0,0 +1,483 @@
+from micropython import const
+
+from ...drivers.pn532 import pn532
+
+
+_DEFAULT_CACHE_BUDGET_BYTES = const(2048)
+# Rough cost of an entry on top of its payloads: the key, tuple and records
+_CACHE_ENTRY_OVERHEAD_BYTES = const(32)
+
+# ref: https://www.nxp.com/docs/en/data-sheet/NTAG213_215_216.pdf (§8.5)
+_NTAG_PAGE_LEN = const(4)
+_NTAG_CC_PAGE = const(3)
+_NTAG_CC_MAGIC = const(0xE1)
+_NTAG_MAX_FAST_READ_PAGES = const(60)
+# Pages read after the CC when how much is needed is not known yet
+_NTAG_DEFAULT_READ_PAGES = const(4)
+
+# ref: NFC Forum Type 2 Tag Technical Specification (§2.3)
+_TLV_NULL = const(0x00)
+_TLV_NDEF_MESSAGE = const(0x03)
+_TLV_TERMINATOR = const(0xFE)
+# a length of 0xFF is followed by the actual length on two bytes
+_TLV_LENGTH_3_BYTES = const(0xFF)
+
+_TLV_PARSER_STATE_TYPE = const(0)
+_TLV_PARSER_STATE_LENGTH = const(1)
+_TLV_PARSER_STATE_LENGTH_HIGH = const(2)
+_TLV_PARSER_STATE_LENGTH_LOW = const(3)
+_TLV_PARSER_STATE_VALUE = const(4)
+_TLV_PARSER_STATE_DONE = const(5)
+
+# ref: NFC Data Exchange Format (NDEF) Technical Specification (§3.2)
+_RECORD_FLAG_SHORT = const(0x10)
+_RECORD_FLAG_ID_LENGTH = const(0x08)
+_RECORD_TNF_MASK = const(0x07)
+
+TNF_WELL_KNOWN = const(0x01)
+TNF_MEDIA = const(0x02)
+TNF_ABSOLUTE_URI = const(0x03)
+TNF_EXTERNAL = const(0x04)
+
+_RTD_URI = const(b"U")
+_RTD_TEXT = const(b"T")
+
+# URI Record Type Definition (§3.2.2), indexed by the identifier code
+_URI_PREFIXES = (
+    b"",
+    b"http://www.",
+    b"https://www.",
+    b"http://",
+    b"https://",
+    b"tel:",
+    b"mailto:",
+    b"ftp://anonymous:anonymous@",
+    b"ftp://ftp.",
+    b"ftps://",
+    b"sftp://",
+    b"smb://",
+    b"nfs://",
+    b"ftp://",
+    b"dav://",
+    b"news:",
+    b"telnet://",
+    b"imap:",
+    b"rtsp://",
+    b"urn:",
+    b"pop:",
+    b"sip:",
+    b"sips:",
+    b"tftp:",
+    b"btspp://",
+    b"btl2cap://",
+    b"btgoep://",
+    b"tcpobex://",
+    b"irdaobex://",
+    b"file://",
+    b"urn:epc:id:",
+    b"urn:epc:tag:",
+    b"urn:epc:pat:",
+    b"urn:epc:raw:",
+    b"urn:epc:",
+    b"urn:nfc:",
+)
+
+
+class NDEFRecord:
+    __slots__ = (
+        "tnf",
+        "type",
+        "id",
+        "payload",
+    )
+
+    tnf: int
+    type: bytes
+    id: bytes
+    payload: bytes
+
+    def __init__(self, tnf: int, type: bytes, id: bytes, payload: bytes) -> None:
+        self.tnf = tnf
+        self.type = type
+        self.id = id
+        self.payload = payload
+
+    @property
+    def uri(self) -> bytes | None:
+        """The URI of a URI record, with its prefix expanded."""
+        if self.tnf == TNF_ABSOLUTE_URI:
+            return self.type
+
+        if self.tnf != TNF_WELL_KNOWN or self.type != _RTD_URI or not self.payload:
+            return None
+
+        code = self.payload[0]
+        prefix = _URI_PREFIXES[code] if code < len(_URI_PREFIXES) else b""
+
+        return prefix + self.payload[1:]
+
+    @property
+    def text(self) -> bytes | None:
+        """The text of a Text record, without its language code."""
+        if self.tnf != TNF_WELL_KNOWN or self.type != _RTD_TEXT or not self.payload:
+            return None
+
+        return self.payload[1 + (self.payload[0] & 0x3F) :]
+
+
+class NDEFError(Exception):
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
+
+
+def parse_records(message: bytes | bytearray | memoryview) -> tuple[NDEFRecord, ...]:
+    """
+    Parse the records of an NDEF message.
+
+    Raises:
+        NDEFError: If a record runs past the end of the message.
+    """
+    records = []
+    end = len(message)
+    pos = 0
+
+    while pos < end:
+        header = message[pos]
+        pos += 1
+
+        if pos >= end:
+            raise NDEFError("Truncated record header")
+
+        type_len = message[pos]
+        pos += 1
+
+        if header & _RECORD_FLAG_SHORT:
+            if pos >= end:
+                raise NDEFError("Truncated record header")
+
+            payload_len = message[pos]
+            pos += 1
+        else:
+            if pos + 4 > end:
+                raise NDEFError("Truncated record header")
+
+            payload_len = (
+                (message[pos] << 24)
+                | (message[pos + 1] << 16)
+                | (message[pos + 2] << 8)
+                | message[pos + 3]
+            )
+            pos += 4
+
+        id_len = 0
+        if header & _RECORD_FLAG_ID_LENGTH:
+            if pos >= end:
+                raise NDEFError("Truncated record header")
+
+            id_len = message[pos]
+            pos += 1
+
+        if pos + type_len + id_len + payload_len > end:
+            raise NDEFError("Truncated record")
+
+        type = bytes(message[pos : pos + type_len])
+        pos += type_len
+        id = bytes(message[pos : pos + id_len])
+        pos += id_len
+        payload = bytes(message[pos : pos + payload_len])
+        pos += payload_len
+
+        records.append(NDEFRecord(header & _RECORD_TNF_MASK, type, id, payload))
+
+    return tuple(records)
+
+
+class NDEFTLVParser:
+    """
+    Incremental parser for the TLV blocks of a Type 2 tag's data area,
+    collecting the value of the first NDEF Message TLV.
+
+    Bytes can be fed as they are read, in pieces of any size. Once the
+    length of the NDEF message is known, remaining tells exactly how many
+    more bytes have to be read, so the whole message can be fetched with as
+    few reads as possible and nothing past its end.
+    """
+
+    __slots__ = (
+        "_state",
+        "_type",
+        "_length",
+        "_pos",
+        "_message",
+    )
+
+    _state: int
+    _type: int
+    _length: int
+    _pos: int
+    _message: bytearray | None
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self._state = _TLV_PARSER_STATE_TYPE
+        self._type = 0
+        self._length = 0
+        self._pos = 0
+        self._message = None
+
+    @property
+    def done(self) -> bool:
+        return self._state == _TLV_PARSER_STATE_DONE
+
+    @property
+    def message(self) -> bytearray | None:
+        """The NDEF message once done, None if the tag does not have one."""
+        return self._message if self.done else None
+
+    @property
+    def remaining(self) -> int:
+        """
+        Returns:
+            int: The number of bytes left to complete the NDEF message, or -1
+                if that is not known yet.
+        """
+        if self._state == _TLV_PARSER_STATE_DONE:
+            return 0
+
+        if self._state == _TLV_PARSER_STATE_VALUE and self._type == _TLV_NDEF_MESSAGE:
+            return self._length - self._pos
+
+        return -1
+
+    def feed(self, data: bytes | bytearray | memoryview, start: int, end: int) -> None:
+        i = start
+        while i < end and self._state != _TLV_PARSER_STATE_DONE:
+            state = self._state
+            byte = data[i]
+
+            if state == _TLV_PARSER_STATE_TYPE:
+                if byte == _TLV_TERMINATOR:
+                    self._state = _TLV_PARSER_STATE_DONE
+                elif byte != _TLV_NULL:
+                    self._type = byte
+                    self._state = _TLV_PARSER_STATE_LENGTH
+
+            elif state == _TLV_PARSER_STATE_LENGTH:
+                if byte == _TLV_LENGTH_3_BYTES:
+                    self._state = _TLV_PARSER_STATE_LENGTH_HIGH
+                else:
+                    self._start_value(byte)
+
+            elif state == _TLV_PARSER_STATE_LENGTH_HIGH:
+                self._length = byte << 8
+                self._state = _TLV_PARSER_STATE_LENGTH_LOW
+
+            elif state == _TLV_PARSER_STATE_LENGTH_LOW:
+                self._start_value(self._length | byte)
+
+            else:
+                # value, copied in one go if it is the NDEF message and skipped otherwise
+                count = min(end - i, self._length - self._pos)
+                if self._message is not None:
+                    self._message[self._pos : self._pos + count] = data[i : i + count]
+
+                self._pos += count
+                i += count
+
+                if self._pos >= self._length:
+                    self._end_value()
+
+                continue
+
+            i += 1
+
+    def _start_value(self, length: int) -> None:
+        self._length = length
+        self._pos = 0
+
+        if self._type == _TLV_NDEF_MESSAGE:
+            self._message = bytearray(length)
+
+        if length:
+            self._state = _TLV_PARSER_STATE_VALUE
+        else:
+            self._end_value()
+
+    def _end_value(self) -> None:
+        # only the first NDEF message is of interest
+        if self._type == _TLV_NDEF_MESSAGE:
+            self._state = _TLV_PARSER_STATE_DONE
+        else:
+            self._state = _TLV_PARSER_STATE_TYPE
+
+
+class NTAGReader:
+    """
+    Reads the NDEF message of the NTAG21x in the field.
+
+    The capability container and the start of the data area are read with
+    one FAST_READ, after which the NDEF Message TLV says how long the message
+    is and the rest of it is read with as few FAST_READs as possible, up to
+    60 pages each. Small messages therefore take two commands, where READ
+    would take one per 4 pages.
+
+    Example:
+        reader = NTAGReader(driver)
+        records = ndef.parse_records(await reader.read())
+    """
+
+    __slots__ = (
+        "_driver",
+        "_buffer",
+        "_parser",
+    )
+
+    _driver: pn532.PN532
+    _buffer: bytearray
+    _parser: NDEFTLVParser
+
+    def __init__(self, driver: pn532.PN532) -> None:
+        self._driver = driver
+        self._buffer = bytearray(_NTAG_MAX_FAST_READ_PAGES * _NTAG_PAGE_LEN)
+        self._parser = NDEFTLVParser()
+
+    async def read(self, target: int = 1) -> bytearray | None:
+        """
+        Args:
+            target: The number of the target to read, see pn532.PassiveTarget.number.
+
+        Returns:
+            bytearray | None: The NDEF message, None if the tag is not
+                formatted for NDEF or does not have a message.
+
+        Raises:
+            PN532Error: If the tag could not be read, e.g. it is not an NTAG21x.
+            NDEFError: If the data area ends before the NDEF message does.
+        """
+        buffer = self._buffer
+        parser = self._parser
+        parser.reset()
+
+        # CC: magic number, version, data area size / 8, access conditions
+        page = _NTAG_CC_PAGE
+        count = await self._driver.ntag_fast_read(
+            page,
+            page + _NTAG_DEFAULT_READ_PAGES,
+            buffer,
+            target,
+        )
+        if count < _NTAG_PAGE_LEN or buffer[0] != _NTAG_CC_MAGIC:
+            return None
+
+        last_page = _NTAG_CC_PAGE + buffer[2] * 8 // _NTAG_PAGE_LEN
+        parser.feed(buffer, _NTAG_PAGE_LEN, count)
+        page += count // _NTAG_PAGE_LEN
+
+        while not parser.done:
+            remaining = parser.remaining
+            pages = (
+                (remaining + _NTAG_PAGE_LEN - 1) // _NTAG_PAGE_LEN
+                if remaining > 0
+                else _NTAG_DEFAULT_READ_PAGES
+            )
+            pages = min(pages, _NTAG_MAX_FAST_READ_PAGES, last_page - page + 1)
+            if pages <= 0:
+                raise NDEFError("NDEF message runs past the data area")
+
+            count = await self._driver.ntag_fast_read(page, page + pages - 1, buffer, target)
+            parser.feed(buffer, 0, count)
+            page += pages
+
+        return parser.message
+
+
+class NDEFCache:
+    """
+    LRU cache of the NDEF records read from cards, keyed by UID, holding at
+    most budget bytes of payloads.
+
+    Cards are not expected to be rewritten while in use, so a cached card
+    is never read again until it has been evicted or invalidated.
+    """
+
+    __slots__ = (
+        "_budget",
+        "_size",
+        "_entries",
+        "_order",
+        "_hits",
+        "_misses",
+    )
+
+    _budget: int
+    _size: int
+    _entries: dict[bytes, tuple[tuple[NDEFRecord, ...], int]]  # records and their size
+    _order: list[bytes]  # least recently used first
+
+    _hits: int
+    _misses: int
+
+    def __init__(self, budget: int = _DEFAULT_CACHE_BUDGET_BYTES) -> None:
+        self._budget = budget
+        self._size = 0
+        self._entries = {}
+        self._order = []
+
+        self._hits = 0
+        self._misses = 0
+
+    def get_stats(self) -> dict:
+        """
+        Returns:
+            dict: Counters of the cache:
+                - hits: cards whose records were found in the cache
+                - misses: cards that had to be read
+                - entries: cards currently cached
+                - size: bytes currently cached
+        """
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "entries": len(self._entries),
+            "size": self._size,
+        }
+
+    def get(self, uid: bytes) -> tuple[NDEFRecord, ...] | None:
+        entry = self._entries.get(uid)
+        if entry is None:
+            self._misses += 1
+            return None
+
+        self._hits += 1
+
+        order = self._order
+        if order[-1] != uid:
+            order.remove(uid)
+            order.append(uid)
+
+        return entry[0]
+
+    def put(self, uid: bytes, records: tuple[NDEFRecord, ...]) -> None:
+        self.invalidate(uid)
+
+        size = _CACHE_ENTRY_OVERHEAD_BYTES
+        for record in records:
+            size += len(record.type) + len(record.id) + len(record.payload)
+
+        if size > self._budget:
+            return
+
+        while self._size + size > self._budget:
+            self.invalidate(self._order[0])
+
+        self._entries[uid] = (records, size)
+        self._order.append(uid)
+        self._size += size
+
+    def invalidate(self, uid: bytes) -> None:
+        entry = self._entries.pop(uid, None)
+        if entry is not None:
+            self._order.remove(uid)
+            self._size -= entry[1]
@@ -1,68 +1,158 @@
 import uasyncio
 
-from micropython import const
+from typing import Callable
 
+from ...config import config
 from ...services import logger
-from ...drivers.pn532 import pn532
+from ...drivers.pn532 import pn532, spi
+
+from . import ndef, presence, reader
+
+
+_DEFAULT_BAUD_RATES = (pn532.BAUD_RATE_106A,)
 
 
 class NFC:
+    """
+    The PN532 readers of the box, each on its own UART or SPI bus.
+
+    Readers are configured by nfc_readers in the order of their index, each
+    either {"uart_id", "tx_pin", "rx_pin"} for HSU or {"spi_id", "sck_pin",
+    "mosi_pin", "miso_pin", "cs_pin"} for SPI; without it there is a single
+    reader on the PN532 driver's default UART. Card events carry the index of
+    the reader they happened at, and the NDEF cache is shared, so a card
+    moved between readers is not read again.
+    """
+
     __slots__ = (
         "_logger",
-        "_driver",
-        "_current_card_uid",
+        "_readers",
+        "_last_reader",
+        "_ndef_cache",
+        "_on_card_event",
     )
 
     _logger: logger.Logger
-    _driver: pn532.PN532
 
-    _receive_data_task: uasyncio.Task
-    _detect_card_task: uasyncio.Task
+    _readers: list[reader.Reader]
+    _last_reader: int  # the index of the reader a card last arrived at
 
-    _current_card_uid: bytes | None
+    _ndef_cache: ndef.NDEFCache
 
-    def __init__(self) -> None:
-        self._logger = logger.get_logger("nfc")
-        self._driver = pn532.PN532()
-        self._current_card_uid = None
-
-    async def _receive_data(self) -> None:
-        while True:
-            await self._driver.receive()
-            await uasyncio.sleep_ms(100)
-
-    async def _detect_card(self) -> None:
-        while True:
-            uid = await self._driver.get_passive_target()
-            if uid is None and self._current_card_uid is not None:
-                self._current_card_uid = None
-            elif uid and self._current_card_uid != uid:
-                self._current_card_uid = uid
-                self._logger.debug(f"detected card uid={[hex(i) for i in uid]}")
+    _on_card_event: Callable[[presence.CardEvent], None] | None
 
-            await uasyncio.sleep_ms(100)
+    def __init__(
+        self,
+        on_card_event: Callable[[presence.CardEvent], None] | None = None,
+    ) -> None:
+        self._logger = logger.get_logger("nfc")
+        self._ndef_cache = ndef.NDEFCache()
+        self._on_card_event = on_card_event
+
+        baud_rates = self._parse_baud_rates(config.nfc_baud_rates) or _DEFAULT_BAUD_RATES
+
+        self._readers = []
+        self._last_reader = 0
+        for options in config.nfc_readers or ({},):
+            self._readers.append(
+                reader.Reader(
+                    len(self._readers),
+                    self._build_driver(options),
+                    baud_rates,
+                    self._ndef_cache,
+                    on_card_event=self._handle_card_event,
+                )
+            )
+
+    @property
+    def readers(self) -> tuple[reader.Reader, ...]:
+        return tuple(self._readers)
+
+    @property
+    def current_card_uid(self) -> bytes | None:
+        """The UID of the card that arrived last and has not been removed since, at any reader."""
+        current = self._current_reader()
+        return current.current_card_uid if current else None
+
+    @property
+    def current_card_records(self) -> tuple[ndef.NDEFRecord, ...]:
+        """The NDEF records of the current card, empty if it has none or could not be read."""
+        current = self._current_reader()
+        return current.current_card_records if current else ()
+
+    def get_ndef_cache_stats(self) -> dict:
+        return self._ndef_cache.get_stats()
+
+    def _current_reader(self) -> reader.Reader | None:
+        # the reader a card last arrived at, unless it has been removed since
+        current = self._readers[self._last_reader]
+        if current.current_card_uid is not None:
+            return current
+
+        for current in self._readers:
+            if current.current_card_uid is not None:
+                return current
+
+        return None
+
+    def _build_driver(self, options: dict) -> pn532.PN532:
+        if "spi_id" in options:
+            return pn532.PN532(transport=spi.SPITransport(**options))
+
+        return pn532.PN532(**options)
+
+    def _parse_baud_rates(self, names: list[str] | None) -> tuple[int, ...]:
+        baud_rates = []
+
+        for name in names or ():
+            for baud_rate, baud_rate_name in pn532.BAUD_RATE_NAMES.items():
+                if baud_rate_name == name.encode():
+                    baud_rates.append(baud_rate)
+                    break
+            else:
+                self._logger.warn(f"ignoring unknown baud_rate={name}")
+
+        return tuple(baud_rates)
+
+    def _handle_card_event(self, event: presence.CardEvent) -> None:
+        if event.type == presence.EVENT_ARRIVED:
+            self._last_reader = event.reader
+
+        if self._on_card_event:
+            self._on_card_event(event)
 
     async def run(self) -> None:
-        self._logger.debug("running")
+        self._logger.debug(f"running readers={len(self._readers)}")
 
-        self._receive_data_task = uasyncio.create_task(self._receive_data())
-        self._detect_card_task = uasyncio.create_task(self._detect_card())
+        # a reader whose loops fail does not take the others down with it
+        results = await uasyncio.gather(
+            *[current.run() for current in self._readers],
+            return_exceptions=True,
+        )
 
-        await uasyncio.gather(self._receive_data_task, self._detect_card_task)
+        for index, result in enumerate(results):
+            if isinstance(result, Exception):
+                self._logger.error(f"reader={index} stopped error={result}")
 
     async def startup(self) -> None:
+        """Start every reader up at once, a reader that fails to does not hold up the others."""
         self._logger.info("starting up")
 
-        await self._driver.wake_up()
-        await self._driver.sam_config()
-        await self._driver.set_retries()
+        results = await uasyncio.gather(
+            *[current.startup() for current in self._readers],
+            return_exceptions=True,
+        )
+
+        for index, result in enumerate(results):
+            if isinstance(result, Exception):
+                self._logger.error(f"unable to start up reader={index} error={result}")
 
         self._logger.info("startup complete")
 
     async def shutdown(self) -> None:
         self._logger.debug("shutting down")
 
-        self._detect_card_task.cancel()
-        self._receive_data_task.cancel()
+        for current in self._readers:
+            await current.shutdown()
 
         self._logger.info("shutdown complete")
@@ -0,0 +1,175 @@
+import utime
+
+from micropython import const
+
+
+EVENT_NONE = const(0)
+EVENT_ARRIVED = const(1)
+EVENT_REMOVED = const(2)
+# seen again after missing polls, without having been reported removed
+EVENT_RESEEN = const(3)
+
+EVENT_NAMES = {
+    EVENT_ARRIVED: b"arrived",
+    EVENT_REMOVED: b"removed",
+    EVENT_RESEEN: b"reseen",
+}
+
+_DEFAULT_REMOVAL_MISSES = const(3)
+_DEFAULT_ARRIVAL_DWELL_MS = const(0)
+
+_STATE_ABSENT = const(0)
+# seen, but not for arrival_dwell_ms yet
+_STATE_ARRIVING = const(1)
+_STATE_PRESENT = const(2)
+
+
+class CardEvent:
+    __slots__ = (
+        "type",
+        "uid",
+        "timestamp_ms",
+        "reader",
+    )
+
+    type: int
+    uid: bytes
+    timestamp_ms: int  # utime.ticks_ms() of the poll that caused it
+    reader: int  # the index of the reader the card is at
+
+    def __init__(self, type: int, uid: bytes, timestamp_ms: int, reader: int = 0) -> None:
+        self.type = type
+        self.uid = uid
+        self.timestamp_ms = timestamp_ms
+        self.reader = reader
+
+    @property
+    def name(self) -> bytes:
+        return EVENT_NAMES.get(self.type, b"unknown")
+
+
+class CardPresence:
+    """
+    Debounces the results of polling for a card.
+
+    A card only counts as arrived once it has been seen for arrival_dwell_ms,
+    and as removed once removal_misses polls in a row have missed it. A card
+    that is missed for fewer polls than that, as happens at the edge of the
+    field, is reported as re-seen rather than as a new arrival.
+
+    Feeding a poll result costs a few integer compares unless the presence
+    changes.
+
+    Example:
+        presence = CardPresence(removal_misses=3)
+
+        event = presence.update(uid, utime.ticks_ms())
+        if event == EVENT_ARRIVED:
+            ...
+    """
+
+    __slots__ = (
+        "_state",
+        "_uid",
+        "_since_ms",
+        "_misses",
+        "_removal_misses",
+        "_arrival_dwell_ms",
+    )
+
+    _state: int
+    _uid: bytes | None
+    _since_ms: int
+    _misses: int
+
+    _removal_misses: int
+    _arrival_dwell_ms: int
+
+    def __init__(
+        self,
+        removal_misses: int = _DEFAULT_REMOVAL_MISSES,
+        arrival_dwell_ms: int = _DEFAULT_ARRIVAL_DWELL_MS,
+    ) -> None:
+        self._removal_misses = max(removal_misses, 1)
+        self._arrival_dwell_ms = max(arrival_dwell_ms, 0)
+        self.reset()
+
+    def reset(self) -> None:
+        self._state = _STATE_ABSENT
+        self._uid = None
+        self._since_ms = 0
+        self._misses = 0
+
+    @property
+    def uid(self) -> bytes | None:
+        """The UID of the card being tracked, arrived or not."""
+        return self._uid
+
+    @property
+    def tracking(self) -> bool:
+        """Whether a card has been seen and is not considered removed yet."""
+        return self._state != _STATE_ABSENT
+
+    @property
+    def present(self) -> bool:
+        """Whether a card has arrived and not been removed since."""
+        return self._state == _STATE_PRESENT
+
+    @property
+    def since_ms(self) -> int:
+        """utime.ticks_ms() of when the tracked card was first seen."""
+        return self._since_ms
+
+    def update(self, uid: bytes | None, now_ms: int) -> int:
+        """
+        Feed the result of a poll.
+
+        Args:
+            uid: The UID of the card found, None if there was none.
+            now_ms: utime.ticks_ms() of the poll.
+
+        Returns:
+            int: EVENT_NONE, or the event the poll caused. A different card
+                replacing the present one first removes it, the new card is
+                picked up from the next poll.
+        """
+        state = self._state
+
+        if uid is None:
+            if state == _STATE_ABSENT:
+                return EVENT_NONE
+
+            if state == _STATE_ARRIVING:
+                # gone before it settled, it never arrived
+                self.reset()
+                return EVENT_NONE
+
+            self._misses += 1
+            if self._misses < self._removal_misses:
+                return EVENT_NONE
+
+            self.reset()
+            return EVENT_REMOVED
+
+        if state == _STATE_PRESENT:
+            if uid == self._uid:
+                if self._misses:
+                    self._misses = 0
+                    return EVENT_RESEEN
+
+                return EVENT_NONE
+
+            self.reset()
+            return EVENT_REMOVED
+
+        if state == _STATE_ABSENT or uid != self._uid:
+            self._state = _STATE_ARRIVING
+            self._uid = uid
+            self._since_ms = now_ms
+            self._misses = 0
+
+        if utime.ticks_diff(now_ms, self._since_ms) < self._arrival_dwell_ms:
+            return EVENT_NONE
+
+        self._state = _STATE_PRESENT
+        return EVENT_ARRIVED
@@ -0,0 +1,381 @@
+import utime
+import uasyncio
+
+from typing import Callable
+from micropython import const
+
+from ...config import config
+from ...services import logger
+from ...drivers.pn532 import pn532
+
+from . import ndef, presence
+
+
+# How often a card that is in the field is checked for still being there
+_PRESENCE_CHECK_INTERVAL_MS = const(100)
+# Passive activation retries of a presence check (~50ms each), a missed check
+# is absorbed by the removal hysteresis instead of being retried for ~1s
+_PRESENCE_CHECK_RETRIES = const(0x02)
+
+_DEFAULT_REMOVAL_MISSES = const(3)
+_DEFAULT_ARRIVAL_DWELL_MS = const(0)
+
+# How long without a card before the PN532 is powered down between polls,
+# 0 keeps it auto-polling
+_DEFAULT_IDLE_TIMEOUT_MS = const(60_000)
+# How long the PN532 is powered down for between polls once idle
+_IDLE_POLL_INTERVAL_MS = const(500)
+# Polls per InAutoPoll of a single baud rate, 150ms apart, split between the
+# baud rates when there are several so that a command always takes ~1.5s
+_AUTO_POLL_COUNT = const(10)
+
+# How long to wait before polling again after a command failed, doubling
+# with every failure in a row
+_ERROR_BACKOFF_MS = const(100)
+_MAX_ERROR_BACKOFF_MS = const(5000)
+
+
+class Reader:
+    """
+    One PN532 and the cards in its field.
+
+    Every reader runs its own receive and detection loops, and only ever
+    waits on its own PN532, so the command round trips of several readers
+    interleave instead of queueing behind each other.
+    """
+
+    __slots__ = (
+        "_index",
+        "_logger",
+        "_driver",
+        "_receive_data_task",
+        "_detect_card_task",
+        "_started",
+        "_current_card_uid",
+        "_current_card_records",
+        "_ntag_reader",
+        "_ndef_cache",
+        "_baud_rates",
+        "_baud_rate_index",
+        "_presences",
+        "_presence_baud_rates",
+        "_idle_timeout_ms",
+        "_last_activity_ms",
+        "_on_card_event",
+    )
+
+    _index: int
+    _logger: logger.Logger
+    _driver: pn532.PN532
+
+    _receive_data_task: uasyncio.Task
+    _detect_card_task: uasyncio.Task
+    # set once startup() has configured the PN532, cards are only looked for after
+    _started: uasyncio.Event
+
+    _current_card_uid: bytes | None
+    _current_card_records: tuple[ndef.NDEFRecord, ...]
+
+    _ntag_reader: ndef.NTAGReader
+    _ndef_cache: ndef.NDEFCache
+
+    # what to poll for, in turn, one per command while a card is in the field
+    _baud_rates: tuple[int, ...]
+    _baud_rate_index: int
+
+    # one per card that can be in the field at once, two of each baud rate,
+    # and the baud rate of the card it tracks
+    _presences: list[presence.CardPresence]
+    _presence_baud_rates: list[int]
+
+    _idle_timeout_ms: int
+    _last_activity_ms: int  # utime.ticks_ms() of the last card event
+
+    _on_card_event: Callable[[presence.CardEvent], None] | None
+
+    def __init__(
+        self,
+        index: int,
+        driver: pn532.PN532,
+        baud_rates: tuple[int, ...],
+        ndef_cache: ndef.NDEFCache,
+        on_card_event: Callable[[presence.CardEvent], None] | None = None,
+    ) -> None:
+        self._index = index
+        self._logger = logger.get_logger(f"nfc{index}")
+        self._driver = driver
+        self._started = uasyncio.Event()
+        self._current_card_uid = None
+        self._current_card_records = ()
+
+        self._ntag_reader = ndef.NTAGReader(driver)
+        self._ndef_cache = ndef_cache
+
+        self._baud_rates = baud_rates
+        self._baud_rate_index = 0
+
+        self._presences = [
+            presence.CardPresence(
+                removal_misses=config.nfc_removal_misses or _DEFAULT_REMOVAL_MISSES,
+                arrival_dwell_ms=config.nfc_arrival_dwell_ms or _DEFAULT_ARRIVAL_DWELL_MS,
+            )
+            for _ in range(pn532.MAX_TARGETS * len(baud_rates))
+        ]
+        self._presence_baud_rates = [pn532.BAUD_RATE_106A] * len(self._presences)
+
+        self._idle_timeout_ms = (
+            _DEFAULT_IDLE_TIMEOUT_MS if config.nfc_idle_timeout_ms is None else config.nfc_idle_timeout_ms
+        )
+        self._last_activity_ms = utime.ticks_ms()
+
+        self._on_card_event = on_card_event
+
+    @property
+    def index(self) -> int:
+        return self._index
+
+    @property
+    def current_card_uid(self) -> bytes | None:
+        """The UID of the card that arrived last and has not been removed since."""
+        return self._current_card_uid
+
+    @property
+    def current_card_records(self) -> tuple[ndef.NDEFRecord, ...]:
+        """The NDEF records of the card in the field, empty if it has none or could not be read."""
+        return self._current_card_records
+
+    async def _read_card_records(self, target: pn532.PassiveTarget) -> tuple[ndef.NDEFRecord, ...]:
+        # only Type A cards can be NTAGs
+        if target.baud_rate != pn532.BAUD_RATE_106A:
+            return ()
+
+        uid = target.uid
+        records = self._ndef_cache.get(uid)
+        if records is not None:
+            return records
+
+        try:
+            message = await self._ntag_reader.read(target.number)
+            records = ndef.parse_records(message) if message else ()
+        except (pn532.PN532Error, ndef.NDEFError) as e:
+            # not cached, the card may just have left the field mid-read
+            self._logger.warn(f"unable to read the NDEF records of uid={[hex(i) for i in uid]} error={e}")
+            return ()
+
+        self._ndef_cache.put(uid, records)
+
+        return records
+
+    async def _receive_data(self) -> None:
+        while True:
+            await self._driver.receive()
+
+    async def _detect_card(self) -> None:
+        """
+        Report cards entering and leaving the field.
+
+        While there is no card the PN532 is left to auto-poll for one of any
+        of the configured baud rates, which keeps the UART quiet until a card
+        shows up. Once one has, the field is listed every
+        _PRESENCE_CHECK_INTERVAL_MS, one baud rate at a time in turn, and the
+        results are debounced into arrived, re-seen and removed events per
+        card. Up to two cards of each baud rate are tracked at once, both
+        listed by the same command.
+
+        After _idle_timeout_ms without a card the PN532 is powered down
+        instead, and only woken up every _IDLE_POLL_INTERVAL_MS to look for
+        one, until one shows up.
+
+        A command that fails, e.g. a lost or corrupted frame, drops the cards
+        being tracked and polling resumes after a back-off.
+        """
+        driver = self._driver
+        backoff_ms = _ERROR_BACKOFF_MS
+
+        await self._started.wait()
+        self._last_activity_ms = utime.ticks_ms()
+
+        while True:
+            try:
+                if self._tracking():
+                    baud_rates = (self._rotate_baud_rate(),)
+                    targets = await driver.list_passive_targets(baud_rates[0])
+                elif self._is_idle():
+                    baud_rates = (self._rotate_baud_rate(),)
+                    targets = await self._idle_poll(baud_rates[0])
+                else:
+                    baud_rates = self._baud_rates
+                    targets = await driver.auto_poll(
+                        poll_count=max(_AUTO_POLL_COUNT // len(baud_rates), 1),
+                        baud_rates=baud_rates,
+                    )
+            except pn532.PN532Error as e:
+                self._logger.warn(f"unable to poll for cards error={e}, retrying in {backoff_ms}ms")
+                self._reset_presence(utime.ticks_ms())
+
+                await uasyncio.sleep_ms(backoff_ms)
+                backoff_ms = min(backoff_ms * 2, _MAX_ERROR_BACKOFF_MS)
+                continue
+
+            backoff_ms = _ERROR_BACKOFF_MS
+
+            await self._update_presence(targets, baud_rates, utime.ticks_ms())
+
+            if self._tracking():
+                await uasyncio.sleep_ms(_PRESENCE_CHECK_INTERVAL_MS)
+
+    def _reset_presence(self, now: int) -> None:
+        """Stop tracking every card, reporting the ones that had arrived as removed."""
+        for tracker in self._presences:
+            uid = tracker.uid
+            if tracker.present:
+                if self._current_card_uid == uid:
+                    self._current_card_uid = None
+                    self._current_card_records = ()
+
+                self._signal_card_event(presence.EVENT_REMOVED, uid, now)
+
+            tracker.reset()
+
+    def _tracking(self) -> bool:
+        for tracker in self._presences:
+            if tracker.tracking:
+                return True
+
+        return False
+
+    def _rotate_baud_rate(self) -> int:
+        baud_rate = self._baud_rates[self._baud_rate_index]
+        self._baud_rate_index = (self._baud_rate_index + 1) % len(self._baud_rates)
+
+        return baud_rate
+
+    async def _update_presence(
+        self,
+        targets: tuple[pn532.PassiveTarget, ...],
+        baud_rates: tuple[int, ...],
+        now: int,
+    ) -> None:
+        """
+        Feed the cards found by a poll for baud_rates to the trackers. A
+        tracked card of a baud rate that was not polled for is not missing.
+        """
+        presences = self._presences
+        untracked = list(targets)
+
+        for i in range(len(presences)):
+            tracker = presences[i]
+            if not tracker.tracking or self._presence_baud_rates[i] not in baud_rates:
+                continue
+
+            found = None
+            for target in untracked:
+                if target.uid == tracker.uid:
+                    found = target
+                    untracked.remove(target)
+                    break
+
+            await self._update_tracker(i, found, now)
+
+        for target in untracked:
+            for i in range(len(presences)):
+                if not presences[i].tracking:
+                    self._presence_baud_rates[i] = target.baud_rate
+                    await self._update_tracker(i, target, now)
+                    break
+
+    async def _update_tracker(
+        self,
+        index: int,
+        target: pn532.PassiveTarget | None,
+        now: int,
+    ) -> None:
+        tracker = self._presences[index]
+        tracked_uid = tracker.uid
+        uid = target.uid if target else None
+
+        event = tracker.update(uid, now)
+        if event == presence.EVENT_NONE:
+            return
+
+        self._last_activity_ms = now
+
+        if event == presence.EVENT_ARRIVED:
+            self._current_card_uid = uid
+            self._current_card_records = await self._read_card_records(target)
+            self._logger.debug(
+                f"card arrived uid={[hex(i) for i in uid]} baud_rate={target.baud_rate_name} "
+                f"records={len(self._current_card_records)}"
+            )
+            self._signal_card_event(event, uid, now)
+        elif event == presence.EVENT_REMOVED:
+            if self._current_card_uid == tracked_uid:
+                self._current_card_uid = None
+                self._current_card_records = ()
+
+            self._logger.debug(f"card removed uid={[hex(i) for i in tracked_uid]}")
+            self._signal_card_event(event, tracked_uid, now)
+        elif event == presence.EVENT_RESEEN:
+            self._signal_card_event(event, uid, now)
+
+    def _is_idle(self) -> bool:
+        return bool(self._idle_timeout_ms) and (
+            utime.ticks_diff(utime.ticks_ms(), self._last_activity_ms) >= self._idle_timeout_ms
+        )
+
+    async def _idle_poll(self, baud_rate: int) -> tuple[pn532.PassiveTarget, ...]:
+        """
+        Power the PN532 down for _IDLE_POLL_INTERVAL_MS, RF field off, then
+        look for a card once.
+
+        It is woken up by the preamble of the next command over HSU rather
+        than by an RF field, which passive cards do not have; an RF wake-up
+        is still enabled, so that a phone held to the reader wakes it early.
+        """
+        driver = self._driver
+
+        if driver.awake:
+            if not await driver.power_down():
+                self._logger.warn("unable to power down")
+
+        await uasyncio.sleep_ms(_IDLE_POLL_INTERVAL_MS)
+
+        return await driver.list_passive_targets(baud_rate)
+
+    def _signal_card_event(self, type: int, uid: bytes, timestamp_ms: int) -> None:
+        if self._on_card_event:
+            self._on_card_event(presence.CardEvent(type, uid, timestamp_ms, self._index))
+
+    async def run(self) -> None:
+        self._logger.debug("running")
+
+        self._receive_data_task = uasyncio.create_task(self._receive_data())
+        self._detect_card_task = uasyncio.create_task(self._detect_card())
+
+        await uasyncio.gather(self._receive_data_task, self._detect_card_task)
+
+    async def startup(self) -> None:
+        self._logger.info("starting up")
+
+        await self._driver.wake_up()
+        await self._driver.sam_config()
+        await self._driver.set_retries(passive=_PRESENCE_CHECK_RETRIES)
+
+        if config.nfc_uart_baud_rate:
+            if await self._driver.set_serial_baud_rate(config.nfc_uart_baud_rate):
+                self._logger.info(f"switched to baud_rate={config.nfc_uart_baud_rate}")
+            else:
+                self._logger.warn(
+                    f"unable to switch to baud_rate={config.nfc_uart_baud_rate}, staying on the default"
+                )
+
+        self._started.set()
+        self._logger.info("startup complete")
+
+    async def shutdown(self) -> None:
+        self._logger.debug("shutting down")
+
+        self._detect_card_task.cancel()
+        self._receive_data_task.cancel()
+
+        self._logger.info("shutdown complete")
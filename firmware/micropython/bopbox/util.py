@@ -1,9 +1,93 @@
-def find_ord_in_memoryview(
-    view: memoryview,
+import micropython
+
+
+@micropython.viper
+def find_ord(
+    buffer,
     ord: int,
+    start: int,
+    end: int,
 ) -> int:
-    for i in range(len(view)):
-        if view[i] == ord:
+    """
+    Find the first occurrence of a byte in buffer[start:end].
+
+    Scans the underlying buffer directly instead of iterating over a
+    memoryview, so no objects are allocated while searching.
+
+    Args:
+        buffer: Any object supporting the buffer protocol.
+        ord: The byte value to search for.
+        start: Index to start searching from (inclusive).
+        end: Index to stop searching at (exclusive).
+
+    Returns:
+        int: The index of the byte, or -1 if not found.
+    """
+    data = ptr8(buffer)
+    i = start
+    while i < end:
+        if data[i] == ord:
             return i
+        i += 1
 
     return -1
+
+
+def find_ord_in_memoryview(
+    view: memoryview,
+    ord: int,
+) -> int:
+    return find_ord(view, ord, 0, len(view))
+
+
+def parse_int(
+    buffer,
+    start: int,
+    end: int,
+) -> int:
+    """
+    Parse an unsigned decimal integer from buffer[start:end] without
+    allocating an intermediate bytes object.
+
+    Returns:
+        int: The parsed value, or -1 if the range is empty or contains a non-digit.
+    """
+    if start >= end:
+        return -1
+
+    value = 0
+    for i in range(start, end):
+        digit = buffer[i] - 0x30  # ord("0")
+        if digit < 0 or digit > 9:
+            return -1
+        value = value * 10 + digit
+
+    return value
+
+
+@micropython.viper
+def reverse_bits(
+    buffer,
+    start: int,
+    end: int,
+):
+    """
+    Reverse the bit order of every byte in buffer[start:end], in place.
+
+    For devices that shift bytes LSB first over an SPI peripheral that only
+    shifts them MSB first.
+
+    Args:
+        buffer: Any writable object supporting the buffer protocol.
+        start: Index to start at (inclusive).
+        end: Index to stop at (exclusive).
+    """
+    data = ptr8(buffer)
+    i = start
+    while i < end:
+        value = data[i]
+        value = ((value & 0xF0) >> 4) | ((value & 0x0F) << 4)
+        value = ((value & 0xCC) >> 2) | ((value & 0x33) << 2)
+        value = ((value & 0xAA) >> 1) | ((value & 0x55) << 1)
+        data[i] = value
+        i += 1